@@ -39,7 +39,7 @@ setup(name='xframes',
       version=get_version(),
       url='https://github.com/cchayden/xframes.git',
       license='Apache Software License 2.0',
-      packages=['xframes', 'xframes.deps', 'xframes.toolkit'],
+      packages=['xframes', 'xframes.deps', 'xframes.toolkit', 'xframes.benchmark'],
       package_data={'xframes': ['conf/*.properties', 'conf/*.template', 'default.ini']},
       data_files=[('', ['README.rst'])],
       install_requires=['numpy', 'python-dateutil'],
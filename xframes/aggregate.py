@@ -1,10 +1,21 @@
 
+import functools
+
 from aggregator_property_set import AggregatorPropertySet
 
 # Builtin aggregators for groupby
 from aggregator_impl import agg_sum, agg_argmax, agg_argmin, agg_max, agg_min, \
     agg_count, agg_mean, agg_variance, agg_stdv, agg_select_one, \
-    agg_concat_list, agg_concat_dict, agg_values, agg_values_count, agg_quantile
+    agg_concat_list, agg_concat_dict, agg_values, agg_values_count, agg_count_distinct_approx, \
+    agg_count_distinct_approx_zero, agg_quantile, agg_quantile_seq, agg_quantile_merge, \
+    agg_quantile_finalize, QUANTILE_EXACT_LIMIT
+import aggregator_impl
+
+
+def _combiner(name):
+    # Look up the zero, seq, merge, and finalize functions for an algebraic aggregator.
+    return {part: getattr(aggregator_impl, 'agg_{}_{}'.format(name, part))
+            for part in ['zero', 'seq', 'merge', 'finalize']}
 
 
 # noinspection PyPep8Naming
@@ -19,7 +30,7 @@ def SUM(src_column):
     >>> xf.groupby("user", {'rating_sum':aggregate.SUM('rating')})
 
     """
-    return AggregatorPropertySet(agg_sum, int, 'sum', 1), [src_column]
+    return AggregatorPropertySet(agg_sum, int, 'sum', 1, **_combiner('sum')), [src_column]
 
 
 # noinspection PyPep8Naming
@@ -35,7 +46,7 @@ def ARGMAX(agg_column, out_column):
     >>> xf.groupby("user",
                     {'best_movie':aggregate.ARGMAX('rating','movie')})
     """
-    return AggregatorPropertySet(agg_argmax, 1, 'argmax', 2), [agg_column, out_column]
+    return AggregatorPropertySet(agg_argmax, 1, 'argmax', 2, **_combiner('argmax')), [agg_column, out_column]
 
 
 # noinspection PyPep8Naming
@@ -52,7 +63,7 @@ def ARGMIN(agg_column, out_column):
                     {'best_movie':aggregate.ARGMIN('rating','movie')})
 
     """
-    return AggregatorPropertySet(agg_argmin, 1, 'argmin', 2), [agg_column, out_column]
+    return AggregatorPropertySet(agg_argmin, 1, 'argmin', 2, **_combiner('argmin')), [agg_column, out_column]
 
 
 # noinspection PyPep8Naming
@@ -69,7 +80,7 @@ def MAX(src_column):
                     {'rating_max':aggregate.MAX('rating')})
 
     """
-    return AggregatorPropertySet(agg_max, 0, 'max', 1), [src_column]
+    return AggregatorPropertySet(agg_max, 0, 'max', 1, **_combiner('max')), [src_column]
 
 
 # noinspection PyPep8Naming
@@ -86,7 +97,7 @@ def MIN(src_column):
                     {'rating_min':aggregate.MIN('rating')})
 
     """
-    return AggregatorPropertySet(agg_min, 0, 'min', 1), [src_column]
+    return AggregatorPropertySet(agg_min, 0, 'min', 1, **_combiner('min')), [src_column]
 
 
 # noinspection PyPep8Naming
@@ -103,7 +114,7 @@ def COUNT():
                     {'count':aggregate.COUNT()})
 
     """
-    return AggregatorPropertySet(agg_count, int, 'count', 0), ['']
+    return AggregatorPropertySet(agg_count, int, 'count', 0, **_combiner('count')), ['']
 
 
 # noinspection PyPep8Naming
@@ -119,7 +130,7 @@ def MEAN(src_column):
     >>> xf.groupby("user",
                     {'rating_mean':aggregate.MEAN('rating')})
     """
-    return AggregatorPropertySet(agg_mean, float, 'mean', 1), [src_column]
+    return AggregatorPropertySet(agg_mean, float, 'mean', 1, **_combiner('mean')), [src_column]
 
 
 # noinspection PyPep8Naming
@@ -136,7 +147,7 @@ def VARIANCE(src_column):
                  {'rating_var':aggregate.VARIANCE('rating')})
 
     """
-    return AggregatorPropertySet(agg_variance, float, 'variance', 1), [src_column]
+    return AggregatorPropertySet(agg_variance, float, 'variance', 1, **_combiner('variance')), [src_column]
 
 
 # noinspection PyPep8Naming
@@ -153,7 +164,7 @@ def STDV(src_column):
                     {'rating_stdv':aggregate.STDV('rating')})
 
     """
-    return AggregatorPropertySet(agg_stdv, float, 'stdv', 1), [src_column]
+    return AggregatorPropertySet(agg_stdv, float, 'stdv', 1, **_combiner('stdv')), [src_column]
 
 
 # noinspection PyPep8Naming
@@ -224,7 +235,7 @@ def VALUES(src_column):
                      {"friends": aggregate.VALUES("friend")})
 
     """
-    return AggregatorPropertySet(agg_values, list, 'values', 1), [src_column]
+    return AggregatorPropertySet(agg_values, list, 'values', 1, **_combiner('values')), [src_column]
 
 
 # noinspection PyPep8Naming
@@ -242,15 +253,54 @@ def VALUES_COUNT(src_column):
        {"friends": aggregate.VALUES_COUNT("friend")})
 
     """
-    return AggregatorPropertySet(agg_values_count, dict, 'values-count', 1), [src_column]
+    return AggregatorPropertySet(agg_values_count, dict, 'values-count', 1,
+                                 **_combiner('values_count')), [src_column]
 
 
 # noinspection PyPep8Naming
-def QUANTILE(src_column, *args):
+def COUNT_DISTINCT_APPROX(src_column, precision=12):
     """
-    Builtin approximate quantile aggregator for groupby.
+    Builtin approximate count of the distinct values in one column in one group.
+
+    The count is estimated with a HyperLogLog sketch, which is built within each
+    partition and merged after the shuffle, so the values themselves are not sent
+    across the network.  The standard error of the count is about
+    1.04 / sqrt(2 ** precision): 1.6% for the default precision of 12.
+
+    Parameters
+    ----------
+    src_column : str
+        The column whose distinct values are counted.  Missing values are not counted.
+
+    precision : int (4 .. 18), optional
+        The number of hash bits used to select a HyperLogLog register.
+
+    Examples
+    --------
+
+    To estimate the number of distinct items rated by each user:
+
+    >>> xf.groupby("user",
+                     {"num_items": aggregate.COUNT_DISTINCT_APPROX("item")})
+
+    """
+    combiner = _combiner('count_distinct_approx')
+    combiner['zero'] = functools.partial(agg_count_distinct_approx_zero, precision)
+    return AggregatorPropertySet(functools.partial(agg_count_distinct_approx, precision=precision),
+                                 int, 'count-distinct-approx', 1, **combiner), [src_column]
+
+
+# noinspection PyPep8Naming
+def QUANTILE(src_column, *args, **kwargs):
+    """
+    Builtin quantile aggregator for groupby.
     Accepts as an argument, one or more of a list of quantiles to query.
 
+    Accepts the keyword argument exact_limit.  Groups with up to this many values
+    get exact quantiles.  Larger groups get approximate quantiles.  Defaults to
+    1000.  Use None to compute the exact quantiles of every group, which holds all
+    the values of a group in memory.
+
     Examples
     --------
 
@@ -266,16 +316,41 @@ def QUANTILE(src_column, *args):
         >>> xf.groupby("user",
                         {'rating_quantiles': aggregate.QUANTILE('rating', 0.25,0.5,0.75)})
 
-    The returned quantiles are guaranteed to have 0.5% accuracy. That is to say,
-    if the requested quantile is 0.50, the resultant quantile value may be
-    between 0.495 and 0.505 of the true quantile.
+    A single quantile gives a column of the same type as the source column, and a
+    list of quantiles gives a list column with one value for each quantile.  The
+    quantiles are values from the column, so any column with ordered values, such
+    as numbers or datetimes, can be used.
+
+    The quantile is the first value whose rank reaches the requested fraction of the
+    values in the group.  Missing values are skipped.
+
+    Beyond exact_limit values, the quantiles are estimated with a KLL sketch for the
+    group, which is built within each partition and merged after the shuffle.  The
+    approximate quantiles are accurate within about 1% in rank with high probability.
+    That is to say, if the requested quantile is 0.50, the resultant quantile value
+    may be between the true 0.49 and 0.51 quantiles.  The 0.0 and 1.0 quantiles are
+    the exact minimum and maximum.
     """
+    exact_limit = kwargs.pop('exact_limit', QUANTILE_EXACT_LIMIT)
+    if len(kwargs) > 0:
+        raise TypeError('QUANTILE got an unexpected keyword argument: {}'.format(kwargs.keys()[0]))
     if len(args) == 1:
         quantiles = args[0]
     else:
         quantiles = list(args)
 
-    if not hasattr(quantiles, '__iter__'):
+    single = not hasattr(quantiles, '__iter__')
+    if single:
         quantiles = [quantiles]
-    query = ",".join([str(i) for i in quantiles])
-    return AggregatorPropertySet(agg_quantile, float, 'quantile', 1), [src_column], '[' + query + ']'
+    quantiles = [float(q) for q in quantiles]
+    if len(quantiles) == 0:
+        raise ValueError('QUANTILE requires at least one quantile.')
+    if any(q < 0.0 or q > 1.0 for q in quantiles):
+        raise ValueError('Quantiles must be between 0.0 and 1.0.')
+    combiner = _combiner('quantile')
+    combiner['seq'] = functools.partial(agg_quantile_seq, exact_limit=exact_limit)
+    combiner['merge'] = functools.partial(agg_quantile_merge, exact_limit=exact_limit)
+    combiner['finalize'] = functools.partial(agg_quantile_finalize, quantiles=quantiles, single=single)
+    return AggregatorPropertySet(functools.partial(agg_quantile, quantiles=quantiles, single=single,
+                                                   exact_limit=exact_limit),
+                                 0 if single else list, 'quantile', 1, **combiner), [src_column]
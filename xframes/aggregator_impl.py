@@ -6,6 +6,13 @@ import random
 import math
 from collections import Counter
 
+from xframes.hyperloglog import HyperLogLog, DEFAULT_PRECISION
+from xframes.kll import KLLSketch
+
+# Groups with up to this many values get exact quantiles.
+QUANTILE_EXACT_LIMIT = 1000
+
+
 def _is_missing(x):
     if x is None:
         return True
@@ -155,9 +162,341 @@ def agg_values_count(rows, cols):
     return collect_values_count_non_missing(src_col)
 
 
-# noinspection PyUnusedLocal
-def agg_quantile(rows, cols):
-    # cols: [src_col, quantile]
-    # cols: [src_col, [quantile ...]]
-    # not imlemented
+def agg_count_distinct_approx(rows, cols, precision=DEFAULT_PRECISION):
+    src_col = cols[0]
+    hll = HyperLogLog(precision)
+    hll.update(row[src_col] for row in rows if not _is_missing(row[src_col]))
+    return hll.count()
+
+
+def agg_quantile(rows, cols, quantiles=(0.5,), single=True, exact_limit=QUANTILE_EXACT_LIMIT):
+    state = agg_quantile_zero()
+    for row in rows:
+        state = agg_quantile_seq(state, row, cols, exact_limit)
+    return agg_quantile_finalize(state, quantiles, single)
+
+
+# Combiners for the algebraic aggregators.
+# Each one is made up of zero, seq, merge, and finalize functions (see AggregatorPropertySet).
+# Groupby uses these to aggregate within each partition before the shuffle, so
+#  that only the partial states, and not the rows, are sent across the network.
+
+# All of them skip over missing values, like the functions above.
+
+
+def _identity(state):
+    return state
+
+
+def _no_value():
+    # Initial state for aggregators that have no value until the first non-missing value is seen.
     return None
+
+
+def agg_sum_zero():
+    return 0
+
+
+def agg_sum_seq(total, row, cols):
+    val = row[cols[0]]
+    if _is_missing(val):
+        return total
+    return total + val
+
+
+def agg_sum_merge(total1, total2):
+    return total1 + total2
+
+
+agg_sum_finalize = _identity
+
+
+# ARGMAX and ARGMIN state is (agg_value, out_value)
+agg_argmax_zero = _no_value
+agg_argmin_zero = _no_value
+
+
+def agg_argmax_seq(state, row, cols):
+    val = row[cols[0]]
+    if _is_missing(val):
+        return state
+    if state is None or val > state[0]:
+        return val, row[cols[1]]
+    return state
+
+
+def agg_argmax_merge(state1, state2):
+    if state1 is None:
+        return state2
+    if state2 is None:
+        return state1
+    return state2 if state2[0] > state1[0] else state1
+
+
+def agg_argmin_seq(state, row, cols):
+    val = row[cols[0]]
+    if _is_missing(val):
+        return state
+    if state is None or val < state[0]:
+        return val, row[cols[1]]
+    return state
+
+
+def agg_argmin_merge(state1, state2):
+    if state1 is None:
+        return state2
+    if state2 is None:
+        return state1
+    return state2 if state2[0] < state1[0] else state1
+
+
+def agg_argmax_finalize(state):
+    return None if state is None else state[1]
+
+
+agg_argmin_finalize = agg_argmax_finalize
+agg_max_zero = _no_value
+agg_min_zero = _no_value
+
+
+def agg_max_seq(state, row, cols):
+    val = row[cols[0]]
+    if _is_missing(val):
+        return state
+    return val if state is None or val > state else state
+
+
+def agg_max_merge(state1, state2):
+    if state1 is None:
+        return state2
+    if state2 is None:
+        return state1
+    return max(state1, state2)
+
+
+def agg_min_seq(state, row, cols):
+    val = row[cols[0]]
+    if _is_missing(val):
+        return state
+    return val if state is None or val < state else state
+
+
+def agg_min_merge(state1, state2):
+    if state1 is None:
+        return state2
+    if state2 is None:
+        return state1
+    return min(state1, state2)
+
+
+agg_max_finalize = _identity
+agg_min_finalize = _identity
+
+
+def agg_count_zero():
+    return 0
+
+
+# noinspection PyUnusedLocal
+def agg_count_seq(count, row, cols):
+    # Missing values do not matter here.
+    return count + 1
+
+
+def agg_count_merge(count1, count2):
+    return count1 + count2
+
+
+agg_count_finalize = _identity
+
+
+def agg_mean_zero():
+    # (count, total)
+    return 0, 0
+
+
+def agg_mean_seq(state, row, cols):
+    val = row[cols[0]]
+    if _is_missing(val):
+        return state
+    return state[0] + 1, state[1] + val
+
+
+def agg_mean_merge(state1, state2):
+    return state1[0] + state2[0], state1[1] + state2[1]
+
+
+def agg_mean_finalize(state):
+    count, total = state
+    if count == 0:
+        return None
+    return total / float(count)
+
+
+def agg_variance_zero():
+    # (count, mean, sum of squares of differences from the mean)
+    return 0, 0.0, 0.0
+
+
+def agg_variance_seq(state, row, cols):
+    # Welford's online update.
+    val = row[cols[0]]
+    if _is_missing(val):
+        return state
+    count, mean, m2 = state
+    count += 1
+    delta = val - mean
+    mean += delta / float(count)
+    m2 += delta * (val - mean)
+    return count, mean, m2
+
+
+def agg_variance_merge(state1, state2):
+    # Chan's parallel combination of two partial results.
+    count1, mean1, m21 = state1
+    count2, mean2, m22 = state2
+    if count1 == 0:
+        return state2
+    if count2 == 0:
+        return state1
+    count = count1 + count2
+    delta = mean2 - mean1
+    mean = mean1 + delta * count2 / float(count)
+    m2 = m21 + m22 + delta * delta * count1 * count2 / float(count)
+    return count, mean, m2
+
+
+def agg_variance_finalize(state):
+    count, _, m2 = state
+    if count == 0:
+        return None
+    return m2 / float(count)
+
+
+agg_stdv_zero = agg_variance_zero
+agg_stdv_seq = agg_variance_seq
+agg_stdv_merge = agg_variance_merge
+
+
+def agg_stdv_finalize(state):
+    variance = agg_variance_finalize(state)
+    if variance is None:
+        return None
+    return math.sqrt(variance)
+
+
+def agg_values_zero():
+    return set()
+
+
+def agg_values_seq(values, row, cols):
+    val = row[cols[0]]
+    if not _is_missing(val):
+        values.add(val)
+    return values
+
+
+def agg_values_merge(values1, values2):
+    values1.update(values2)
+    return values1
+
+
+def agg_values_finalize(values):
+    return list(values)
+
+
+def agg_values_count_zero():
+    return Counter()
+
+
+def agg_values_count_seq(counts, row, cols):
+    val = row[cols[0]]
+    if not _is_missing(val):
+        counts[val] += 1
+    return counts
+
+
+def agg_values_count_merge(counts1, counts2):
+    counts1.update(counts2)
+    return counts1
+
+
+def agg_values_count_finalize(counts):
+    return dict(counts)
+
+
+def agg_count_distinct_approx_zero(precision=DEFAULT_PRECISION):
+    return HyperLogLog(precision)
+
+
+def agg_count_distinct_approx_seq(hll, row, cols):
+    val = row[cols[0]]
+    if not _is_missing(val):
+        hll.add(val)
+    return hll
+
+
+def agg_count_distinct_approx_merge(hll1, hll2):
+    return hll1.merge(hll2)
+
+
+def agg_count_distinct_approx_finalize(hll):
+    return hll.count()
+
+
+# The quantile state of a group is the list of its values, so the quantiles are exact,
+#  until it holds more than exact_limit values.  Then it becomes a KLL sketch, so the
+#  memory of a large group stays bounded.
+
+def _exact_quantiles(values, quantiles):
+    # the same rank rule as KLLSketch.quantiles: the first value whose rank reaches the fraction
+    if len(values) == 0:
+        return [None for _ in quantiles]
+    values = sorted(values)
+    n = len(values)
+    return [values[min(max(int(math.ceil(q * n)) - 1, 0), n - 1)] for q in quantiles]
+
+
+def _to_sketch(values):
+    return KLLSketch().update_many(values)
+
+
+def _limit_exact(values, exact_limit):
+    if exact_limit is not None and len(values) > exact_limit:
+        return _to_sketch(values)
+    return values
+
+
+def agg_quantile_zero():
+    return []
+
+
+def agg_quantile_seq(state, row, cols, exact_limit=QUANTILE_EXACT_LIMIT):
+    val = row[cols[0]]
+    if _is_missing(val):
+        return state
+    if isinstance(state, KLLSketch):
+        state.update(val)
+        return state
+    state.append(val)
+    return _limit_exact(state, exact_limit)
+
+
+def agg_quantile_merge(state1, state2, exact_limit=QUANTILE_EXACT_LIMIT):
+    if isinstance(state1, KLLSketch):
+        if isinstance(state2, KLLSketch):
+            return state1.merge(state2)
+        return state1.update_many(state2)
+    if isinstance(state2, KLLSketch):
+        return state2.update_many(state1)
+    state1.extend(state2)
+    return _limit_exact(state1, exact_limit)
+
+
+def agg_quantile_finalize(state, quantiles=(0.5,), single=True):
+    if isinstance(state, KLLSketch):
+        values = state.quantiles(quantiles)
+    else:
+        values = _exact_quantiles(state, quantiles)
+    # an empty group has no quantiles
+    return values[0] if single else values
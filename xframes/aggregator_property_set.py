@@ -58,9 +58,35 @@ class AggregatorPropertySet(object):
 
     The function agg_sum is executed in a spark worker node, as with the function used in xframes.apply, and
     the same restrictions apply.
+
+    Aggregators whose result can be built up from partial results (such as SUM, COUNT, or MEAN)
+    can also supply a combiner: four functions that let groupby aggregate on the map side, so that
+    only small partial states are shuffled instead of every row in the group.
+    The combiner for SUM looks like this::
+
+        def agg_sum_zero():
+            return 0
+
+        def agg_sum_seq(total, row, cols):
+            val = row[cols[0]]
+            return total if _is_missing(val) else total + val
+
+        def agg_sum_merge(total1, total2):
+            return total1 + total2
+
+        def agg_sum_finalize(total):
+            return total
+
+        AggregatorPropertySet(agg_sum, int, 'sum', 1,
+                              zero=agg_sum_zero, seq=agg_sum_seq,
+                              merge=agg_sum_merge, finalize=agg_sum_finalize)
+
+    If every aggregator in a groupby supplies a combiner, groupby uses the combiners.  Otherwise it
+    falls back to grouping the rows and calling each agg_function.
     """
 
-    def __init__(self, agg_function, output_type, default_column_name, num_args):
+    def __init__(self, agg_function, output_type, default_column_name, num_args,
+                 zero=None, seq=None, merge=None, finalize=None):
         """
         Create a new instance.
 
@@ -83,12 +109,38 @@ class AggregatorPropertySet(object):
         num_args : int
             The number of arguments to the agg_function.
 
+        zero : func(), optional
+            Returns the initial partial state for a group.
+
+        seq : func(state, row, cols), optional
+            Folds one row into a partial state, and returns the new state.
+
+        merge : func(state, state), optional
+            Combines two partial states, and returns the combined state.
+
+        finalize : func(state), optional
+            Computes the aggregate value from a partial state.
+
+        The zero, seq, merge, and finalize functions must be given together, or not at all.
         """
 
         self.agg_function = agg_function
         self.default_column_name = default_column_name
         self.output_type = output_type
         self.num_args = num_args
+        combiner = [zero, seq, merge, finalize]
+        if any(fn is not None for fn in combiner) and not all(fn is not None for fn in combiner):
+            raise ValueError('Aggregator combiner requires zero, seq, merge, and finalize.')
+        self.zero = zero
+        self.seq = seq
+        self.merge = merge
+        self.finalize = finalize
+
+    def is_algebraic(self):
+        """
+        Returns True if the aggregator can be computed by combining partial results.
+        """
+        return self.zero is not None
 
     def get_output_type(self, input_type):
         candidate = self.output_type
@@ -0,0 +1,15 @@
+"""
+Benchmarks for core XFrame and XArray operations.
+
+Run from the command line:
+
+    python -m xframes.benchmark --rows 1000000 --cores 4 --output results.json
+
+and compare against an earlier run:
+
+    python -m xframes.benchmark --baseline results.json --threshold 0.2
+
+The exit status is 1 if any benchmark is slower than the baseline by more than the threshold.
+"""
+
+__all__ = ['data', 'suite']
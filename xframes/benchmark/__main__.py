@@ -0,0 +1,5 @@
+import sys
+
+from xframes.benchmark.suite import main
+
+sys.exit(main())
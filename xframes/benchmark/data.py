@@ -0,0 +1,125 @@
+"""
+Deterministic synthetic data for benchmarks.
+
+Rows have an integer key column followed by value columns of
+int, float, and str type, in rotation.  Keys are drawn from a fixed number of
+distinct values.  With skew 0 every key is equally likely; larger skew values
+give Zipf-like distributions where a few keys hold most of the rows.
+The same arguments always produce the same data, regardless of the number of
+partitions used to generate it.
+"""
+
+import random
+import bisect
+import csv
+
+from xframes.spark_context import CommonSparkContext
+
+_VALUE_TYPES = [int, float, str]
+
+
+def column_names(num_columns):
+    """
+    Returns the column names of the generated data.
+    """
+    return ['key'] + ['c{}'.format(i) for i in range(num_columns)]
+
+
+def column_types(num_columns):
+    """
+    Returns the column types of the generated data.
+    """
+    return [int] + [_VALUE_TYPES[i % len(_VALUE_TYPES)] for i in range(num_columns)]
+
+
+def key_weights(key_cardinality, skew):
+    """
+    Returns the cumulative probability of drawing each key.
+    """
+    weights = [1.0 / (rank + 1) ** skew for rank in range(key_cardinality)]
+    total = sum(weights)
+    cumulative = []
+    acc = 0.0
+    for weight in weights:
+        acc += weight / total
+        cumulative.append(acc)
+    return cumulative
+
+
+def _make_value(rng, typ):
+    if typ is int:
+        return rng.randint(0, 1000000)
+    if typ is float:
+        return rng.random() * 1000.0
+    return 'v{}'.format(rng.randint(0, 100000))
+
+
+def generate_rows(start, stop, num_columns, key_cardinality, skew, seed, cumulative=None):
+    """
+    Yields rows start through stop - 1 of the data set.
+
+    Each row is generated from its own seeded random generator, so any range of rows
+    can be generated independently.
+    """
+    if cumulative is None:
+        cumulative = key_weights(key_cardinality, skew)
+    types = column_types(num_columns)[1:]
+    for row_num in xrange(start, stop):
+        rng = random.Random(seed * 1000003 + row_num)
+        key = min(bisect.bisect_left(cumulative, rng.random()), key_cardinality - 1)
+        yield tuple([key] + [_make_value(rng, typ) for typ in types])
+
+
+def make_xframe(num_rows, num_columns=4, key_cardinality=1000, skew=0.0, seed=0, num_partitions=None):
+    """
+    Create a synthetic XFrame.
+
+    The rows are generated on the workers.
+
+    Parameters
+    ----------
+    num_rows : int
+        The number of rows.
+
+    num_columns : int, optional
+        The number of value columns, in addition to the key column.
+
+    key_cardinality : int, optional
+        The number of distinct keys.
+
+    skew : float, optional
+        The Zipf exponent of the key distribution.  Use 0 for uniform keys.
+
+    seed : int, optional
+        The random seed.
+
+    num_partitions : int, optional
+        The number of partitions.  Defaults to the spark default parallelism.
+
+    Returns
+    -------
+    out : XFrame
+        The synthetic data.
+    """
+    from xframes import XFrame
+    sc = CommonSparkContext.spark_context()
+    num_partitions = num_partitions or sc.defaultParallelism
+    cumulative = key_weights(key_cardinality, skew)
+    bounds = [num_rows * i // num_partitions for i in range(num_partitions + 1)]
+
+    def make_partition(index):
+        return generate_rows(bounds[index], bounds[index + 1], num_columns,
+                             key_cardinality, skew, seed, cumulative)
+    rdd = sc.parallelize(range(num_partitions), num_partitions).flatMap(make_partition)
+    return XFrame.from_rdd(rdd, column_names(num_columns), column_types(num_columns))
+
+
+def write_csv(path, num_rows, num_columns=4, key_cardinality=1000, skew=0.0, seed=0):
+    """
+    Write the synthetic data, with a header, to a local CSV file.
+    """
+    with open(path, 'wb') as f:
+        writer = csv.writer(f)
+        writer.writerow(column_names(num_columns))
+        for row in generate_rows(0, num_rows, num_columns, key_cardinality, skew, seed):
+            writer.writerow(row)
@@ -0,0 +1,229 @@
+"""
+Times core XFrame and XArray operations on synthetic data.
+
+Results are written as JSON, so that runs on different commits can be compared.
+"""
+
+import os
+import sys
+import time
+import json
+import shutil
+import logging
+import platform
+import tempfile
+import argparse
+from collections import OrderedDict
+
+from xframes.spark_context import SparkInitContext, CommonSparkContext
+from xframes.version import __version__
+from xframes.benchmark import data
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """
+    Decorator that registers a benchmark.
+
+    The benchmark function is called with the benchmark context, and must force
+    the evaluation of the operation it measures.
+    """
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+@benchmark('read_csv')
+def bench_read_csv(context):
+    from xframes import XFrame
+    xf = XFrame.read_csv(context['csv_path'], verbose=False)
+    len(xf)
+
+
+@benchmark('groupby')
+def bench_groupby(context):
+    from xframes import aggregate
+    res = context['xf'].groupby('key', {'count': aggregate.COUNT,
+                                        'sum': aggregate.SUM('c1'),
+                                        'max': aggregate.MAX('c0')})
+    len(res)
+
+
+@benchmark('join')
+def bench_join(context):
+    res = context['xf'].join(context['dim'], on='key')
+    len(res)
+
+
+@benchmark('sort')
+def bench_sort(context):
+    res = context['xf'].sort('c1')
+    res.materialize()
+
+
+@benchmark('apply')
+def bench_apply(context):
+    res = context['xf'].apply(lambda row: row['c1'] * 2.0, dtype=float)
+    res.sum()
+
+
+@benchmark('sketch_summary')
+def bench_sketch_summary(context):
+    sketch = context['xf']['c1'].sketch_summary()
+    sketch.num_unique()
+
+
+def _setup(config, tmp_dir):
+    from xframes import XFrame
+    rows = config['rows']
+    columns = config['columns']
+    cardinality = config['cardinality']
+    csv_path = os.path.join(tmp_dir, 'bench.csv')
+    data.write_csv(csv_path, rows, columns, cardinality, config['skew'], config['seed'])
+    xf = data.make_xframe(rows, columns, cardinality, config['skew'], config['seed'])
+    xf.persist(True)
+    len(xf)
+    dim = XFrame({'key': range(cardinality), 'name': ['k{}'.format(key) for key in range(cardinality)]})
+    return {'csv_path': csv_path, 'xf': xf, 'dim': dim}
+
+
+def run(rows=100000, columns=4, cardinality=1000, skew=0.0, seed=0, cores=4, repeat=3, names=None):
+    """
+    Run the benchmarks.
+
+    Parameters
+    ----------
+    rows : int, optional
+        The number of rows of synthetic data.
+
+    columns : int, optional
+        The number of value columns.
+
+    cardinality : int, optional
+        The number of distinct keys.
+
+    skew : float, optional
+        The Zipf exponent of the key distribution.
+
+    seed : int, optional
+        The random seed for the data.
+
+    cores : int, optional
+        Spark runs in local[cores] mode.  This only takes effect if the spark context
+        has not been created yet.
+
+    repeat : int, optional
+        The number of times to time each benchmark.
+
+    names : list [str], optional
+        The benchmarks to run.  Defaults to all of them.
+
+    Returns
+    -------
+    out : dict
+        The configuration, environment, and the timings of each benchmark in seconds.
+    """
+    if CommonSparkContext.existing_spark_context() is None:
+        SparkInitContext.set({'spark.master': 'local[{}]'.format(cores)})
+    else:
+        logging.warn('Spark context already exists: benchmarks use its master.')
+    sc = CommonSparkContext.spark_context()
+    config = OrderedDict([('rows', rows), ('columns', columns), ('cardinality', cardinality),
+                          ('skew', skew), ('seed', seed), ('repeat', repeat)])
+    names = names or BENCHMARKS.keys()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        context = _setup(config, tmp_dir)
+        results = OrderedDict()
+        for name in names:
+            times = []
+            for _ in range(repeat):
+                start = time.time()
+                BENCHMARKS[name](context)
+                times.append(time.time() - start)
+            ordered = sorted(times)
+            results[name] = {'times': times,
+                             'min': ordered[0],
+                             'median': ordered[len(ordered) // 2]}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return {'config': config,
+            'environment': {'master': sc.master,
+                            'spark_version': sc.version,
+                            'xframes_version': __version__,
+                            'python_version': platform.python_version()},
+            'timestamp': time.time(),
+            'results': results}
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Compare benchmark results against a baseline.
+
+    Parameters
+    ----------
+    baseline : dict
+        Results from an earlier run.
+
+    current : dict
+        Results from this run.
+
+    threshold : float, optional
+        The allowed fractional slowdown in median time.
+
+    Returns
+    -------
+    out : list [dict]
+        The benchmarks whose median time grew by more than the threshold, with the
+        baseline and current median times and their ratio.
+    """
+    regressions = []
+    for name, res in current['results'].iteritems():
+        base = baseline['results'].get(name)
+        if base is None or base['median'] <= 0:
+            continue
+        ratio = res['median'] / base['median']
+        if ratio > 1.0 + threshold:
+            regressions.append({'benchmark': name,
+                                'baseline': base['median'],
+                                'current': res['median'],
+                                'ratio': ratio})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time XFrame operations on synthetic data.')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--columns', type=int, default=4)
+    parser.add_argument('--cardinality', type=int, default=1000)
+    parser.add_argument('--skew', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cores', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='*', choices=BENCHMARKS.keys(),
+                        help='run only these benchmarks')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed fractional slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.columns, args.cardinality, args.skew, args.seed,
+                  args.cores, args.repeat, args.only)
+    for name, res in results['results'].iteritems():
+        print '{:<16} min {:8.3f}s  median {:8.3f}s'.format(name, res['min'], res['median'])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for reg in regressions:
+            print >>sys.stderr, 'Regression: {} {:.3f}s -> {:.3f}s ({:.0%} slower)'.format(
+                reg['benchmark'], reg['baseline'], reg['current'], reg['ratio'] - 1.0)
+        if len(regressions) > 0:
+            return 1
+    return 0
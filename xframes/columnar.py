@@ -0,0 +1,198 @@
+"""
+Columnar storage for XFrame partitions.
+
+A partition is stored as a single ColumnBlock, holding one sequence per column.
+Columns of int or float values are stored in an array.array, and columns of
+datetime values in a numpy datetime64 array, if numpy is available.  These take a
+fraction of the memory of the python objects, and pickle much faster when the
+block is cached or shuffled.  Other columns, and columns with missing values, are
+stored as lists.
+
+The same blocks are used in the native save format.  Each partition is saved as one
+record holding a compressed chunk for each column, so that a load can decompress only
+the columns it needs.  The statistics of each chunk are kept in the metadata.
+"""
+
+import array
+import datetime
+import itertools
+import math
+import pickle
+import zlib
+
+from xframes.deps import HAS_NUMPY
+
+if HAS_NUMPY:
+    import numpy
+
+
+def _all_of_type(values, typ):
+    # exact type: bool is not stored as int, and datetime subclasses carry extra data
+    return all(type(value) is typ for value in values)
+
+
+def encode_column(values, column_type):
+    """
+    Returns the most compact sequence that holds the column values.
+
+    Parameters
+    ----------
+    values : list
+        The column values.
+
+    column_type : type
+        The column type.
+    """
+    if column_type is int and _all_of_type(values, int):
+        try:
+            return array.array('l', values)
+        except OverflowError:
+            return values
+    if column_type is float and _all_of_type(values, float):
+        return array.array('d', values)
+    if column_type is datetime.datetime and HAS_NUMPY and _all_of_type(values, datetime.datetime) and \
+            all(value.tzinfo is None for value in values):
+        return numpy.array(values, dtype='datetime64[us]')
+    return values
+
+
+def decode_column(column):
+    """
+    Returns the column values as a list of python values.
+    """
+    if isinstance(column, list):
+        return column
+    # array.array and numpy arrays both convert their elements to python values
+    return column.tolist()
+
+
+def _compress_column(column, mask):
+    if isinstance(column, list):
+        return list(itertools.compress(column, mask))
+    if isinstance(column, array.array):
+        return array.array(column.typecode, itertools.compress(column, mask))
+    return column[numpy.array(mask, dtype=bool)]
+
+
+class ColumnBlock(object):
+    """
+    The rows of one partition, stored by column.
+    """
+    def __init__(self, num_rows, columns):
+        self.num_rows = num_rows
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, rows, column_types):
+        """
+        Build a block from an iterable of row tuples.
+        """
+        rows = list(rows)
+        columns = [encode_column([row[i] for row in rows], typ) for i, typ in enumerate(column_types)]
+        return cls(len(rows), columns)
+
+    def rows(self):
+        """
+        Returns an iterator over the rows of the block, as tuples.
+        """
+        if len(self.columns) == 0:
+            return itertools.repeat((), self.num_rows)
+        return itertools.izip(*[decode_column(column) for column in self.columns])
+
+    def column_values(self, index):
+        """
+        Returns the values of a column as a list.
+        """
+        return decode_column(self.columns[index])
+
+    def select(self, indexes):
+        """
+        Returns a block with the given columns.
+        """
+        return ColumnBlock(self.num_rows, [self.columns[i] for i in indexes])
+
+    def compress(self, mask):
+        """
+        Returns a block with the rows where mask is true.
+        """
+        mask = list(mask)
+        return ColumnBlock(sum(1 for keep in mask if keep),
+                           [_compress_column(column, mask) for column in self.columns])
+
+
+def to_blocks(column_types):
+    """
+    Returns a partition function that converts rows into a single ColumnBlock.
+    """
+    def build_block(iterator):
+        yield ColumnBlock.from_rows(iterator, column_types)
+    return build_block
+
+
+def block_rows(block):
+    """
+    Returns the rows of a block.  Used with flatMap to convert blocks into rows.
+    """
+    return block.rows()
+
+
+# Native save format
+
+# Version of the saved format.  Directories saved before versioning hold pickled rows,
+#  and their metadata is a list rather than a dict.
+FORMAT_VERSION = 2
+
+# zlib level: the chunks are compressed on every save, so favor speed
+_COMPRESSION_LEVEL = 1
+
+_STATS_TYPES = (int, long, float, str, datetime.datetime)
+
+
+def column_stats(values, column_type):
+    """
+    Returns the min, max, and null count of the column values.
+
+    Min and max are only computed for types that can be ordered, and are None if the
+    column has no values.
+    """
+    present = [value for value in values if value is not None and
+               not (isinstance(value, float) and math.isnan(value))]
+    stats = {'null_count': len(values) - len(present), 'min': None, 'max': None}
+    if len(present) > 0 and isinstance(column_type, type) and issubclass(column_type, _STATS_TYPES):
+        stats['min'] = min(present)
+        stats['max'] = max(present)
+    return stats
+
+
+def _pack_column(column):
+    return zlib.compress(pickle.dumps(column, pickle.HIGHEST_PROTOCOL), _COMPRESSION_LEVEL)
+
+
+def _unpack_column(chunk):
+    return pickle.loads(zlib.decompress(chunk))
+
+
+def encode_chunks(column_types):
+    """
+    Returns a partition function for mapPartitionsWithIndex that encodes the rows of the
+    partition as one record of compressed column chunks.
+
+    Each record is (partition index, row count, column stats, chunks).
+    """
+    def encode(index, iterator):
+        block = ColumnBlock.from_rows(iterator, column_types)
+        stats = [column_stats(block.column_values(i), typ) for i, typ in enumerate(column_types)]
+        yield index, block.num_rows, stats, [_pack_column(column) for column in block.columns]
+    return encode
+
+
+def decode_chunks(indexes):
+    """
+    Returns a function that decodes a saved record into a ColumnBlock with the given columns.
+
+    Only the chunks of those columns are decompressed.
+    """
+    def decode(record):
+        _, num_rows, _, chunks = record
+        return ColumnBlock(num_rows, [_unpack_column(chunks[i]) for i in indexes])
+    return decode
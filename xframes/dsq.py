@@ -23,19 +23,37 @@ environment, like Spark.
 
 Modifications by Charles Hayden
   Use array instead of list for counts.
+  Batch increments, using numpy when it is available.
 """
 
 import sys
 import random
 import array
 import itertools
+import operator
 from math import isnan, ceil, log, e as euler
 
+from xframes.deps import HAS_NUMPY
+
+if HAS_NUMPY:
+    import numpy
+
 
 def exp2(x):
     return 2. ** x
 
 
+def _add_counts(counts, added):
+    """Returns the sum of an array of counts and a numpy array, as an array of counts."""
+    total = numpy.frombuffer(counts, dtype=numpy.intc) + added
+    if len(total) > 0 and total.max() > numpy.iinfo(numpy.intc).max:
+        # the same error as incrementing the array one count at a time
+        raise OverflowError('signed integer is greater than maximum')
+    res = array.array('i')
+    res.fromstring(total.astype(numpy.intc).tostring())
+    return res
+
+
 class CMSketch(object):
     """Count-min sketch data structure.
     
@@ -71,21 +89,56 @@ class CMSketch(object):
             j = hash(key) ^ mask
             self._counts[self.hash_index(i, j)] += 1
 
+    def increment_many(self, keys):
+        """Increment counters for each hashable object in keys.
+
+        The counts are the same as calling increment on each key, but each key
+        is hashed once, and the counters of the whole batch are updated with
+        numpy when it is available.
+        """
+        hashes = [hash(key) for key in keys]
+        if len(hashes) == 0:
+            return
+        if HAS_NUMPY:
+            hashes = numpy.array(hashes, dtype=numpy.int64)
+            # numpy % takes the sign of the divisor, like python %
+            indexes = numpy.concatenate([self.width * i + (hashes ^ mask) % self.width
+                                         for i, mask in enumerate(self._masks)])
+            added = numpy.bincount(indexes, minlength=self.width * self.depth)
+            self._counts = _add_counts(self._counts, added)
+            return
+        for (i, mask) in enumerate(self._masks):
+            for h in hashes:
+                self._counts[self.hash_index(i, h ^ mask)] += 1
+
     def get(self, key):
         """Get estimated count for hashable object key."""
         return min([self._counts[self.hash_index(i, hash(key) ^ mask)]
                     for i, mask in enumerate(self._masks)])
 
+    def get_many(self, keys):
+        """Get estimated counts for each hashable object in keys, as a list."""
+        hashes = [hash(key) for key in keys]
+        if HAS_NUMPY and len(hashes) > 0:
+            counts = numpy.frombuffer(self._counts, dtype=numpy.intc)
+            hashes = numpy.array(hashes, dtype=numpy.int64)
+            estimates = [counts[self.width * i + (hashes ^ mask) % self.width]
+                         for i, mask in enumerate(self._masks)]
+            return numpy.min(estimates, axis=0).tolist()
+        return [min([self._counts[self.hash_index(i, h ^ mask)]
+                     for i, mask in enumerate(self._masks)])
+                for h in hashes]
+
     def merge(self, other):
         """Merge other CMSketch with this CMSketch.
 
         The width, depth, and hash_state must be identical.
         """
         self._check_compatibility(other)
-        for i in xrange(self.depth):
-            for j in xrange(self.width):
-                ix = self.hash_index(i, j)
-                self._counts[ix] += other.counts()[ix]
+        if HAS_NUMPY:
+            self._counts = _add_counts(self._counts, numpy.frombuffer(other.counts(), dtype=numpy.intc))
+        else:
+            self._counts = array.array('i', itertools.imap(operator.add, self._counts, other.counts()))
         return self
 
     def _check_compatibility(self, other):
@@ -15,6 +15,9 @@ import itertools
 #
 BIG_PRIME = 9223372036854775783
 
+# the most distinct keys whose sketch indexes increment_many remembers
+INDEX_CACHE_SIZE = 10000
+
 
 def _random_parameter():
     return random.randrange(0, BIG_PRIME - 1)
@@ -114,10 +117,49 @@ class FreqSketch(object):
         res = (a * x + b) % BIG_PRIME % self.width
         return res
 
+    def _indexes(self, key):
+        # the index of the counter for key in each row
+        x = abs(hash(key))
+        return [self.hash_index(row, self._hash_function(x, hash_function_params))
+                for row, hash_function_params in enumerate(self.hash_function_params)]
+
     def _update_sketch(self, key, increment):
-        for row, hash_function_params in enumerate(self.hash_function_params):
-            column = self._hash_function(abs(hash(key)), hash_function_params)
-            self.count[self.hash_index(row, column)] += increment
+        for index in self._indexes(key):
+            self.count[index] += increment
+
+    def increment_many(self, keys):
+        """
+        Increments the sketch for each of the keys, in order.
+
+        The sketch and the top items are the same as calling increment on each
+        key.  The counter indexes of each distinct key are computed once, rather
+        than once for each time it occurs.
+
+        Parameters
+        ----------
+        keys : iterable
+            The items to count.
+
+        Examples
+        --------
+        >>> s = FreqSketch(40, 0.005, 10**-7)
+        >>> s.increment_many(['http://www.cnn.com/', 'http://www.bbc.com/', 'http://www.cnn.com/'])
+
+        """
+        count = self.count
+        index_cache = {}
+        for key in keys:
+            indexes = index_cache.get(key)
+            if indexes is None:
+                if len(index_cache) >= INDEX_CACHE_SIZE:
+                    index_cache.clear()
+                indexes = self._indexes(key)
+                index_cache[key] = indexes
+            estimate = sys.maxint
+            for index in indexes:
+                count[index] += 1
+                estimate = min(count[index], estimate)
+            self.update_heap(key, estimate)
 
     def update(self, key, increment):
         """
@@ -140,7 +182,7 @@ class FreqSketch(object):
         self._update_sketch(key, increment)
         self.update_heap(key)
 
-    def update_heap(self, key):
+    def update_heap(self, key, estimate=None):
         """
         Updates the class's heap that keeps track of the top k items for a
         given key
@@ -154,8 +196,12 @@ class FreqSketch(object):
         key : string
             The item to check against the heap
 
+        estimate : int, optional
+            The sketch estimate for the key, if it is already known.
+
         """
-        estimate = self.get(key)
+        if estimate is None:
+            estimate = self.get(key)
 
         # smallest element is found by peekitem()
         if len(self.heap) < self.k or estimate >= self.heap.peekitem()[1][0]:
@@ -187,9 +233,8 @@ class FreqSketch(object):
 
         """
         value = sys.maxint
-        for row, hash_function_params in enumerate(self.hash_function_params):
-            column = self._hash_function(abs(hash(key)), hash_function_params)
-            value = min(self.count[self.hash_index(row, column)], value)
+        for index in self._indexes(key):
+            value = min(self.count[index], value)
 
         return value
 
@@ -213,8 +258,7 @@ class FreqSketch(object):
         value_iterator : iterator
             Produces the values whose frequency is to be counted.
         """
-        for value in value_iterator:
-            self.increment(value)
+        self.increment_many(value_iterator)
         yield self
 
     @staticmethod
@@ -0,0 +1,221 @@
+"""
+HyperLogLog++ estimates of the number of distinct values.
+
+As described in Flajolet, Fusy, Gandouet and Meunier:
+    HyperLogLog: the analysis of a near-optimal cardinality estimation algorithm.
+    http://algo.inria.fr/flajolet/Publications/FlFuGaMe07.pdf
+
+with the improvements of Heule, Nunkesser and Hall:
+    HyperLogLog in Practice: Algorithmic Engineering of a State of The Art
+    Cardinality Estimation Algorithm.
+    https://research.google.com/pubs/pub40671.html
+
+Each value is hashed to 64 bits.  The first bits of the hash select a register, and
+the register keeps the longest run of leading zeros seen in the rest of the hash.
+The registers of sketches built on different partitions are merged by taking the
+maximum of each one.  The standard error of the estimate is about
+1.04 / sqrt(2 ** precision).
+
+While there are few distinct values, the sketch is sparse: it keeps only the
+registers that are set, at a precision of 25 bits, and counts them exactly with
+linear counting.  Once it grows past a fraction of the size of the dense registers it
+switches to them.  Instead of the empirical bias correction tables of HyperLogLog++,
+the dense estimate uses the improved estimator of Ertl, which is unbiased over the
+whole range of cardinalities:
+    New cardinality estimation algorithms for HyperLogLog sketches.
+    https://arxiv.org/abs/1702.01284
+"""
+
+import math
+import zlib
+
+DEFAULT_PRECISION = 12
+
+# precision of the sparse representation
+SPARSE_PRECISION = 25
+
+_MASK64 = (1 << 64) - 1
+
+
+def _seed(value):
+    # The builtin hash() is not used: hash(-1) == hash(-2), objects without their own
+    #  hash are hashed by address, and str hashes differ between workers when hash
+    #  randomization is on.  Ints are their own seed, so distinct ints never collide
+    #  before mixing.  Other values are seeded with a digest of their type and repr.
+    #  Equal values are counted once, as they are by distinct(): True is 1, 2.0 is 2,
+    #  and a unicode string is the same as its utf-8 str.
+    if isinstance(value, (int, long)):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, unicode):
+        text = 'str:' + value.encode('utf-8')
+    elif isinstance(value, str):
+        text = 'str:' + value
+    else:
+        text = '{}:{!r}'.format(type(value).__name__, value)
+    # two crc32 digests, the second of the reversed text, fill 64 bits
+    return (zlib.crc32(text) & 0xffffffff) << 32 | (zlib.crc32(text[::-1]) & 0xffffffff)
+
+
+def hash64(value):
+    """
+    Returns a well mixed 64-bit hash of the value.
+
+    The hash is the same on every worker.  Ints are hashed by their value, and
+    other values by a digest of their type and representation, so values that
+    are not hashable (lists, dicts, and arrays) can be counted too.  The seed is
+    mixed with the splitmix64 finalizer.
+    """
+    x = _seed(value) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _sigma(x):
+    if x == 1.0:
+        return float('inf')
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        z_old = z
+        z += x * y
+        y += y
+        if z == z_old:
+            return z
+
+
+def _tau(x):
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y = 1.0
+    z = 1.0 - x
+    while True:
+        x = math.sqrt(x)
+        z_old = z
+        y *= 0.5
+        z -= (1.0 - x) ** 2 * y
+        if z == z_old:
+            return z / 3.0
+
+
+class HyperLogLog(object):
+    """
+    Mergeable distinct value counter.
+
+    Attributes:
+        precision: (int) the number of hash bits that select a register
+        sparse: (dict) the rank in each set sparse register, or None if dense
+        registers: (bytearray) the rank in each dense register, or None if sparse
+    """
+    def __init__(self, precision=DEFAULT_PRECISION):
+        """
+        Init a HyperLogLog with 2 ** precision registers.
+
+        Precision must be between 4 and 18.  Each added bit of precision halves
+        the variance of the estimate and doubles the memory.
+        """
+        if precision < 4 or precision > 18:
+            raise ValueError('precision must be between 4 and 18')
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.sparse = {}
+        self.registers = None
+        # the sparse registers take more memory per entry than the dense ones
+        self._sparse_limit = self.num_registers // 8
+
+    def _to_dense(self):
+        registers = bytearray(self.num_registers)
+        for sparse_index, sparse_rank in self.sparse.iteritems():
+            index, rank = self._dense_entry(sparse_index, sparse_rank)
+            if rank > registers[index]:
+                registers[index] = rank
+        self.registers = registers
+        self.sparse = None
+
+    def _dense_entry(self, sparse_index, sparse_rank):
+        # The bits of the sparse index after the dense index come before the rest of
+        #  the hash, so they are counted first.
+        shift = SPARSE_PRECISION - self.precision
+        index = sparse_index >> shift
+        bits = sparse_index & ((1 << shift) - 1)
+        if bits != 0:
+            return index, shift - bits.bit_length() + 1
+        return index, shift + sparse_rank
+
+    def add_hash(self, hashed):
+        """Add a value, given its 64-bit hash."""
+        if self.sparse is not None:
+            rest_bits = 64 - SPARSE_PRECISION
+            index = hashed >> rest_bits
+            rank = rest_bits - (hashed & ((1 << rest_bits) - 1)).bit_length() + 1
+            if rank > self.sparse.get(index, 0):
+                self.sparse[index] = rank
+                if len(self.sparse) > self._sparse_limit:
+                    self._to_dense()
+            return
+        rest_bits = 64 - self.precision
+        index = hashed >> rest_bits
+        rank = rest_bits - (hashed & ((1 << rest_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, value):
+        """Add a value."""
+        self.add_hash(hash64(value))
+
+    def update(self, values):
+        """Add each of the values."""
+        for value in values:
+            self.add_hash(hash64(value))
+        return self
+
+    def __call__(self, value_iterator):
+        """Makes HyperLogLog usable with PySpark mapPartitions()."""
+        self.update(value_iterator)
+        yield self
+
+    def merge(self, other):
+        """Merge another HyperLogLog with the same precision into this one."""
+        if self.precision != other.precision:
+            raise ValueError('HyperLogLog precisions do not match.')
+        if self.sparse is not None and other.sparse is not None:
+            for index, rank in other.sparse.iteritems():
+                if rank > self.sparse.get(index, 0):
+                    self.sparse[index] = rank
+            if len(self.sparse) > self._sparse_limit:
+                self._to_dense()
+            return self
+        if self.sparse is not None:
+            self._to_dense()
+        if other.sparse is not None:
+            for sparse_index, sparse_rank in other.sparse.iteritems():
+                index, rank = self._dense_entry(sparse_index, sparse_rank)
+                if rank > self.registers[index]:
+                    self.registers[index] = rank
+        else:
+            self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self):
+        """Returns the estimated number of distinct values, as a float."""
+        if self.sparse is not None:
+            # linear counting over the sparse registers
+            m = 1 << SPARSE_PRECISION
+            return m * math.log(float(m) / (m - len(self.sparse)))
+        m = self.num_registers
+        q = 64 - self.precision
+        counts = [0] * (q + 2)
+        for rank in self.registers:
+            counts[rank] += 1
+        z = m * _tau(1.0 - float(counts[q + 1]) / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + counts[k])
+        z += m * _sigma(float(counts[0]) / m)
+        return m * m / (2.0 * math.log(2.0) * z)
+
+    def count(self):
+        """Returns the estimated number of distinct values."""
+        return int(round(self.estimate()))
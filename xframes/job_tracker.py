@@ -0,0 +1,211 @@
+"""
+Links spark jobs to the XFrame and XArray operations that run them.
+
+When tracking is on, each XFrame and XArray action (an operation that runs spark
+jobs, such as len, save, or sum) runs under its own spark job group, whose
+description names the operation and the line that called it.  The report gives
+the jobs, stages, tasks, shuffle bytes, and duration of each operation that ran
+spark jobs.
+
+The actions are wrapped only while tracking is on, so there is no cost when it is off.
+"""
+
+import sys
+import time
+import json
+import types
+import urllib2
+import threading
+import functools
+import itertools
+from collections import deque
+from sys import stderr
+
+from xframes.spark_context import CommonSparkContext
+from xframes import object_utils
+
+_group_ids = itertools.count()
+_state = threading.local()
+
+
+class JobTracker(object):
+    # the most recent operations that ran spark jobs
+    operations = deque(maxlen=1000)
+    # the classes whose actions are tracked
+    classes = []
+
+    @staticmethod
+    def track(name, fn):
+        """
+        Wrap a function so that it runs in a spark job group for the operation `name`.
+
+        Calls made while another operation is running belong to the outer operation.
+        """
+        @functools.wraps(fn)
+        def tracked(*args, **kwargs):
+            sc = CommonSparkContext.existing_spark_context()
+            if sc is None or not object_utils.TRACK_OPERATIONS or getattr(_state, 'active', False):
+                return fn(*args, **kwargs)
+            caller = sys._getframe(1)
+            call_site = '{}:{}'.format(caller.f_code.co_filename, caller.f_lineno)
+            group_id = 'xframes-{}'.format(next(_group_ids))
+            prev_group = sc.getLocalProperty('spark.jobGroup.id')
+            prev_description = sc.getLocalProperty('spark.job.description')
+            prev_interrupt = sc.getLocalProperty('spark.job.interruptOnCancel')
+            sc.setJobGroup(group_id, '{} at {}'.format(name, call_site))
+            _state.active = True
+            start = time.time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                duration = time.time() - start
+                _state.active = False
+                sc.setLocalProperty('spark.jobGroup.id', prev_group)
+                sc.setLocalProperty('spark.job.description', prev_description)
+                sc.setLocalProperty('spark.job.interruptOnCancel', prev_interrupt)
+                # operations that ran no jobs would push the others out
+                job_ids = sc.statusTracker().getJobIdsForGroup(group_id)
+                if len(job_ids) > 0:
+                    JobTracker.operations.append({'operation': name,
+                                                  'call_site': call_site,
+                                                  'group': group_id,
+                                                  'duration': duration})
+        return tracked
+
+    @staticmethod
+    def track_actions(*names):
+        """
+        Class decorator: track the named methods of the class, which run spark jobs.
+        """
+        def register(cls):
+            cls._tracked_actions = names
+            JobTracker.classes.append(cls)
+            if object_utils.TRACK_OPERATIONS:
+                JobTracker._install(cls)
+            return cls
+        return register
+
+    @staticmethod
+    def _install(cls):
+        # Replace the actions with tracked versions.  The originals are restored when
+        #  tracking is turned off.
+        if '_tracked_originals' in cls.__dict__:
+            return
+        originals = {}
+        for name in cls._tracked_actions:
+            member = cls.__dict__[name]
+            op_name = '{}.{}'.format(cls.__name__, name)
+            if isinstance(member, types.FunctionType):
+                wrapped = JobTracker.track(op_name, member)
+            elif isinstance(member, staticmethod):
+                wrapped = staticmethod(JobTracker.track(op_name, member.__func__))
+            elif isinstance(member, classmethod):
+                wrapped = classmethod(JobTracker.track(op_name, member.__func__))
+            else:
+                continue
+            originals[name] = member
+            setattr(cls, name, wrapped)
+        cls._tracked_originals = originals
+
+    @staticmethod
+    def _remove(cls):
+        if '_tracked_originals' not in cls.__dict__:
+            return
+        for name, member in cls._tracked_originals.items():
+            setattr(cls, name, member)
+        del cls._tracked_originals
+
+    @staticmethod
+    def set_tracking(track):
+        """
+        Turn operation tracking on or off.
+        """
+        object_utils.TRACK_OPERATIONS = track
+        for cls in JobTracker.classes:
+            if track:
+                JobTracker._install(cls)
+            else:
+                JobTracker._remove(cls)
+
+    @staticmethod
+    def clear():
+        """
+        Forget the operations recorded so far.
+        """
+        JobTracker.operations.clear()
+
+    @staticmethod
+    def _rest_get(sc, path):
+        # The status tracker does not report shuffle bytes, so they are read from the
+        #  monitoring api of the spark ui, if it is available.
+        try:
+            ui_url = sc.uiWebUrl
+            if ui_url is None:
+                return None
+            url = '{}/api/v1/applications/{}/{}'.format(ui_url, sc.applicationId, path)
+            return json.load(urllib2.urlopen(url, timeout=5))
+        except Exception:
+            return None
+
+    @staticmethod
+    def report():
+        """
+        Returns the spark metrics of each operation that ran spark jobs.
+
+        Returns
+        -------
+        out : list [dict]
+            One entry per operation, in the order they ran.  Each contains the 'operation',
+            the 'call_site' that called it, its 'jobs' ids, the number of 'stages' and 'tasks',
+            the 'shuffle_read_bytes' and 'shuffle_write_bytes' (None if the spark ui
+            is not available), and the 'duration' in seconds.
+        """
+        sc = CommonSparkContext.existing_spark_context()
+        if sc is None:
+            return []
+        tracker = sc.statusTracker()
+        res = []
+        for op in list(JobTracker.operations):
+            job_ids = sorted(tracker.getJobIdsForGroup(op['group']))
+            if len(job_ids) == 0:
+                continue
+            stage_ids = []
+            for job_id in job_ids:
+                info = tracker.getJobInfo(job_id)
+                if info is not None:
+                    stage_ids.extend(info.stageIds)
+            tasks = 0
+            shuffle_read = 0
+            shuffle_write = 0
+            for stage_id in stage_ids:
+                info = tracker.getStageInfo(stage_id)
+                if info is not None:
+                    tasks += info.numTasks
+                attempts = JobTracker._rest_get(sc, 'stages/{}'.format(stage_id))
+                if attempts is None:
+                    shuffle_read = shuffle_write = None
+                elif shuffle_read is not None:
+                    for attempt in attempts:
+                        shuffle_read += attempt.get('shuffleReadBytes', 0)
+                        shuffle_write += attempt.get('shuffleWriteBytes', 0)
+            res.append({'operation': op['operation'],
+                        'call_site': op['call_site'],
+                        'jobs': job_ids,
+                        'stages': len(stage_ids),
+                        'tasks': tasks,
+                        'shuffle_read_bytes': shuffle_read,
+                        'shuffle_write_bytes': shuffle_write,
+                        'duration': op['duration']})
+        return res
+
+    @staticmethod
+    def print_report():
+        """
+        Print the spark metrics of each operation that ran spark jobs.
+        """
+        print >>stderr, '{:<24} {:>5} {:>6} {:>6} {:>14} {:>14} {:>10}  {}'.format(
+            'operation', 'jobs', 'stages', 'tasks', 'shuffle read', 'shuffle write', 'duration', 'call site')
+        for op in JobTracker.report():
+            print >>stderr, '{:<24} {:>5} {:>6} {:>6} {:>14} {:>14} {:>10.3f}  {}'.format(
+                op['operation'], len(op['jobs']), op['stages'], op['tasks'],
+                op['shuffle_read_bytes'], op['shuffle_write_bytes'], op['duration'], op['call_site'])
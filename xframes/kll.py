@@ -0,0 +1,171 @@
+"""
+KLL quantile sketch.
+
+As described in Karnin, Lang and Liberty:
+    Optimal Quantile Approximation in Streams.
+    https://arxiv.org/abs/1603.05346
+
+Values are kept in a hierarchy of compactors.  When a compactor is full, its values
+are sorted, and every other one is promoted to the next level, where it stands for
+twice as many values.  The capacity of the compactors shrinks geometrically below
+the top level, so the memory is bounded by about 3 * k values, however many values
+are added.  No bounds on the values need to be known in advance: any values that
+can be compared, such as numbers or datetimes, can be sketched.
+
+Sketches built on different partitions are merged by combining their compactors
+level by level.  The error in the rank of a returned quantile is about 1.7 / k of
+the number of values with high probability, so the default k of 200 gives ranks
+within about 1%.  The minimum and maximum are kept exactly.
+"""
+
+import math
+import random
+
+DEFAULT_K = 200
+MIN_K = 8
+
+
+class KLLSketch(object):
+    """
+    Mergeable quantile sketch.
+
+    Attributes:
+        k: (int) the capacity of the top compactor, which sets the accuracy
+        count: (int) the number of values added
+        min_val: the smallest value added
+        max_val: the largest value added
+    """
+    def __init__(self, k=DEFAULT_K, seed=1729):
+        """
+        Init a KLLSketch with accuracy parameter k.
+
+        seed is fed to the random generator that chooses which values are promoted.
+        """
+        if k < MIN_K:
+            raise ValueError('k must be at least {}'.format(MIN_K))
+        self.k = k
+        self.count = 0
+        self.min_val = None
+        self.max_val = None
+        self.compactors = []
+        self.size = 0
+        self.max_size = 0
+        self._rng = random.Random(seed)
+        self._grow()
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * (2.0 / 3.0) ** depth)) + 1
+
+    def _grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _compact(self, level):
+        # promote every other value, from a random start, and keep one value back
+        #  if there is an odd number of them
+        values = self.compactors[level]
+        values.sort()
+        keep = [values.pop(self._rng.randrange(len(values)))] if len(values) % 2 == 1 else []
+        self.compactors[level + 1].extend(values[self._rng.randint(0, 1)::2])
+        self.compactors[level] = keep
+
+    def _compress(self):
+        while self.size >= self.max_size:
+            for level in range(len(self.compactors)):
+                if len(self.compactors[level]) >= self._capacity(level):
+                    if level + 1 >= len(self.compactors):
+                        self._grow()
+                    self._compact(level)
+                    break
+            self.size = sum(len(values) for values in self.compactors)
+
+    def update(self, value):
+        """Add a value.  Missing values should be removed by the caller."""
+        self.count += 1
+        if self.min_val is None or value < self.min_val:
+            self.min_val = value
+        if self.max_val is None or value > self.max_val:
+            self.max_val = value
+        self.compactors[0].append(value)
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def update_many(self, values):
+        """Add each of the values."""
+        for value in values:
+            self.update(value)
+        return self
+
+    def __call__(self, value_iterator):
+        """Makes KLLSketch usable with PySpark mapPartitions()."""
+        self.update_many(value_iterator)
+        yield self
+
+    def merge(self, other):
+        """Merge another KLLSketch into this one."""
+        if self.k != other.k:
+            raise ValueError('KLLSketch k values do not match.')
+        if other.count == 0:
+            return self
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for level, values in enumerate(other.compactors):
+            self.compactors[level].extend(values)
+        self.count += other.count
+        if self.min_val is None or other.min_val < self.min_val:
+            self.min_val = other.min_val
+        if self.max_val is None or other.max_val > self.max_val:
+            self.max_val = other.max_val
+        self.size = sum(len(values) for values in self.compactors)
+        self._compress()
+        return self
+
+    def _weighted_values(self):
+        # each value at a level stands for 2 ** level of the values added
+        weighted = [(value, 1 << level) for level, values in enumerate(self.compactors) for value in values]
+        weighted.sort(key=lambda item: item[0])
+        return weighted
+
+    def quantiles(self, fractions):
+        """
+        Returns the estimated value at each of the given fractions of the values.
+
+        Fractions of 0 and 1 give the exact minimum and maximum.  If the sketch is
+        empty, the results are None.
+        """
+        if self.count == 0:
+            return [None for _ in fractions]
+        weighted = self._weighted_values()
+        total = float(sum(weight for _, weight in weighted))
+        res = []
+        for fraction in fractions:
+            if fraction <= 0.0:
+                res.append(self.min_val)
+                continue
+            if fraction >= 1.0:
+                res.append(self.max_val)
+                continue
+            target = fraction * total
+            cumulative = 0
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    res.append(value)
+                    break
+            else:
+                res.append(self.max_val)
+        return res
+
+    def quantile(self, fraction):
+        """Returns the estimated value at the given fraction of the values."""
+        return self.quantiles([fraction])[0]
+
+    def rank(self, value):
+        """Returns the estimated fraction of the values that are no greater than value."""
+        if self.count == 0:
+            return 0.0
+        weighted = self._weighted_values()
+        total = float(sum(weight for _, weight in weighted))
+        return sum(weight for item, weight in weighted if item <= value) / total
@@ -21,6 +21,26 @@ LAZY_FOOTER_STRS = ['Note: Only the head of the XFrame is printed. This XFrame i
 MAX_ROW_WIDTH = 70
 HTML_MAX_ROW_WIDTH = 120
 
+# Joins broadcast a side whose row count is known to be no more than this.
+BROADCAST_JOIN_MAX_ROWS = 100000
+
+# Iteration collects the next partition in the background while the current one is consumed.
+ITERATOR_PREFETCH = True
+
+# Bytes of executor storage that persisted RDDs may use before the least recently used
+#  ones are unpersisted.  None means no limit.
+STORAGE_BUDGET = None
+
+# Each XFrame and XArray action runs its spark jobs in its own job group.
+TRACK_OPERATIONS = False
+
+# XFrames store their persisted partitions as blocks of columns.
+COLUMNAR_STORAGE = False
+
+# Column types are inferred from this many rows sampled across all partitions.
+#  None means the first 100 rows.
+TYPE_INFERENCE_SAMPLE = None
+
 
 def version():
     return xframes.version.__version__
@@ -1,12 +1,12 @@
 
-from pprint import pprint
+import json
 from sys import stderr
 
 
 from xframes.xrdd import XRdd
 from xframes.xarray_impl import XArrayImpl
 from xframes.xframe_impl import XFrameImpl
- 
+
 
 class PerfTracker(object):
     @staticmethod
@@ -26,17 +26,42 @@ class PerfTracker(object):
         XFrameImpl.set_perf_count(enable)
         XArrayImpl.set_perf_count(enable)
 
+    @staticmethod
+    def perf_data():
+        """
+        Returns the perf counts as a dict.
+
+        The keys are 'XRDD', 'XArray', and 'XFrame', for the classes being tracked.
+        Each one holds a dict of method name to the number of 'calls', the cumulative
+        wall 'time' in seconds, and the ids of the spark 'jobs' run during the calls.
+        """
+        data = {}
+        for label, cls in [('XRDD', XRdd), ('XArray', XArrayImpl), ('XFrame', XFrameImpl)]:
+            perf = cls.get_perf_count()
+            if perf:
+                data[label] = {name: {'calls': stats['calls'],
+                                      'time': stats['time'],
+                                      'jobs': sorted(stats['jobs'])}
+                               for name, stats in perf.iteritems()}
+        return data
+
+    @staticmethod
+    def perf_json(indent=None):
+        """
+        Returns the perf counts as a JSON string.
+        """
+        return json.dumps(PerfTracker.perf_data(), indent=indent, sort_keys=True)
+
     @staticmethod
     def print_perf():
-        perf = XRdd.get_perf_count()
-        if perf:
-            print >>stderr, 'XRDD'
-            pprint(perf, stream=stderr)
-        perf = XArrayImpl.get_perf_count()
-        if perf:
-            print >>stderr, 'XArray'
-            pprint(perf, stream=stderr)
-        perf = XFrameImpl.get_perf_count()
-        if perf:
-            print >>stderr, 'XFrame'
-            pprint(perf, stream=stderr)
+        data = PerfTracker.perf_data()
+        for label in ['XRDD', 'XArray', 'XFrame']:
+            perf = data.get(label)
+            if not perf:
+                continue
+            print >>stderr, label
+            print >>stderr, '    {:<32} {:>8} {:>12} {:>6}'.format('method', 'calls', 'time', 'jobs')
+            for name in sorted(perf, key=lambda name: -perf[name]['time']):
+                stats = perf[name]
+                print >>stderr, '    {:<32} {:>8} {:>12.4f} {:>6}'.format(
+                    name, stats['calls'], stats['time'], len(stats['jobs']))
@@ -11,12 +11,14 @@ Copyright (c) 2017, Charles Hayden
 All rights reserved.
 """
 
+import math
 import operator
 from math import sqrt
 
 from xframes.xarray import XArray
 from xframes.xframe import XFrame
 from xframes.sketch_impl import SketchImpl
+from xframes.kll import MIN_K
 
 __all__ = ['Sketch']
 
@@ -134,7 +136,7 @@ class Sketch(object):
     """
 
     # todo rewrite to not take mutable default
-    def __init__(self, array=None, sub_sketch_keys=[], impl=None):
+    def __init__(self, array=None, sub_sketch_keys=[], impl=None, eager=False):
         """__init__(array)
         Construct a new Sketch from an XArray.
 
@@ -147,6 +149,11 @@ class Sketch(object):
             The list of sub sketch to calculate, for XArray of dictionary type.
             key needs to be a string, for XArray of vector(array) type, the key
             needs to be positive integer
+
+        eager : bool, optional
+            If True, all the statistics are computed in a single pass over the array
+            when the sketch is constructed.  Otherwise each statistic is computed
+            when it is first requested.
         """
         if impl:
             self._impl = impl
@@ -155,24 +162,55 @@ class Sketch(object):
             if not isinstance(array, XArray):
                 raise TypeError("Sketch object can only be constructed from XArrays")
 
-            self._impl.construct_from_xarray(array.impl(), sub_sketch_keys)
+            self._impl.construct_from_xarray(array.impl(), sub_sketch_keys, eager)
+
+    def set_quantile_sketch_parms(self, k=None):
+        """
+        Set the quantile sketch accuracy settings.
+
+        Parameters
+        ----------
+        k: int, optional
+            The capacity of the top level of the KLL sketch.  The error in the rank
+            of a quantile is about 1.7 / k, and the sketch holds about 3 * k values.
+            Defaults to 200.
+        """
+        self._impl.set_quantile_sketch_params(k)
 
     def set_quantile_accumulator_parms(self, num_levels=None, epsilon=None, delta=None):
         """
         Set the quantile accumulator accuracy settings.
 
+        The quantiles are computed with a KLL sketch, so only epsilon is used.
+        Prefer :func:`~xframes.Sketch.set_quantile_sketch_parms`.
+
         Parameters
         ----------
         num_levels: int, optional
-            The number of levels of hash map.
+            Not used.
 
         epsilon: float (0 .. 1.0), optional
-            The precision of the result
+            The precision of the result.  Values above about 0.2 are coarser than the
+            sketch supports, and give the precision of its smallest size.
 
         delta: float (0 .. 1.0), optional
-            The probability that the precision specified above is not achieved.
+            Not used.
         """
-        self._impl.set_quantile_accumulator_params(num_levels, epsilon, delta)
+        k = max(int(math.ceil(1.7 / epsilon)), MIN_K) if epsilon else None
+        self._impl.set_quantile_sketch_params(k)
+
+    def set_distinct_count_parms(self, precision=None):
+        """
+        Set the distinct count accuracy settings.
+
+        Parameters
+        ----------
+        precision: int (4 .. 18), optional
+            The number of hash bits used to select a HyperLogLog register.  The
+            standard error of the estimate is about 1.04 / sqrt(2 ** precision).
+            Defaults to 12.
+        """
+        self._impl.set_distinct_count_params(precision)
 
     def set_frequency_sketch_parms(self, num_items=None, epsilon=None, delta=None):
         """
@@ -422,17 +460,24 @@ class Sketch(object):
         """
         return int(self._impl.num_undefined())
 
-    def num_unique(self):
+    def num_unique(self, exact=False):
         """
         Returns a sketched estimate of the number of unique values in the
         XArray based on the Hyperloglog sketch.
 
+        Parameters
+        ----------
+        exact : bool, optional
+            If True, count the unique values exactly.  This shuffles every
+            distinct value, so it is much slower on columns with many of them.
+
         Returns
         -------
-        out : float
-            An estimate of the number of unique values in the XArray.
+        out : int
+            An estimate of the number of unique values in the XArray, or the
+            exact number.
         """
-        return int(self._impl.num_unique())
+        return int(self._impl.num_unique(exact))
 
     def frequent_items(self):
         """
@@ -478,12 +523,14 @@ class Sketch(object):
     def quantile(self, quantile_val):
         """
         Returns a sketched estimate of the value at a particular quantile
-        between 0.0 and 1.0. The quantile is guaranteed to be accurate within
-        1%: meaning that if you ask for the 0.55 quantile, the returned value is
-        guaranteed to be between the true 0.54 quantile and the true 0.56
-        quantile. The quantiles are only defined for numeric arrays and this
-        function will raise an exception if called on a sketch constructed for a
-        non-numeric column.
+        between 0.0 and 1.0. The quantile is accurate within about 1% with high
+        probability: meaning that if you ask for the 0.55 quantile, the returned
+        value is between the true 0.54 quantile and the true 0.56 quantile.
+        The 0.0 and 1.0 quantiles are the exact minimum and maximum.
+        The quantiles are estimated with a KLL sketch, built in a single pass
+        over the array.  They are only defined for numeric and date arrays and
+        this function will raise an exception if called on a sketch constructed
+        for another type of column.
 
         Parameters
         ----------
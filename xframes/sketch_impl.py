@@ -4,20 +4,25 @@ This module provides an implementation of Sketch using pySpark RDDs.
 
 import math
 import datetime
+import itertools
 from collections import Counter
 import copy
 import logging
 
 
 from xframes.traced_object import TracedObject
-from xframes.dsq import QuantileAccumulator
 from xframes.frequent import FreqSketch
+from xframes.hyperloglog import HyperLogLog, DEFAULT_PRECISION
+from xframes.kll import KLLSketch, DEFAULT_K
 from xframes.type_utils import is_numeric_type, is_date_type
 from xframes import xarray_impl
 from xframes.deps import HAS_PY4J
 
 __all__ = ['Sketch']
 
+# number of values SummaryAccumulator passes to the frequency sketch at a time
+BATCH_SIZE = 4096
+
 
 def is_missing(x):
     if x is None:
@@ -32,6 +37,119 @@ def normalize_number(x):
     return None if is_missing(x) else x
 
 
+class SummaryAccumulator(object):
+    """
+    Accumulates all the statistics of a sketch in one pass over the values.
+
+    Each partition is summarized by one accumulator, and the accumulators are merged.
+    It holds the count of values and missing values, the min, max, mean and variance
+    of numeric values (min and max of dates), the total length of str, list and dict
+    values, a HyperLogLog of the distinct values, the frequent items, and a KLL
+    quantile sketch of numeric and date values.
+    """
+    def __init__(self, sketch_type, dtype, frequency_params, distinct_precision, quantile_k):
+        self.sketch_type = sketch_type
+        self.measure_length = dtype in [list, dict, str]
+        self.frequency_params = frequency_params
+        self.num_missing = 0
+        self.n = 0
+        self.sum = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.min_max_failed = False
+        self.length_sum = 0
+        self.distinct = HyperLogLog(distinct_precision)
+        self.frequent = {}
+        self.quantiles = KLLSketch(quantile_k) if sketch_type in ['numeric', 'date'] else None
+
+    def _add_numeric(self, value):
+        self.n += 1
+        self.sum += value
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def _add_date(self, value):
+        self.n += 1
+        if self.min_max_failed:
+            return
+        try:
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+            self.quantiles.update(value)
+        except TypeError:
+            # a mixture of offset-naive and offset-aware times cannot be ordered
+            self.min_max_failed = True
+
+    def __call__(self, value_iterator):
+        """
+        Summarize the values of a partition.  Usable with mapPartitions().
+        """
+        frequency_sketch = FreqSketch(*self.frequency_params)
+        value_iterator = iter(value_iterator)
+        while True:
+            batch = list(itertools.islice(value_iterator, BATCH_SIZE))
+            if len(batch) == 0:
+                break
+            frequency_sketch.increment_many(batch)
+            self._add_batch(batch)
+        self.frequent = frequency_sketch.frequent_items()
+        yield self
+
+    def _add_batch(self, values):
+        distinct = self.distinct
+        for value in values:
+            distinct.add(value)
+            if is_missing(value):
+                self.num_missing += 1
+                continue
+            if self.sketch_type == 'numeric':
+                self._add_numeric(value)
+                self.quantiles.update(value)
+            elif self.sketch_type == 'date':
+                self._add_date(value)
+            else:
+                self.n += 1
+            if self.measure_length:
+                self.length_sum += len(value)
+
+    def merge(self, other):
+        """
+        Merge the summary of other values into this one.
+        """
+        if other.n > 0:
+            n = self.n + other.n
+            delta = other.mean - self.mean
+            self.mean += delta * other.n / n
+            self.m2 += other.m2 + delta * delta * self.n * other.n / n
+            self.sum += other.sum
+            self.n = n
+        self.num_missing += other.num_missing
+        self.length_sum += other.length_sum
+        self.min_max_failed = self.min_max_failed or other.min_max_failed
+        if not self.min_max_failed:
+            try:
+                if other.min is not None and (self.min is None or other.min < self.min):
+                    self.min = other.min
+                if other.max is not None and (self.max is None or other.max > self.max):
+                    self.max = other.max
+                if self.quantiles is not None:
+                    self.quantiles.merge(other.quantiles)
+            except TypeError:
+                self.min_max_failed = True
+        self.distinct.merge(other.distinct)
+        self.frequent = FreqSketch.merge_accumulators(self.frequent, other.frequent)
+        return self
+
+
 class SketchImpl(TracedObject):
 
     entry_trace = False
@@ -53,35 +171,38 @@ class SketchImpl(TracedObject):
         self.avg_len = None
         self.num_undefined_val = None
         self.num_unique_val = None
-        self.quantile_accumulator = None
-        self.quantile_accumulator_num_levels = None
-        self.quantile_accumulator_epsilon = None
-        self.quantile_accumulator_delta = None
+        self.num_unique_exact_val = None
+        self.distinct_count_precision = None
+        self.quantile_sketch = None
+        self.quantile_sketch_k = None
         self.frequency_sketch = None
         self.frequency_sketch_num_items = None
         self.frequency_sketch_epsilon = None
         self.frequency_sketch_delta = None
 
-    def set_quantile_accumulator_params(self, num_levels, epsilon, delta):
-        self.quantile_accumulator_num_levels = num_levels
-        self.quantile_accumulator_epsilon = epsilon
-        self.quantile_accumulator_delta = delta
+    def set_quantile_sketch_params(self, k):
+        self.quantile_sketch_k = k
+        # quantiles are computed again with this accuracy
+        self.quantile_sketch = None
+
+    def set_distinct_count_params(self, precision):
+        self.distinct_count_precision = precision
+        # the estimate is computed again with this precision
+        self.num_unique_val = None
 
     def set_frequency_sketch_params(self, num_items, epsilon, delta):
         self.frequency_sketch_num_items = num_items
         self.frequency_sketch_epsilon = epsilon
         self.frequency_sketch_delta = delta
+        # frequent items are computed again with these parameters
+        self.frequency_sketch = None
 
-    def construct_from_xarray(self, xa, sub_sketch_keys=None):
-        self._entry(sub_sketch_keys=sub_sketch_keys)
+    def construct_from_xarray(self, xa, sub_sketch_keys=None, eager=False):
+        self._entry(sub_sketch_keys=sub_sketch_keys, eager=eager)
         if sub_sketch_keys is not None:
             raise NotImplementedError('sub_sketch_keys mode not implemented')
 
-        # these are not going through the xrdd layer -- should they?
-        defined = xa.to_rdd().filter(lambda x: not is_missing(x))
-        defined.cache()
         self.dtype = xa.dtype()
-        self.count = defined.count()
         if is_numeric_type(self.dtype):
             self.sketch_type = 'numeric'
         elif is_date_type(self.dtype):
@@ -89,10 +210,61 @@ class SketchImpl(TracedObject):
         else:
             self.sketch_type = 'non-numeric'
 
-        # compute others later if needed
+        # these are not going through the xrdd layer -- should they?
         self._rdd = xa.to_rdd()
+        defined = self._rdd.filter(lambda x: not is_missing(x))
+        if eager:
+            self.defined = defined
+            self._construct_eager()
+            return
+
+        defined.cache()
+        self.count = defined.count()
+        # compute others later if needed
         self.defined = defined
 
+    def _construct_eager(self):
+        # compute all the statistics in one pass
+        frequency_params = (self.frequency_sketch_num_items or 500,
+                            self.frequency_sketch_epsilon or 0.0001,
+                            self.frequency_sketch_delta or 0.01)
+        accumulator = SummaryAccumulator(self.sketch_type, self.dtype, frequency_params,
+                                         self.distinct_count_precision or DEFAULT_PRECISION,
+                                         self.quantile_sketch_k or DEFAULT_K)
+        summary = self._rdd.mapPartitions(accumulator).treeAggregate(accumulator,
+                                                                     lambda x, y: x.merge(y),
+                                                                     lambda x, y: x.merge(y))
+        self.count = summary.n
+        self.num_undefined_val = summary.num_missing
+        self.num_unique_val = summary.distinct.count()
+        self.frequency_sketch = summary.frequent
+        if self.count == 0:
+            self.avg_len = 0
+        elif self.dtype in [int, float, datetime.datetime]:
+            self.avg_len = 1
+        elif self.dtype in [list, dict, str]:
+            self.avg_len = summary.length_sum / float(self.count)
+        else:
+            self.avg_len = 0
+        if self.sketch_type == 'numeric':
+            self.min_val = summary.min
+            self.max_val = summary.max
+            # the same values as the spark stats: the variance is the population variance
+            self.mean_val = summary.mean
+            self.sum_val = summary.sum
+            self.variance_val = summary.m2 / summary.n if summary.n > 0 else None
+            self.stdev_val = math.sqrt(self.variance_val) if summary.n > 0 else None
+            self.quantile_sketch = summary.quantiles
+        elif self.sketch_type == 'date':
+            if summary.min_max_failed:
+                logging.warn('Datetime max or min did not compute.  ' +
+                             'Possible mixture of offset-native and offset-aware times.')
+            else:
+                self.min_val = summary.min
+                self.max_val = summary.max
+                self.quantile_sketch = summary.quantiles
+        self.stats = summary
+
     def _create_stats(self):
         # calculate some basic statistics
         if self.stats is None:
@@ -121,13 +293,11 @@ class SketchImpl(TracedObject):
                 self.stdev_val = normalize_number(stats.stdev())
                 self.stats = stats
 
-    def _create_quantile_accumulator(self):
-        num_levels = self.quantile_accumulator_num_levels or 10
-        epsilon = self.quantile_accumulator_epsilon or 0.001
-        delta = self.quantile_accumulator_delta or 0.01
-        accumulator = QuantileAccumulator(self.min_val, self.max_val, num_levels, epsilon, delta)
-        accumulators = self._rdd.mapPartitions(accumulator)
-        return accumulators.reduce(lambda x, y: x.merge(y))
+    def _create_quantile_sketch(self):
+        # one pass: the sketch needs no bounds on the values
+        accumulator = KLLSketch(self.quantile_sketch_k or DEFAULT_K)
+        accumulators = self.defined.mapPartitions(accumulator)
+        return accumulators.treeAggregate(accumulator, lambda x, y: x.merge(y), lambda x, y: x.merge(y))
 
     def _create_frequency_sketch(self):
         num_items = self.frequency_sketch_num_items or 500
@@ -190,14 +360,23 @@ class SketchImpl(TracedObject):
             self.num_undefined_val = self._rdd.filter(lambda x: is_missing(x)).count()
         return self.num_undefined_val
 
-    def num_unique(self):
+    def _create_distinct_count(self):
+        accumulator = HyperLogLog(self.distinct_count_precision or DEFAULT_PRECISION)
+        accumulators = self._rdd.mapPartitions(accumulator)
+        return accumulators.treeAggregate(accumulator, lambda x, y: x.merge(y), lambda x, y: x.merge(y))
+
+    def num_unique(self, exact=False):
+        if exact:
+            if self.num_unique_exact_val is None:
+                # distinct fails if the values are not hashable
+                if self.dtype in [list, dict]:
+                    rdd = self._rdd.map(lambda x: str(x))
+                else:
+                    rdd = self._rdd
+                self.num_unique_exact_val = rdd.distinct().count()
+            return self.num_unique_exact_val
         if self.num_unique_val is None:
-            # distinct fails if the values are not hashable
-            if self.dtype in [list, dict]:
-                rdd = self._rdd.map(lambda x: str(x))
-            else:
-                rdd = self._rdd
-            self.num_unique_val = rdd.distinct().count()
+            self.num_unique_val = self._create_distinct_count().count()
         return self.num_unique_val
 
     def frequent_items(self):
@@ -267,10 +446,9 @@ class SketchImpl(TracedObject):
 
     def get_quantile(self, quantile_val):
         if self.sketch_type == 'numeric' or self.sketch_type == 'date':
-            if self.quantile_accumulator is None:
-                self._create_stats()
-                self.quantile_accumulator = self._create_quantile_accumulator()
-            return self.quantile_accumulator.ppf(quantile_val)
+            if self.quantile_sketch is None:
+                self.quantile_sketch = self._create_quantile_sketch()
+            return self.quantile_sketch.quantile(quantile_val)
         raise ValueError('get_quantile only available for numeric or date types')
 
     def frequency_count(self, element):
@@ -274,6 +274,21 @@ class CommonSparkContext(object):
         """
         return CommonSparkContext()._sc
 
+    @staticmethod
+    def existing_spark_context():
+        """
+        Returns the spark context if it has already been created, otherwise None.
+
+        Unlike spark_context, this never creates the context.
+
+        Returns
+        -------
+        :class:`~pyspark.SparkContext`
+            The SparkContext object from spark, or None.
+        """
+        instance = CommonSparkContext.instance
+        return None if instance is None else instance._sc
+
     @staticmethod
     def spark_config():
         """
@@ -0,0 +1,61 @@
+from __future__ import absolute_import
+
+import pytest
+
+# pytest testbenchmark.py
+# pytest testbenchmark.py::TestBenchmarkData
+# pytest testbenchmark.py::TestBenchmarkData::test_deterministic
+
+from xframes.benchmark import data
+from xframes.benchmark.suite import compare
+
+
+# noinspection PyClassHasNoInit
+class TestBenchmarkData:
+    """
+    Tests benchmark data generation
+    """
+
+    def test_deterministic(self):
+        rows1 = list(data.generate_rows(0, 100, 3, 10, 0.0, 1))
+        rows2 = list(data.generate_rows(0, 50, 3, 10, 0.0, 1)) + list(data.generate_rows(50, 100, 3, 10, 0.0, 1))
+        assert rows1 == rows2
+
+    def test_seed(self):
+        rows1 = list(data.generate_rows(0, 10, 3, 10, 0.0, 1))
+        rows2 = list(data.generate_rows(0, 10, 3, 10, 0.0, 2))
+        assert rows1 != rows2
+
+    def test_types(self):
+        row = next(data.generate_rows(0, 1, 4, 10, 0.0, 1))
+        assert [type(val) for val in row] == data.column_types(4)
+        assert data.column_names(4) == ['key', 'c0', 'c1', 'c2', 'c3']
+
+    def test_cardinality(self):
+        keys = set([row[0] for row in data.generate_rows(0, 1000, 1, 5, 0.0, 1)])
+        assert keys == set(range(5))
+
+    def test_skew(self):
+        keys = [row[0] for row in data.generate_rows(0, 1000, 1, 100, 2.0, 1)]
+        assert keys.count(0) > 400
+
+    def test_make_xframe(self):
+        xf = data.make_xframe(100, num_columns=2, key_cardinality=10, seed=1, num_partitions=3)
+        assert len(xf) == 100
+        assert xf.column_names() == ['key', 'c0', 'c1']
+        assert list(xf['key']) == [row[0] for row in data.generate_rows(0, 100, 2, 10, 0.0, 1)]
+
+
+# noinspection PyClassHasNoInit
+class TestBenchmarkCompare:
+    """
+    Tests benchmark comparison
+    """
+
+    def test_compare(self):
+        baseline = {'results': {'sort': {'median': 1.0}, 'join': {'median': 2.0}}}
+        current = {'results': {'sort': {'median': 1.5}, 'join': {'median': 2.1}, 'apply': {'median': 1.0}}}
+        regressions = compare(baseline, current, threshold=0.2)
+        assert len(regressions) == 1
+        assert regressions[0]['benchmark'] == 'sort'
+        assert regressions[0]['ratio'] == pytest.approx(1.5)
@@ -5,7 +5,11 @@ from __future__ import absolute_import
 # pytest testsketch::TestSketchConstructor
 # pytest testsketch::TestSketchConstructor::test_construct
 
+import datetime
+
 from xframes.xarray import XArray
+from xframes.dsq import CMSketch
+from xframes.frequent import FreqSketch
 
 
 def almost_equal(a, b, places=None, delta=None):
@@ -78,6 +82,34 @@ class TestSketchConstructor:
         ss = t.sketch_summary()
         assert ss.num_unique() == 5
 
+    def test_num_unique_negative(self):
+        # hash(-1) == hash(-2) in python
+        t = XArray([-1, -2, -1])
+        ss = t.sketch_summary()
+        assert ss.num_unique() == 2
+
+    def test_num_unique_exact(self):
+        t = XArray([1, 2, 3, 2, 1, None])
+        ss = t.sketch_summary()
+        assert ss.num_unique(exact=True) == 4
+
+    def test_num_unique_approx(self):
+        t = XArray(range(20000) * 2)
+        ss = t.sketch_summary()
+        assert abs(ss.num_unique() - 20000) < 20000 * 0.05
+
+    def test_num_unique_list(self):
+        t = XArray([[1, 2], [3], [1, 2]])
+        ss = t.sketch_summary()
+        assert ss.num_unique() == 2
+        assert ss.num_unique(exact=True) == 2
+
+    def test_distinct_count_parms(self):
+        t = XArray(range(20000))
+        ss = t.sketch_summary()
+        ss.set_distinct_count_parms(precision=16)
+        assert abs(ss.num_unique() - 20000) < 20000 * 0.02
+
     def test_frequent_items(self):
         t = XArray([1, 2, 3, 2])
         ss = t.sketch_summary()
@@ -113,6 +145,30 @@ class TestSketchConstructor:
         assert almost_equal(ss.quantile(0.9), 5, places=1)
         assert almost_equal(ss.quantile(0.99), 5, places=1)
 
+    def test_quantile_min_max(self):
+        t = XArray([3, 1, 5, 2, 4, None])
+        ss = t.sketch_summary()
+        assert ss.quantile(0.0) == 1
+        assert ss.quantile(1.0) == 5
+
+    def test_quantile_date(self):
+        t = XArray([datetime.datetime(2015, 1, i) for i in range(1, 6)])
+        ss = t.sketch_summary()
+        assert ss.quantile(0.5) == datetime.datetime(2015, 1, 3)
+
+    def test_quantile_sketch_parms(self):
+        t = XArray(range(10000))
+        ss = t.sketch_summary()
+        ss.set_quantile_sketch_parms(k=1000)
+        assert almost_equal(ss.quantile(0.5), 5000, delta=50)
+
+    def test_quantile_accumulator_parms_coarse(self):
+        t = XArray(range(100))
+        ss = t.sketch_summary()
+        ss.set_quantile_accumulator_parms(epsilon=0.5)
+        assert ss.quantile(0.0) == 0
+        assert ss.quantile(1.0) == 99
+
     def test_frequency_count(self):
         t = XArray([1, 2, 3, 4, 5, 3])
         ss = t.sketch_summary()
@@ -129,3 +185,108 @@ class TestSketchConstructor:
         assert ss.std() is None
         assert ss.max() is None
         assert ss.avg_length() == 0
+
+
+# noinspection PyClassHasNoInit
+class TestSketchEager:
+    """
+    Tests sketch computed in a single pass
+    """
+
+    def test_stats(self):
+        t = XArray([1, 2, 3, 4, 5])
+        ss = t.sketch_summary(eager=True)
+        assert ss.size() == 5
+        assert ss.max() == 5
+        assert ss.min() == 1
+        assert ss.sum() == 15
+        assert ss.mean() == 3
+        assert almost_equal(ss.std(), 1.4142135623730951)
+        assert almost_equal(ss.var(), 2.0)
+        assert ss.avg_length() == 1
+
+    def test_avg_length_list(self):
+        t = XArray([[1, 2, 3, 4], [5, 6]])
+        ss = t.sketch_summary(eager=True)
+        assert ss.avg_length() == 3
+
+    def test_num_undefined(self):
+        t = XArray([1, 2, None, 4, None])
+        ss = t.sketch_summary(eager=True)
+        assert ss.num_undefined() == 2
+        assert ss.size() == 3
+
+    def test_num_unique(self):
+        t = XArray([1, 2, 3, 2, 1, 5])
+        ss = t.sketch_summary(eager=True)
+        assert ss.num_unique() == 4
+
+    def test_frequent_items(self):
+        t = XArray([1, 2, 3, 2])
+        ss = t.sketch_summary(eager=True)
+        assert ss.frequent_items() == {1: 1, 2: 2, 3: 1}
+
+    def test_quantile(self):
+        t = XArray([1, 2, 3, 4, 5])
+        ss = t.sketch_summary(eager=True)
+        assert ss.quantile(0.0) == 1
+        assert ss.quantile(0.5) == 3
+        assert ss.quantile(0.8) == 4
+        assert ss.quantile(1.0) == 5
+
+    def test_quantile_large(self):
+        t = XArray(range(10000))
+        ss = t.sketch_summary(eager=True)
+        assert almost_equal(ss.quantile(0.5), 5000, delta=200)
+        assert almost_equal(ss.quantile(0.9), 9000, delta=200)
+
+    def test_missing(self):
+        t = XArray([None], dtype=int)
+        ss = t.sketch_summary(eager=True)
+        assert ss.min() is None
+        assert ss.max() is None
+        assert ss.mean() == 0.0
+        assert ss.sum() == 0.0
+        assert ss.var() is None
+        assert ss.std() is None
+        assert ss.avg_length() == 0
+
+
+# noinspection PyClassHasNoInit
+class TestSketchBatch:
+    """
+    Tests batch updates of count-min sketches
+    """
+
+    keys = [i % 37 for i in range(5000)] + ['a', 'b', None, -1, -2, 2 ** 40]
+
+    def test_cm_increment_many(self):
+        hash_state = CMSketch.generate_hash_state(4)
+        scalar = CMSketch(50, 4, hash_state)
+        for key in self.keys:
+            scalar.increment(key)
+        batch = CMSketch(50, 4, hash_state)
+        batch.increment_many(self.keys[:1000])
+        batch.increment_many(self.keys[1000:])
+        assert list(batch.counts()) == list(scalar.counts())
+        assert batch.get_many(self.keys) == [scalar.get(key) for key in self.keys]
+
+    def test_cm_merge(self):
+        hash_state = CMSketch.generate_hash_state(4)
+        sketch1 = CMSketch(50, 4, hash_state)
+        sketch1.increment_many(self.keys)
+        sketch2 = CMSketch(50, 4, hash_state)
+        sketch2.increment_many(self.keys[:100])
+        expected = list(sketch1.counts())
+        sketch2.increment_many(self.keys[100:])
+        sketch1.merge(sketch2)
+        assert list(sketch1.counts()) == [2 * count for count in expected]
+
+    def test_freq_increment_many(self):
+        scalar = FreqSketch(10, 0.01, 0.01)
+        for key in self.keys:
+            scalar.increment(key)
+        batch = FreqSketch(10, 0.01, 0.01)
+        batch.increment_many(iter(self.keys))
+        assert list(batch.count) == list(scalar.count)
+        assert batch.frequent_items() == scalar.frequent_items()
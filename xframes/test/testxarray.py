@@ -14,6 +14,7 @@ import pickle
 from xframes import XArray
 from xframes import XFrame
 from xframes import object_utils
+from xframes.spark_context import CommonSparkContext
 
 
 def almost_equal(a, b, places=None, delta=None):
@@ -236,6 +237,20 @@ class TestXArrayConstructorLoad:
         with pytest.raises(ValueError):
             _ = XArray('files/does-not-exist')
 
+    def test_construct_local_file_type_sample(self):
+        path = 'tmp/array-type-sample'
+        with open(path, 'w') as f:
+            for i in range(1000):
+                f.write('{}\n'.format(i))
+            f.write('1.5\n')
+        XFrame.set_type_inference_sample(2000)
+        try:
+            t = XArray(path)
+        finally:
+            XFrame.set_type_inference_sample(None)
+        assert len(t) == 1001
+        assert t.dtype() is float
+
 
 # noinspection PyClassHasNoInit
 class TestXArrayReadText:
@@ -330,6 +345,14 @@ class TestXArraySaveBinary:
         t.save(path, format='binary')
         assert os.path.isdir(path)
 
+    def test_save_load(self, tmpdir):
+        t = XArray([datetime.datetime(2015, 8, 15), None, datetime.datetime(2017, 10, 17)])
+        path = os.path.join(str(tmpdir), 'array-binary')
+        t.save(path, format='binary')
+        res = XArray(path)
+        assert res.dtype() is datetime.datetime
+        assert list(res) == [datetime.datetime(2015, 8, 15), None, datetime.datetime(2017, 10, 17)]
+
 
 # noinspection PyClassHasNoInit
 class TestXArraySaveText:
@@ -374,6 +397,25 @@ class TestXArraySaveCsv:
             assert f.readline().strip() == '2'
             assert f.readline().strip() == '3'
 
+    def test_save_partitions(self, tmpdir):
+        t = XArray(range(1000))
+        path = os.path.join(str(tmpdir), 'array-csv.csv')
+        t.save(path)
+        with open(path) as f:
+            assert [line.strip() for line in f] == [str(i) for i in range(1000)]
+
+    def test_save_parts(self, tmpdir):
+        t = XArray(['a', 'b,c', 'd'])
+        path = os.path.join(str(tmpdir), 'array-csv.csv')
+        t.save(path, single_file=False)
+        assert os.path.isdir(path)
+        lines = []
+        for name in sorted(os.listdir(path)):
+            if name.startswith('part-'):
+                with open(os.path.join(path, name)) as f:
+                    lines.extend(line.strip() for line in f)
+        assert lines == ['a', '"b,c"', 'd']
+
 
 # noinspection PyClassHasNoInit
 class TestXArrayRepr:
@@ -453,6 +495,16 @@ class TestXArrayIterator:
         for elem, expect in zip(t, [0, 1, 2]):
             assert elem == expect
 
+    def test_iter_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        t = XArray.from_rdd(sc.parallelize(range(100), 4), int)
+        assert list(t) == range(100)
+
+    def test_iter_empty_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        t = XArray.from_rdd(sc.parallelize(range(3), 8), int)
+        assert list(t) == [0, 1, 2]
+
 
 # noinspection PyClassHasNoInit
 class TestXArrayAddScalar:
@@ -749,6 +801,55 @@ class TestXArrayOpUnary:
         assert res[2] == 3
 
 
+# noinspection PyClassHasNoInit
+class TestXArrayOpNumeric:
+    """
+    Tests XArray numeric operations with missing values, division by zero, and large values
+    """
+    # noinspection PyTypeChecker
+    def test_missing_arithmetic(self):
+        t = XArray([1, None, 3])
+        assert list(t + 1) == [2, None, 4]
+        assert list(10 - t) == [9, None, 7]
+        assert list(t * XArray([2, 2, None])) == [2, None, None]
+        assert list(-t) == [-1, None, -3]
+
+    def test_missing_compare(self):
+        t = XArray([1, None, 3])
+        res = t > 2
+        assert res.dtype() is int
+        assert list(res) == [False, False, True]
+        assert list(t < 2) == [True, True, False]
+        assert list(t == XArray([1, None, 4])) == [True, True, False]
+
+    # noinspection PyTypeChecker
+    def test_div_by_zero(self):
+        t = XArray([1, 6, 9])
+        assert list(t / 0) == [None, None, None]
+        assert list(t / XArray([1, 0, 2])) == [1, None, 4]
+        assert list(12 / XArray([0, 4, 5])) == [None, 3, 2]
+        assert list(XArray([1.0, 3.0]) / XArray([0.0, 2.0])) == [None, 1.5]
+
+    # noinspection PyTypeChecker
+    def test_int_results(self):
+        t = XArray([-7, 7])
+        assert list(t / 2) == [-4, 3]
+        res = list(t * 2)
+        assert res == [-14, 14]
+        assert all(type(val) is int for val in res)
+        assert list(t ** -1) == [-1.0 / 7, 1.0 / 7]
+
+    # noinspection PyTypeChecker
+    def test_large_int(self):
+        t = XArray([2 ** 40, 3])
+        assert list(t * t) == [2 ** 80, 9]
+
+    def test_float(self):
+        t = XArray([1.5, None, -2.5])
+        assert list(abs(t)) == [1.5, None, 2.5]
+        assert list(t * 2) == [3.0, None, -5.0]
+
+
 # noinspection PyClassHasNoInit
 class TestXArrayLogicalFilter:
     """
@@ -789,6 +890,15 @@ class TestXArrayCopyRange:
         t = XArray([1, 2, 3])
         assert t[-1] == 3
 
+    def test_copy_range_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        t = XArray.from_rdd(sc.parallelize(range(100), 4), int)
+        assert t[0] == 0
+        assert t[30] == 30
+        assert t[-1] == 99
+        res = t[20:60:7]
+        assert list(res) == [20, 27, 34, 41, 48, 55]
+
     def test_copy_range_index_err(self):
         t = XArray([1, 2, 3])
         with pytest.raises(IndexError):
@@ -941,7 +1051,7 @@ class TestXArrayTableLineage:
         res.save(path, format='binary')
         with open(os.path.join(path, '_metadata')) as f:
             metadata = pickle.load(f)
-        assert metadata is int
+        assert metadata['dtype'] is int
         with open(os.path.join(path, '_lineage')) as f:
             lineage = pickle.load(f)
             table_lineage = lineage[0]
@@ -1231,6 +1341,11 @@ class TestXArrayHead:
         t = XArray(range(100))
         assert len(t.head(5)) == 5
 
+    def test_head_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        t = XArray.from_rdd(sc.parallelize(range(100), 4), int)
+        assert list(t.head(30)) == range(30)
+
 
 # noinspection PyClassHasNoInit
 class TestXArrayVectorSlice:
@@ -1787,6 +1902,15 @@ class TestXArrayMean:
         t = XArray([1.0, 2.0, 3.0])
         assert t.mean() == 2.0
 
+    def test_mean_missing(self):
+        t = XArray([1.0, None, 3.0, float('nan')])
+        assert t.mean() == 2.0
+
+    def test_mean_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        t = XArray.from_rdd(sc.parallelize(range(101), 7), int)
+        assert t.mean() == 50.0
+
 
 # noinspection PyClassHasNoInit
 class TestXArrayStd:
@@ -1837,6 +1961,37 @@ class TestXArrayVar:
         expect = 2.0 / 3.0
         assert t.var() == expect
 
+    def test_var_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        t = XArray.from_rdd(sc.parallelize(range(10), 3), int)
+        assert almost_equal(t.var(), 8.25)
+        assert almost_equal(t.var(ddof=1), 82.5 / 9)
+
+
+# noinspection PyClassHasNoInit
+class TestXArraySummaryStats:
+    """
+    Tests XArray reductions that share summary statistics
+    """
+    def test_stats_repeated(self):
+        t = XArray([3, 1, None, 0, 2])
+        assert t.max() == 3
+        assert t.min() == 0
+        assert t.sum() == 6
+        assert t.mean() == 1.5
+        assert t.num_missing() == 1
+        assert t.nnz() == 3
+        assert t.all() is False
+        assert t.any() is True
+        assert t.max() == 3
+
+    def test_stats_after_filter(self):
+        t = XArray([3, 1, 0, 2])
+        assert t.max() == 3
+        res = t.filter(lambda x: x < 3)
+        assert res.max() == 2
+        assert t.max() == 3
+
 
 # noinspection PyClassHasNoInit
 class TestXArrayNumMissing:
@@ -2174,6 +2329,12 @@ class TestXArrayTail:
         res = t.tail(100)
         assert res == range(1, 100)
 
+    def test_tail_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        t = XArray.from_rdd(sc.parallelize(range(100), 4), int)
+        res = t.tail(30)
+        assert list(res) == range(70, 100)
+
 
 # noinspection PyClassHasNoInit
 class TestXArrayCountna:
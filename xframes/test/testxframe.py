@@ -5,6 +5,7 @@ import pytest
 import os
 import math
 import copy
+import gc
 from datetime import datetime
 import array
 import pickle
@@ -22,7 +23,8 @@ from xframes import XFrame
 from xframes.spark_context import CommonSparkContext
 from xframes import object_utils
 from xframes.aggregate import SUM, ARGMAX, ARGMIN, MAX, MIN, COUNT, MEAN, \
-    VARIANCE, STDV, SELECT_ONE, CONCAT, VALUES, VALUES_COUNT
+    VARIANCE, STDV, SELECT_ONE, CONCAT, VALUES, VALUES_COUNT, \
+    COUNT_DISTINCT_APPROX, QUANTILE
 
 
 def almost_equal(a, b, places=None, delta=None):
@@ -582,6 +584,58 @@ class TestXFrameReadCsv:
         assert res[1] == {'id': None, 'val': 'b'}
         assert res[2] == {'id': 3, 'val': 'c'}
 
+    def test_read_csv_bom(self):
+        path = 'tmp/frame-bom.csv'
+        with open(path, 'w') as f:
+            f.write('\xef\xbb\xbfid,val\n1,a\n2,b\n')
+        res = XFrame.read_csv(path)
+        assert len(res) == 2
+        assert res.column_names() == ['id', 'val']
+        assert res.column_types() == [int, str]
+        assert res[0] == {'id': 1, 'val': 'a'}
+        assert res[1] == {'id': 2, 'val': 'b'}
+
+    def test_read_csv_many_rows(self):
+        path = 'tmp/frame-many-rows.csv'
+        with open(path, 'w') as f:
+            f.write('id,val,name\n')
+            for i in range(2500):
+                f.write('{},{},"n{}"\n'.format(i, i * 0.5, i))
+        res = XFrame.read_csv(path)
+        assert len(res) == 2500
+        assert res.column_types() == [int, float, str]
+        assert res[0] == {'id': 0, 'val': 0.0, 'name': 'n0'}
+        assert res[2499] == {'id': 2499, 'val': 1249.5, 'name': 'n2499'}
+        assert res['id'].sum() == sum(range(2500))
+
+    def test_read_csv_type_sample(self):
+        path = 'tmp/frame-type-sample.csv'
+        with open(path, 'w') as f:
+            f.write('id,val\n')
+            for i in range(1000):
+                f.write('{},{}\n'.format(i, i))
+            f.write('1000,1.5\n')
+        XFrame.set_type_inference_sample(2000)
+        try:
+            res = XFrame.read_csv(path)
+        finally:
+            XFrame.set_type_inference_sample(None)
+        assert len(res) == 1001
+        assert res.column_types() == [int, float]
+        assert res[999] == {'id': 999, 'val': 999.0}
+        assert res[1000] == {'id': 1000, 'val': 1.5}
+
+    def test_read_csv_nrows(self):
+        path = 'tmp/frame-nrows.csv'
+        with open(path, 'w') as f:
+            for i in range(3000):
+                f.write('{},v{}\n'.format(i, i))
+        res = XFrame.read_csv(path, header=False, nrows=2000)
+        assert len(res) == 2000
+        assert res.column_types() == [int, str]
+        assert res[0] == {'X.0': 0, 'X.1': 'v0'}
+        assert res[1999] == {'X.0': 1999, 'X.1': 'v1999'}
+
     def test_read_csv_file_not_exist(self):
         path = 'files/does-not-exist.csv'
         with pytest.raises(ValueError) as exception_info:
@@ -715,6 +769,45 @@ class TestXFrameReadParquet:
         assert res[1] == {'id': 2, 'val': {2: 2}}
         assert res[2] == {'id': 3, 'val': {3: 3}}
 
+    def test_read_parquet_select_columns(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c'], 'x': [1.0, 2.0, 3.0]})
+        path = 'tmp/frame-parquet'
+        t.save(path, format='parquet')
+
+        res = XFrame('tmp/frame-parquet.parquet')[['x', 'id']]
+        res = res.sort('id')
+        assert res.column_names() == ['x', 'id']
+        assert res.column_types() == [float, int]
+        assert list(res) == [{'x': 1.0, 'id': 1}, {'x': 2.0, 'id': 2}, {'x': 3.0, 'id': 3}]
+
+    def test_read_parquet_filterby(self):
+        t = XFrame({'id': [1, 2, 3, 4], 'val': ['a', 'b', 'c', 'd']})
+        path = 'tmp/frame-parquet'
+        t.save(path, format='parquet')
+
+        res = XFrame('tmp/frame-parquet.parquet')
+        assert list(res.filterby(['b', 'd'], 'val').sort('id')['id']) == [2, 4]
+        assert list(res.filterby(['b', 'd'], 'val', exclude=True).sort('id')['id']) == [1, 3]
+
+    def test_read_parquet_compare(self):
+        t = XFrame({'id': [1, 2, 3, 4], 'val': ['a', 'b', 'c', 'd']})
+        path = 'tmp/frame-parquet'
+        t.save(path, format='parquet')
+
+        res = XFrame('tmp/frame-parquet.parquet')
+        assert list(res[res['id'] > 2].sort('id')['id']) == [3, 4]
+        assert list(res[(res['id'] >= 2) & (res['val'] != 'c')].sort('id')['id']) == [2, 4]
+        assert list(res[(res['id'] == 1) | (res['id'] == 4)].sort('id')['id']) == [1, 4]
+
+    def test_read_parquet_compare_missing(self):
+        t = XFrame({'id': [1, 2, None], 'val': ['a', 'b', 'c']})
+        path = 'tmp/frame-parquet'
+        t.save(path, format='parquet')
+
+        res = XFrame('tmp/frame-parquet.parquet')
+        assert sorted(res[res['id'] < 2]['val']) == ['a', 'c']
+        assert sorted(res[res['id'] > 1]['val']) == ['b']
+
     def test_read_parquet_not_exist(self):
         path = 'files/does-not-exist.parquet'
         with pytest.raises(ValueError) as exception_info:
@@ -1717,6 +1810,14 @@ class TestXFrameHead:
         assert list(hd['id']) == [1, 2]
         assert list(hd['val']) == ['a', 'b']
 
+    def test_head_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        rdd = sc.parallelize([(i, str(i)) for i in range(500)], 4)
+        t = XFrame.from_rdd(rdd, column_names=['id', 'val'])
+        hd = t.head(200)
+        assert len(hd) == 200
+        assert list(hd['id']) == range(200)
+
 
 # noinspection PyClassHasNoInit
 class TestXFrameTail:
@@ -1731,6 +1832,14 @@ class TestXFrameTail:
         assert list(tl['id']) == [2, 3]
         assert list(tl['val']) == ['b', 'c']
 
+    def test_tail_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        rdd = sc.parallelize([(i, str(i)) for i in range(500)], 4)
+        t = XFrame.from_rdd(rdd, column_names=['id', 'val'])
+        tl = t.tail(200)
+        assert len(tl) == 200
+        assert list(tl['id']) == range(300, 500)
+
 
 # noinspection PyClassHasNoInit
 class TestXFrameToPandasDataframe:
@@ -2118,8 +2227,14 @@ class TestXFrameSaveBinary:
         t.save(path, format='binary')
         with open(os.path.join(path, '_metadata')) as f:
             metadata = pickle.load(f)
-            assert metadata == [['id', 'val'], [int, str]]
-        # TODO find some way to check the data
+        assert metadata['column_names'] == ['id', 'val']
+        assert metadata['column_types'] == [int, str]
+        assert metadata['num_rows'] == 3
+        assert sum(metadata['partition_rows']) == 3
+        stats = [part for part in metadata['stats'] if part[0]['min'] is not None]
+        assert min(part[0]['min'] for part in stats) == 10
+        assert max(part[0]['max'] for part in stats) == 30
+        assert sum(part[1]['null_count'] for part in metadata['stats']) == 0
 
     def test_save_not_exist(self, tmpdir):
         path = os.path.join(str(tmpdir), 'frame')
@@ -2127,6 +2242,28 @@ class TestXFrameSaveBinary:
         t.save(path, format='binary')
         # TODO find some way to check the data
 
+    def test_save_load(self):
+        t = XFrame({'id': [30, 20, 10], 'val': ['a', None, 'c'], 'x': [1.5, 2.5, 3.5]})
+        path = 'tmp/frame-native'
+        t.save(path, format='binary')
+        res = XFrame.load(path).sort('id')
+        assert len(res) == 3
+        assert res.column_names() == ['id', 'val', 'x']
+        assert res.column_types() == [int, str, float]
+        assert res[0] == {'id': 10, 'val': 'c', 'x': 3.5}
+        assert res[1] == {'id': 20, 'val': None, 'x': 2.5}
+
+    def test_load_columns(self):
+        t = XFrame({'id': [30, 20, 10], 'val': ['a', 'b', 'c'], 'x': [1.5, 2.5, 3.5]})
+        path = 'tmp/frame-native-columns'
+        t.save(path, format='binary')
+        res = XFrame.load(path, columns=['x', 'id'])
+        assert len(res) == 3
+        assert res.column_names() == ['x', 'id']
+        assert res.column_types() == [float, int]
+        assert sorted(res['id']) == [10, 20, 30]
+        assert sorted(res['x']) == [1.5, 2.5, 3.5]
+
 
 # noinspection PyClassHasNoInit
 class TestXFrameSaveCsv:
@@ -2152,6 +2289,37 @@ class TestXFrameSaveCsv:
         t.save(path, format='csv')
         # TODO find some way to check the data
 
+    def test_save_partitions(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'frame.csv')
+        t = XFrame({'id': range(100), 'val': [str(i) for i in range(100)]})
+        t = XFrame.from_rdd(t.to_rdd().repartition(5), column_names=['id', 'val'], column_types=[int, str])
+        t.save(path)
+
+        with open(path) as f:
+            lines = [line.rstrip() for line in f]
+        assert lines[0] == 'id,val'
+        assert sorted(lines[1:], key=lambda line: int(line.split(',')[0])) == \
+            ['{},{}'.format(i, i) for i in range(100)]
+
+    def test_save_single_file_order(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'frame.csv')
+        t = XFrame({'id': range(100)}).sort('id', ascending=False)
+        t.save(path)
+
+        with open(path) as f:
+            lines = [line.rstrip() for line in f]
+        assert lines == ['id'] + [str(i) for i in range(99, -1, -1)]
+
+    def test_save_parts(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'frame.csv')
+        t = XFrame({'id': [30, 20, 10], 'val': ['a', 'b', 'c']})
+        t.save(path, single_file=False)
+
+        assert os.path.isdir(path)
+        res = XFrame.read_csv(path)
+        assert res.column_names() == ['id', 'val']
+        assert list(res['id']) == [30, 20, 10]
+
 
 # noinspection PyClassHasNoInit
 class TestXFrameSaveParquet:
@@ -2308,6 +2476,16 @@ class TestXFrameAddColumn:
         assert res.column_names() == ['id', 'val', 'id.2']
         assert res[0] == {'id': 1, 'val': 'a', 'id.2': 3.0}
 
+    def test_add_column_repartitioned(self):
+        sc = CommonSparkContext.spark_context()
+        rdd = sc.parallelize([(i, str(i)) for i in range(20)], 3)
+        tf = XFrame.from_rdd(rdd, column_names=['id', 'val'])
+        tf = tf[tf['id'] % 2 == 0]
+        ta = XArray.from_rdd(sc.parallelize(range(10), 4), int)
+        res = tf.add_column(ta, name='another')
+        assert list(res['id']) == range(0, 20, 2)
+        assert list(res['another']) == range(10)
+
 
 # noinspection PyClassHasNoInit
 class TestXFrameAddColumnsArray:
@@ -2567,6 +2745,49 @@ class TestXFrameReorderColumns:
         assert exception_message == "Column 'x' not assigned'."
 
 
+# noinspection PyClassHasNoInit
+class TestXFrameChainedRowOps:
+    """
+    Tests chains of column and row operations, which are evaluated together
+    """
+
+    def test_chained_projections(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c'], 'x': [3.0, 2.0, 1.0]})
+        res = t.reorder_columns(['x', 'val', 'id']).swap_columns('x', 'id')
+        res = res.remove_column('val')[['x']]
+        assert res.column_names() == ['x']
+        assert list(res) == [{'x': 3.0}, {'x': 2.0}, {'x': 1.0}]
+
+    def test_chained_filter_and_projection(self):
+        t = XFrame({'id': [1, 2, 3, 4], 'val': ['a', 'b', 'c', 'd'], 'x': [3.0, 2.0, 1.0, 0.0]})
+        res = t.filterby([2, 3, 4], 'id').remove_column('x').filterby(['c', 'd'], 'val')
+        res = res.swap_columns('id', 'val')
+        assert len(res) == 2
+        assert res.column_names() == ['val', 'id']
+        assert list(res) == [{'val': 'c', 'id': 3}, {'val': 'd', 'id': 4}]
+
+    def test_chained_column_select(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c'], 'x': [3.0, 2.0, 1.0]})
+        res = t[['val', 'id']]['id']
+        assert list(res) == [1, 2, 3]
+
+    def test_add_column_after_projection(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c'], 'x': [3.0, 2.0, 1.0]})
+        res = t.remove_column('x')
+        res['y'] = t['x'].apply(lambda x: x * 2)
+        assert list(res['y']) == [6.0, 4.0, 2.0]
+        assert res[0] == {'id': 1, 'val': 'a', 'y': 6.0}
+
+    def test_chain_on_persisted(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c'], 'x': [3.0, 2.0, 1.0]})
+        mid = t.swap_columns('id', 'x')
+        mid.persist(True)
+        assert len(mid) == 3
+        res = mid.remove_column('val')
+        assert list(res) == [{'x': 3.0, 'id': 1}, {'x': 2.0, 'id': 2}, {'x': 1.0, 'id': 3}]
+        mid.persist(False)
+
+
 # noinspection PyClassHasNoInit
 class TestXFrameRename:
     """
@@ -2631,6 +2852,22 @@ class TestXFrameGetitem:
         res = t[-2]
         assert res == {'id': 2, 'val': 'b'}
 
+    def test_getitem_int_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        rdd = sc.parallelize([(i, str(i)) for i in range(100)], 4)
+        t = XFrame.from_rdd(rdd, column_names=['id', 'val'])
+        assert t[0] == {'id': 0, 'val': '0'}
+        assert t[30] == {'id': 30, 'val': '30'}
+        assert t[-1] == {'id': 99, 'val': '99'}
+
+    def test_getitem_slice_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        rdd = sc.parallelize([(i, str(i)) for i in range(100)], 4)
+        t = XFrame.from_rdd(rdd, column_names=['id', 'val'])
+        res = t[20:60:7]
+        assert len(res) == 6
+        assert list(res['id']) == [20, 27, 34, 41, 48, 55]
+
     def test_getitem_int_too_low(self):
         t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
         with pytest.raises(IndexError) as exception_info:
@@ -2767,6 +3004,143 @@ class TestXFrameIsMaterialized:
         assert t._is_materialized() is True
 
 
+# noinspection PyClassHasNoInit
+class TestXFramePersist:
+    """
+    Tests XFrame persist and the persistence manager
+    """
+
+    @staticmethod
+    def persisted_ids():
+        return [entry['id'] for entry in XFrame.persisted_rdds()]
+
+    def test_persist(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t.persist(True)
+        rdd_id = t.to_rdd().id()
+        assert rdd_id in self.persisted_ids()
+        t.persist(False)
+        assert rdd_id not in self.persisted_ids()
+
+    def test_persist_released(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t.persist(True)
+        rdd_id = t.to_rdd().id()
+        del t
+        gc.collect()
+        assert rdd_id not in self.persisted_ids()
+
+    def test_persist_shared(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t.persist(True)
+        rdd_id = t.to_rdd().id()
+        t2 = copy.copy(t)
+        del t
+        gc.collect()
+        assert rdd_id in self.persisted_ids()
+        assert len(t2) == 3
+
+    def test_persist_shared_pending(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']}).select_columns(['id'])
+        t2 = copy.copy(t)
+        t.persist(True)
+        rdd_id = t.to_rdd().id()
+        del t
+        gc.collect()
+        assert rdd_id in self.persisted_ids()
+        assert len(t2) == 3
+
+    def test_add_column_released(self):
+        before = set(self.persisted_ids())
+        t = XFrame({'id': [1, 2, 3]})
+        res = t.add_column(XArray(['a', 'b', 'c']), 'val')
+        assert len(res) == 3
+        del t, res
+        gc.collect()
+        assert set(self.persisted_ids()) <= before
+
+    def test_unpersist_shared(self):
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t.persist(True)
+        rdd_id = t.to_rdd().id()
+        t2 = copy.copy(t)
+        t2.persist(False)
+        assert rdd_id in self.persisted_ids()
+        t.persist(False)
+        assert rdd_id not in self.persisted_ids()
+
+    def test_storage_budget(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [4, 5, 6], 'val': ['d', 'e', 'f']})
+        t1.persist(True)
+        len(t1)
+        XFrame.set_storage_budget(0)
+        try:
+            t2.persist(True)
+            len(t2)
+            t2.persist(True)
+            ids = self.persisted_ids()
+            assert t1.to_rdd().id() not in ids
+            assert t2.to_rdd().id() in ids
+        finally:
+            XFrame.set_storage_budget(None)
+
+
+# noinspection PyClassHasNoInit
+class TestXFrameColumnarStorage:
+    """
+    Tests XFrame with columnar storage
+    """
+
+    @staticmethod
+    def make_frame():
+        t = XFrame({'id': [1, 2, 3, 4],
+                    'val': ['a', 'b', None, 'd'],
+                    'x': [1.0, 2.0, 3.0, 4.0],
+                    'y': [1, None, 3, 4],
+                    'dt': [datetime(2016, 1, i) for i in range(1, 5)]})
+        XFrame.set_columnar_storage(True)
+        try:
+            t.persist(True)
+        finally:
+            XFrame.set_columnar_storage(False)
+        return t
+
+    def test_rows(self):
+        t = self.make_frame()
+        assert len(t) == 4
+        assert t.column_types() == [datetime, int, str, float, int]
+        assert t[1] == {'id': 2, 'val': 'b', 'x': 2.0, 'y': None, 'dt': datetime(2016, 1, 2)}
+        assert list(t['x']) == [1.0, 2.0, 3.0, 4.0]
+        assert list(t['dt']) == [datetime(2016, 1, i) for i in range(1, 5)]
+
+    def test_select_columns(self):
+        t = self.make_frame()
+        res = t[['x', 'id']]
+        assert res.column_names() == ['x', 'id']
+        assert list(res) == [{'x': 1.0, 'id': 1}, {'x': 2.0, 'id': 2}, {'x': 3.0, 'id': 3}, {'x': 4.0, 'id': 4}]
+
+    def test_filterby(self):
+        t = self.make_frame()
+        res = t.filterby([2, 3], 'id')
+        assert len(res) == 2
+        assert list(res['val']) == ['b', None]
+        res = t.filterby([2, 3], 'id', exclude=True)
+        assert list(res['id']) == [1, 4]
+
+    def test_filterby_function(self):
+        t = self.make_frame()
+        res = t.filterby(lambda x: x > 2.0, 'x')
+        assert list(res['id']) == [3, 4]
+        assert res[0]['dt'] == datetime(2016, 1, 3)
+
+    def test_add_column(self):
+        t = self.make_frame()
+        t['z'] = t['id'].apply(lambda x: x * 10)
+        assert list(t['z']) == [10, 20, 30, 40]
+        assert t[3]['z'] == 40
+
+
 # noinspection PyClassHasNoInit
 class TestXFrameIter:
     """
@@ -2781,6 +3155,30 @@ class TestXFrameIter:
             assert item[0]['id'] == item[1]
             assert item[0]['val'] == item[2]
 
+    def test_iter_partitions(self):
+        sc = CommonSparkContext.spark_context()
+        rdd = sc.parallelize([(i, str(i)) for i in range(100)], 4)
+        t = XFrame.from_rdd(rdd, column_names=['id', 'val'])
+        assert [row['id'] for row in t] == range(100)
+
+    def test_iter_no_prefetch(self):
+        sc = CommonSparkContext.spark_context()
+        rdd = sc.parallelize([(i, str(i)) for i in range(100)], 4)
+        t = XFrame.from_rdd(rdd, column_names=['id', 'val'])
+        XFrame.set_iterator_prefetch(False)
+        try:
+            assert [row['val'] for row in t] == [str(i) for i in range(100)]
+        finally:
+            XFrame.set_iterator_prefetch(True)
+
+    def test_iter_partial(self):
+        sc = CommonSparkContext.spark_context()
+        rdd = sc.parallelize([(i, str(i)) for i in range(100)], 4)
+        t = XFrame.from_rdd(rdd, column_names=['id', 'val'])
+        it = iter(t)
+        assert next(it) == {'id': 0, 'val': '0'}
+        assert next(it) == {'id': 1, 'val': '1'}
+
 
 # noinspection PyClassHasNoInit
 class TestXFrameRange:
@@ -3341,9 +3739,105 @@ class TestXFrameGroupbyAggregators:
         assert dict_keys_equal(res[2], {'id': 2, 'values-count': {20: 1, 50: 1}})
         assert res[2] == {'id': 3, 'values-count': {30: 1}}
 
+    def test_groupby_count_distinct_approx(self):
+        t = XFrame({'id': [1, 2, 3, 1, 2, 1, 1],
+                    'val': ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+                    'another': [10, 20, 30, 40, 50, 60, 10]})
+        res = t.groupby('id', COUNT_DISTINCT_APPROX('another'))
+        res = res.topk('id', reverse=True)
+        assert len(res) == 3
+        assert res.column_names() == ['id', 'count-distinct-approx']
+        assert res.column_types() == [int, int]
+        assert res[0] == {'id': 1, 'count-distinct-approx': 3}
+        assert res[1] == {'id': 2, 'count-distinct-approx': 2}
+        assert res[2] == {'id': 3, 'count-distinct-approx': 1}
+
+    def test_groupby_count_distinct_approx_large(self):
+        t = XFrame({'id': [i % 2 for i in range(20000)],
+                    'val': [i % 5000 for i in range(20000)]})
+        res = t.groupby('id', {'n': COUNT_DISTINCT_APPROX('val', precision=14)})
+        res = res.topk('id', reverse=True)
+        assert abs(res[0]['n'] - 2500) < 2500 * 0.05
+        assert abs(res[1]['n'] - 2500) < 2500 * 0.05
+
     def test_groupby_quantile(self):
-        # not implemented
-        pass
+        t = XFrame({'id': [1, 2, 3, 1, 2, 1, 1],
+                    'val': ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+                    'another': [10, 20, 30, 40, 50, 60, 10]})
+        res = t.groupby('id', QUANTILE('another', 0.5))
+        res = res.topk('id', reverse=True)
+        assert len(res) == 3
+        assert res.column_names() == ['id', 'quantile']
+        assert res.column_types() == [int, int]
+        assert res[0] == {'id': 1, 'quantile': 10.0}
+        assert res[1] == {'id': 2, 'quantile': 20.0}
+        assert res[2] == {'id': 3, 'quantile': 30.0}
+
+    def test_groupby_quantile_datetime(self):
+        t = XFrame({'id': [1, 1, 1, 2],
+                    'time': [datetime(2016, 1, 3), datetime(2016, 1, 1),
+                             datetime(2016, 1, 2), datetime(2016, 2, 1)]})
+        res = t.groupby('id', {'q': QUANTILE('time', 0.5), 'qs': QUANTILE('time', [0.0, 1.0])})
+        res = res.topk('id', reverse=True)
+        assert dict(zip(res.column_names(), res.column_types())) == {'id': int, 'q': datetime, 'qs': list}
+        assert res[0] == {'id': 1, 'q': datetime(2016, 1, 2),
+                          'qs': [datetime(2016, 1, 1), datetime(2016, 1, 3)]}
+        assert res[1] == {'id': 2, 'q': datetime(2016, 2, 1),
+                          'qs': [datetime(2016, 2, 1), datetime(2016, 2, 1)]}
+
+    def test_groupby_quantile_list(self):
+        t = XFrame({'id': [1, 2, 3, 1, 2, 1, 1],
+                    'val': ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+                    'another': [10, 20, 30, 40, 50, 60, 10]})
+        res = t.groupby('id', {'q': QUANTILE('another', [0.0, 1.0])})
+        res = res.topk('id', reverse=True)
+        assert res.column_types() == [int, list]
+        assert res[0] == {'id': 1, 'q': [10.0, 60.0]}
+        assert res[1] == {'id': 2, 'q': [20.0, 50.0]}
+        assert res[2] == {'id': 3, 'q': [30.0, 30.0]}
+
+    def test_groupby_quantile_large(self):
+        t = XFrame({'id': [i % 2 for i in range(20000)],
+                    'val': range(20000)})
+        res = t.groupby('id', {'q': QUANTILE('val', 0.25, 0.5, 0.9)})
+        res = res.topk('id', reverse=True)
+        q = res[0]['q']
+        assert almost_equal(q[0], 5000, delta=400)
+        assert almost_equal(q[1], 10000, delta=400)
+        assert almost_equal(q[2], 18000, delta=400)
+
+    def test_groupby_quantile_bad(self):
+        t = XFrame({'id': [1, 2, 3], 'val': [1, 2, 3]})
+        with pytest.raises(ValueError):
+            t.groupby('id', QUANTILE('val', 1.5))
+
+    def test_groupby_quantile_exact(self):
+        t = XFrame({'id': [i % 2 for i in range(2000)],
+                    'val': range(2000)})
+        res = t.groupby('id', {'q': QUANTILE('val', [0.5, 0.99], exact_limit=None)})
+        res = res.topk('id', reverse=True)
+        assert res[0] == {'id': 0, 'q': [998.0, 1978.0]}
+        assert res[1] == {'id': 1, 'q': [999.0, 1979.0]}
+
+    def test_groupby_quantile_approx(self):
+        t = XFrame({'id': [i % 2 for i in range(2000)],
+                    'val': range(2000)})
+        res = t.groupby('id', {'q': QUANTILE('val', 0.5, exact_limit=10)})
+        res = res.topk('id', reverse=True)
+        assert almost_equal(res[0]['q'], 1000, delta=40)
+        assert almost_equal(res[1]['q'], 1000, delta=40)
+
+    def test_groupby_quantile_missing(self):
+        t = XFrame({'id': [1, 1, 1, 2],
+                    'val': [1.0, None, 3.0, None]})
+        res = t.groupby('id', {'q': QUANTILE('val', 1.0)})
+        res = res.topk('id', reverse=True)
+        assert res[0] == {'id': 1, 'q': 3.0}
+        assert res[1] == {'id': 2, 'q': None}
+
+    def test_groupby_quantile_bad_keyword(self):
+        with pytest.raises(TypeError):
+            QUANTILE('val', 0.5, limit=10)
 
 
 # noinspection PyClassHasNoInit
@@ -3779,6 +4273,79 @@ class TestXFrameGroupbyAggregatorsEmpty:
         assert res[2] == {'id': 3, 'concat': {}}
 
 
+# noinspection PyClassHasNoInit
+class TestXFrameGroupbyCombiner:
+    """
+    Tests XFrame groupby with map-side combining aggregators
+    """
+
+    def test_groupby_list_key(self):
+        t = XFrame({'id': [[1], [2], [1]],
+                    'another': [10, 20, 30]})
+        res = t.groupby('id', SUM('another'))
+        res = res.sort('sum')
+        assert len(res) == 2
+        assert res.column_types() == [list, int]
+        assert res[0] == {'id': [2], 'sum': 20}
+        assert res[1] == {'id': [1], 'sum': 40}
+
+    def test_groupby_nan_key(self):
+        # all NaNs fall in one group
+        t = XFrame({'id': [1.0, float('nan'), float('nan')],
+                    'another': [10, 20, 30]})
+        res = t.groupby('id', SUM('another'))
+        res = res.sort('sum')
+        assert len(res) == 2
+        assert res[0] == {'id': 1.0, 'sum': 10}
+        assert math.isnan(res[1]['id'])
+        assert res[1]['sum'] == 50
+
+    def test_groupby_str_key_type(self):
+        t = XFrame({'id': ['a', 'b', 'a'],
+                    'another': [10, 20, 30]})
+        res = t.groupby('id', SUM('another'))
+        res = res.sort('id')
+        assert type(res[0]['id']) is str
+        assert res[0] == {'id': 'a', 'sum': 40}
+
+    def test_groupby_is_algebraic(self):
+        assert SUM('another')[0].is_algebraic()
+        assert COUNT()[0].is_algebraic()
+        assert MEAN('another')[0].is_algebraic()
+        assert not CONCAT('another')[0].is_algebraic()
+        assert not SELECT_ONE('another')[0].is_algebraic()
+
+    def test_groupby_combiner_multiple(self):
+        t = XFrame({'id': [1, 2, 3, 1, 2, 1],
+                    'val': ['a', 'b', 'c', 'd', 'e', 'f'],
+                    'another': [10, 20, 30, 40, 50, 60]})
+        res = t.groupby('id', {'sum': SUM('another'),
+                               'count': COUNT(),
+                               'max': MAX('another'),
+                               'argmin': ARGMIN('another', 'val'),
+                               'variance': VARIANCE('another')})
+        res = res.topk('id', reverse=True)
+        assert len(res) == 3
+        assert sorted(res.column_names()) == ['argmin', 'count', 'id', 'max', 'sum', 'variance']
+        assert res[0]['sum'] == 110
+        assert res[0]['count'] == 3
+        assert res[0]['max'] == 60
+        assert res[0]['argmin'] == 'a'
+        assert almost_equal(res[0]['variance'], 3800.0 / 9.0)
+        assert res[2] == {'id': 3, 'sum': 30, 'count': 1, 'max': 30, 'argmin': 'c', 'variance': 0.0}
+
+    def test_groupby_combiner_fallback(self):
+        t = XFrame({'id': [1, 2, 3, 1, 2, 1],
+                    'val': ['a', 'b', 'c', 'd', 'e', 'f'],
+                    'another': [10, 20, 30, 40, 50, 60]})
+        res = t.groupby('id', {'sum': SUM('another'), 'concat': CONCAT('another')})
+        res = res.topk('id', reverse=True)
+        assert len(res) == 3
+        assert res[0]['sum'] == 110
+        assert sorted(res[0]['concat']) == [10, 40, 60]
+        assert res[2] == {'id': 3, 'sum': 30, 'concat': [30]}
+
+
 # noinspection PyClassHasNoInit
 class TestXFrameJoin:
     """
@@ -3955,6 +4522,79 @@ class TestXFrameJoin:
         exception_message = exception_info.value.args[0]
         assert exception_message == "Key 'xx' is not a column name."
 
+    def test_join_list_key(self):
+        t1 = XFrame({'id': [[1, 2], [3], [4, 5]], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [[1, 2], [3], [6]], 'doubled': ['aa', 'bb', 'cc']})
+        res = t1.join(t2).sort('val').head()
+        assert len(res) == 2
+        assert res.column_names() == ['id', 'val', 'doubled']
+        assert res[0] == {'id': [1, 2], 'val': 'a', 'doubled': 'aa'}
+        assert res[1] == {'id': [3], 'val': 'b', 'doubled': 'bb'}
+
+    def test_join_datetime_key(self):
+        t1 = XFrame({'id': [datetime(2015, 1, 1), datetime(2015, 1, 2)], 'val': ['a', 'b']})
+        t2 = XFrame({'id': [datetime(2015, 1, 1), datetime(2015, 1, 3)], 'doubled': ['aa', 'cc']})
+        res = t1.join(t2)
+        assert len(res) == 1
+        assert res[0] == {'id': datetime(2015, 1, 1), 'val': 'a', 'doubled': 'aa'}
+
+    def test_join_nan_key(self):
+        t1 = XFrame({'id': [1.0, float('nan')], 'val': ['a', 'b']})
+        t2 = XFrame({'id': [float('nan'), 3.0], 'doubled': ['bb', 'cc']})
+        res = t1.join(t2)
+        assert len(res) == 1
+        assert math.isnan(res[0]['id'])
+        assert res[0]['val'] == 'b'
+        assert res[0]['doubled'] == 'bb'
+
+    def test_join_broadcast(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 4, 2], 'doubled': ['aa', 'bb', 'dd', 'b2']})
+        res = t1.join(t2, strategy='broadcast').sort(['id', 'doubled']).head()
+        assert len(res) == 3
+        assert res.column_names() == ['id', 'val', 'doubled']
+        assert res[0] == {'id': 1, 'val': 'a', 'doubled': 'aa'}
+        assert res[1] == {'id': 2, 'val': 'b', 'doubled': 'b2'}
+        assert res[2] == {'id': 2, 'val': 'b', 'doubled': 'bb'}
+
+    def test_join_broadcast_left(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 4], 'doubled': ['aa', 'bb', 'dd']})
+        res = t1.join(t2, how='left', strategy='broadcast').sort('id').head()
+        assert len(res) == 3
+        assert res[0] == {'id': 1, 'val': 'a', 'doubled': 'aa'}
+        assert res[1] == {'id': 2, 'val': 'b', 'doubled': 'bb'}
+        assert res[2] == {'id': 3, 'val': 'c', 'doubled': None}
+
+    def test_join_broadcast_right(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 4], 'doubled': ['aa', 'bb', 'dd']})
+        res = t1.join(t2, how='right', strategy='broadcast').sort('id').head()
+        assert len(res) == 3
+        assert res[0] == {'id': 1, 'val': 'a', 'doubled': 'aa'}
+        assert res[1] == {'id': 2, 'val': 'b', 'doubled': 'bb'}
+        assert res[2] == {'id': 4, 'val': None, 'doubled': 'dd'}
+
+    def test_join_shuffle(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 4], 'doubled': ['aa', 'bb', 'dd']})
+        res = t1.join(t2, strategy='shuffle').sort('id').head()
+        assert len(res) == 2
+        assert res[0] == {'id': 1, 'val': 'a', 'doubled': 'aa'}
+        assert res[1] == {'id': 2, 'val': 'b', 'doubled': 'bb'}
+
+    def test_join_bad_strategy(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 3], 'doubled': ['aa', 'bb', 'cc']})
+        with pytest.raises(ValueError):
+            t1.join(t2, strategy='xx')
+
+    def test_join_broadcast_full(self):
+        t1 = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        t2 = XFrame({'id': [1, 2, 3], 'doubled': ['aa', 'bb', 'cc']})
+        with pytest.raises(ValueError):
+            t1.join(t2, how='full', strategy='broadcast')
+
 
 # noinspection PyClassHasNoInit
 class TestXFrameSplitDatetime:
@@ -4809,6 +5449,25 @@ class TestXFrameUnique:
         assert sorted(list(res['id'])) == [1, 1, 2, 3]
         assert sorted(list(res['val'])) == ['a', 'b', 'c', 'x']
 
+    def test_unique_list(self):
+        t = XFrame({'id': [3, 2, 1, 1], 'val': [['c'], ['b'], ['a', 'b'], ['a', 'b']]})
+        res = t.unique()
+        assert len(res) == 3
+        assert sorted(list(res['id'])) == [1, 2, 3]
+        assert sorted(list(res['val'])) == [['a', 'b'], ['b'], ['c']]
+
+    def test_unique_nan(self):
+        t = XFrame({'id': [1, 2, 2], 'val': [1.0, float('nan'), float('nan')]})
+        res = t.unique()
+        assert len(res) == 2
+        assert sorted(list(res['id'])) == [1, 2]
+
+    def test_unique_dict(self):
+        t = XFrame({'id': [1, 1, 2], 'val': [{'a': 1, 'b': 2}, {'b': 2, 'a': 1}, {'a': 1}]})
+        res = t.unique()
+        assert len(res) == 2
+        assert sorted(list(res['id'])) == [1, 2]
+
 
 # noinspection PyClassHasNoInit
 class TestXFrameSort:
@@ -5073,3 +5732,90 @@ class TestXFrameSql:
         assert res.column_types() == [int, str]
         assert res[0] == {'id': 2, 'val': 'b'}
         assert res[1] == {'id': 3, 'val': 'c'}
+
+
+# noinspection PyClassHasNoInit
+class TestXFramePerfTracker:
+    """
+    Tests PerfTracker
+    """
+
+    def test_perf_data(self):
+        from xframes.perf_tracker import PerfTracker
+        PerfTracker.xframes_track(True)
+        try:
+            t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+            assert len(t) == 3
+            assert len(t) == 3
+            perf = PerfTracker.perf_data()['XFrame']
+            assert perf['num_rows']['calls'] == 2
+            assert perf['num_rows']['time'] >= 0.0
+            assert len(perf['num_rows']['jobs']) >= 1
+            assert '"XFrame"' in PerfTracker.perf_json()
+        finally:
+            PerfTracker.xframes_track(False)
+
+    def test_perf_disabled(self):
+        from xframes.perf_tracker import PerfTracker
+        from xframes.xframe_impl import XFrameImpl
+        num_rows = XFrameImpl.__dict__['num_rows']
+        PerfTracker.xframe_track(True)
+        assert XFrameImpl.__dict__['num_rows'] is not num_rows
+        PerfTracker.xframe_track(False)
+        assert XFrameImpl.__dict__['num_rows'] is num_rows
+        assert PerfTracker.perf_data() == {}
+
+
+# noinspection PyClassHasNoInit
+class TestXFrameJobTracker:
+    """
+    Tests JobTracker
+    """
+
+    def test_report(self):
+        from xframes.job_tracker import JobTracker
+        JobTracker.clear()
+        XFrame.set_operation_tracking(True)
+        try:
+            t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+            assert len(t) == 3
+            report = JobTracker.report()[-1]
+        finally:
+            XFrame.set_operation_tracking(False)
+        assert report['operation'] == 'XFrame.__len__'
+        assert 'testxframe.py' in report['call_site']
+        assert len(report['jobs']) >= 1
+        assert report['stages'] >= 1
+        assert report['tasks'] >= 1
+
+    def test_report_nested(self):
+        from xframes.job_tracker import JobTracker
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        JobTracker.clear()
+        XFrame.set_operation_tracking(True)
+        try:
+            t['id'].sum()
+        finally:
+            XFrame.set_operation_tracking(False)
+        ops = [op['operation'] for op in JobTracker.report()]
+        assert ops[-1] == 'XArray.sum'
+        assert 'XFrame.__getitem__' not in ops
+
+    def test_no_jobs_not_recorded(self):
+        from xframes.job_tracker import JobTracker
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        JobTracker.clear()
+        XFrame.set_operation_tracking(True)
+        try:
+            t.column_names()
+        finally:
+            XFrame.set_operation_tracking(False)
+        assert 'XFrame.column_names' not in [op['operation'] for op in JobTracker.operations]
+
+    def test_no_tracking(self):
+        from xframes.job_tracker import JobTracker
+        t = XFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+        JobTracker.clear()
+        assert len(t) == 3
+        assert JobTracker.report() == []
+        assert '_tracked_originals' not in XFrame.__dict__
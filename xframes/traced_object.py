@@ -2,57 +2,134 @@
 Base class for objects that support entry and exit tracing.
 """
 
-import inspect
+import sys
+import time
+import types
+import functools
 from sys import stderr
 
 
+def _spark_job_ids():
+    """ Returns the ids of the spark jobs known in the current job group. """
+    # spark_context imports xrdd, which imports this module
+    from xframes.spark_context import CommonSparkContext
+    sc = CommonSparkContext.existing_spark_context()
+    if sc is None:
+        return set()
+    group = sc.getLocalProperty('spark.jobGroup.id')
+    return set(sc.statusTracker().getJobIdsForGroup(group))
+
+
 class TracedObject(object):
     entry_trace = False
     perf_count = None
 
     @classmethod
-    def _print_stack(cls, stack, args, levels=6):
-        print >>stderr, 'Enter:', stack[1][3], stack[1][1], stack[1][2]
+    def _print_stack(cls, frame, args, levels=6):
+        # frame is the function being entered
+        code = frame.f_code
+        print >>stderr, 'Enter:', code.co_name, code.co_filename, frame.f_lineno
         # print a few frames
-        print >>stderr, '   ', stack[2][3], stack[2][1], stack[2][2], args
+        frame = frame.f_back
+        if frame is not None:
+            code = frame.f_code
+            print >>stderr, '   ', code.co_name, code.co_filename, frame.f_lineno, args
+            frame = frame.f_back
         for i in range(3, levels):
-            if stack[i][3] == '<module>':
+            if frame is None or frame.f_code.co_name == '<module>':
                 break
-            print >>stderr, '   ', stack[i][3], stack[i][1], stack[i][2]
+            code = frame.f_code
+            print >>stderr, '   ', code.co_name, code.co_filename, frame.f_lineno
+            frame = frame.f_back
         stderr.flush()
 
     @classmethod
     def _print_trace(cls, **kwargs):
         """ Explicitly call this to trace a specific function. """
-        stack = inspect.stack()
-        cls._print_stack(stack, kwargs, 8)
+        # noinspection PyProtectedMember
+        cls._print_stack(sys._getframe(1), kwargs, 8)
 
     @classmethod
     def _entry(cls, **kwargs):
         """ Trace function entry. """
-        if not cls.entry_trace and not cls.perf_count:
+        if not cls.entry_trace:
             return
-        stack = inspect.stack()
-        cls._print_stack(stack, kwargs)
-        if cls.perf_count is not None:
-            caller = stack[1]
-            my_fun = caller[3]
-            if my_fun not in cls.perf_count:
-                cls.perf_count[my_fun] = 0
-            cls.perf_count[my_fun] += 1
+        # noinspection PyProtectedMember
+        cls._print_stack(sys._getframe(1), kwargs)
 
     @classmethod
     def set_trace(cls, entry_trace=None):
         cls.entry_trace = cls.entry_trace if entry_trace is None else entry_trace
 
+    @classmethod
+    def _record_perf(cls, name, elapsed, job_ids):
+        perf_count = cls.perf_count
+        if perf_count is None:
+            return
+        if name not in perf_count:
+            perf_count[name] = {'calls': 0, 'time': 0.0, 'jobs': set()}
+        stats = perf_count[name]
+        stats['calls'] += 1
+        stats['time'] += elapsed
+        stats['jobs'].update(job_ids)
+
+    @classmethod
+    def _instrument(cls, name, fn):
+        """ Wrap a function so that it records its calls, elapsed time, and spark jobs. """
+        @functools.wraps(fn)
+        def instrumented(*args, **kwargs):
+            before = _spark_job_ids()
+            start = time.time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.time() - start
+                cls._record_perf(name, elapsed, _spark_job_ids() - before)
+        return instrumented
+
+    @classmethod
+    def _install_perf(cls):
+        # Replace the methods defined in the class with instrumented versions.
+        # The originals are restored when perf counting is disabled, so there is no
+        # cost when it is not in use.
+        if '_perf_originals' in cls.__dict__:
+            return
+        originals = {}
+        for name, member in cls.__dict__.items():
+            if name.startswith('__'):
+                continue
+            if isinstance(member, types.FunctionType):
+                wrapped = cls._instrument(name, member)
+            elif isinstance(member, staticmethod):
+                wrapped = staticmethod(cls._instrument(name, member.__func__))
+            elif isinstance(member, classmethod):
+                wrapped = classmethod(cls._instrument(name, member.__func__))
+            else:
+                continue
+            originals[name] = member
+            setattr(cls, name, wrapped)
+        cls._perf_originals = originals
+
+    @classmethod
+    def _remove_perf(cls):
+        if '_perf_originals' not in cls.__dict__:
+            return
+        for name, member in cls._perf_originals.items():
+            setattr(cls, name, member)
+        del cls._perf_originals
+
     @classmethod
     def set_perf_count(cls, enable=True):
         if enable:
             cls.perf_count = {}
+            cls._install_perf()
         else:
+            cls._remove_perf()
             cls.perf_count = None
 
     @classmethod
     def get_perf_count(cls):
+        """
+        Returns the perf counts, as a dict of method name to calls, time (seconds), and spark job ids.
+        """
         return cls.perf_count
-
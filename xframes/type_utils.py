@@ -3,6 +3,7 @@ import array
 import datetime
 import types
 import math
+import random
 import re
 
 from dateutil import parser as date_parser
@@ -69,7 +70,131 @@ def classify_type(s):
     return str
 
 
-def infer_type(rdd):
+def resolve_types(types):
+    """
+    Returns the type that represents strings classified as any of the given types.
+
+    The types form a lattice: int is contained in float, and everything is contained
+    in str.  A single type is kept, int and float together give float, and any other
+    mixture gives str.
+
+    Parameters
+    ----------
+    types : set
+        The types given by classify_type.
+
+    Returns
+    -------
+    out : type
+        The most specific type that holds all of them.
+    """
+    if len(types) == 1:
+        return next(iter(types))
+    if types == {int, float}:
+        return float
+    return str
+
+
+def sample_rdd(rdd, sample_size, summarize):
+    """
+    Summarize a sample of rows drawn from every partition, in one pass.
+
+    Each partition draws an equal share of the sample, by reservoir sampling, and
+    summarizes it.  The samples are seeded by partition index, so the results are
+    repeatable.
+
+    Parameters
+    ----------
+    rdd : XRdd
+        The rows to sample.
+
+    sample_size : int
+        The total number of rows to sample.
+
+    summarize : function
+        Called with the list of rows sampled from each partition.
+
+    Returns
+    -------
+    out : list
+        The summary of each partition.
+    """
+    num_partitions = max(rdd.getNumPartitions(), 1)
+    per_partition = max(int(math.ceil(float(sample_size) / num_partitions)), 1)
+
+    def sample_partition(index, iterator):
+        rng = random.Random(index)
+        sample = []
+        for i, row in enumerate(iterator):
+            if i < per_partition:
+                sample.append(row)
+            else:
+                j = rng.randint(0, i)
+                if j < per_partition:
+                    sample[j] = row
+        yield summarize(sample)
+    return rdd.mapPartitionsWithIndex(sample_partition).collect()
+
+
+def classify_columns(rows, na_values=None):
+    """
+    Returns, for each column of rows of strings, the set of types its values classify as.
+
+    Missing values and values in na_values are skipped.  If there are no rows, returns None.
+    """
+    if len(rows) == 0:
+        return None
+    na_values = set(na_values or [])
+    try:
+        return [{classify_type(row[i]) for row in rows if row[i] is not None and row[i] not in na_values}
+                for i in range(len(rows[0]))]
+    except IndexError:
+        raise ValueError('Rows are not the same length.')
+
+
+def merge_column_types(column_types1, column_types2):
+    """
+    Merges the column type sets from two samples.
+    """
+    if column_types1 is None:
+        return column_types2
+    if column_types2 is None:
+        return column_types1
+    if len(column_types1) != len(column_types2):
+        raise ValueError('Rows are not the same length.')
+    return [types1 | types2 for types1, types2 in zip(column_types1, column_types2)]
+
+
+def infer_column_types(rdd, sample_size, na_values=None):
+    """
+    From an RDD of rows of strings, find what data type each column represents.
+
+    The rows are sampled from all the partitions in a single job.
+
+    Parameters
+    ----------
+    rdd : XRdd
+        An XRdd of rows of strings.
+
+    sample_size : int
+        The number of rows to sample.
+
+    na_values : list, optional
+        Values that are treated as missing.
+
+    Returns
+    -------
+    out : list(type)
+        A list of the types of the columns.
+    """
+    samples = sample_rdd(rdd, sample_size, lambda rows: classify_columns(rows, na_values))
+    column_types = reduce(merge_column_types, samples, None)
+    if column_types is None:
+        raise RuntimeError('Insufficient rows.')
+    return [resolve_types(types) for types in column_types]
+
+
+def infer_type(rdd, sample_size=None):
     """
     From an RDD of strings, find what data type they represent.
 
@@ -82,24 +207,44 @@ def infer_type(rdd):
     rdd : XRdd
         An XRdd of single values.
 
+    sample_size : int, optional
+        If given, the values are sampled from all the partitions.  Otherwise the
+        first 100 values are used.
+
     Returns
     -------
     out : type
         The type of the values in the rdd.
     """
-    head = rdd.take(100)
-    types = [classify_type(s) for s in head]
-    unique_types = set(types)
-    if len(unique_types) == 1:
-        dtype = types[0]
-    elif unique_types == {int, float}:
-        dtype = float
-    else:
-        dtype = str
-    return dtype
+    if sample_size is None:
+        head = rdd.take(100)
+        return resolve_types({classify_type(s) for s in head})
+    samples = sample_rdd(rdd, sample_size, lambda values: {classify_type(s) for s in values})
+    return resolve_types(set().union(*samples))
+
+
+def _merge_value_type(type1, type2):
+    # the same rules as infer_type_of_list, applied to the types found in two samples
+    if type1 is None or type1 == type2:
+        return type2
+    if type2 is None:
+        return type1
+    if is_numeric_type(type1) and is_numeric_type(type2):
+        return float if float in (type1, type2) else int
+    raise TypeError('Infer_type_of_list: mixed types in list: {} {}'.format(type2, type1))
+
+
+def _merge_value_types(types1, types2):
+    if types1 is None:
+        return types2
+    if types2 is None:
+        return types1
+    if len(types1) != len(types2):
+        raise ValueError('Rows are not the same length.')
+    return [_merge_value_type(type1, type2) for type1, type2 in zip(types1, types2)]
 
 
-def infer_types(rdd):
+def infer_types(rdd, sample_size=None):
     """
     From an RDD of tuples of strings, find what data type each one represents.
 
@@ -108,20 +253,26 @@ def infer_types(rdd):
     rdd : XRdd
         An XRdd of tuples.
 
+    sample_size : int, optional
+        If given, the rows are sampled from all the partitions.  Otherwise the
+        first 100 rows are used.
+
     Returns
     -------
     out : list(type)
         A list of the types of the values in the rdd.
     """
-    head = rdd.take(100)
-    n_cols = len(head[0])
-
-    def get_col(head, i):
-        return [row[i] for row in head]
-    try:
-        return [infer_type_of_list(get_col(head, i)) for i in range(n_cols)]
-    except IndexError:
-        raise ValueError('Rows are not the same length.')
+    def column_types(rows):
+        n_cols = len(rows[0])
+        try:
+            return [infer_type_of_list([row[i] for row in rows]) for i in range(n_cols)]
+        except IndexError:
+            raise ValueError('Rows are not the same length.')
+
+    if sample_size is None:
+        return column_types(rdd.take(100))
+    samples = sample_rdd(rdd, sample_size, lambda rows: column_types(rows) if len(rows) > 0 else None)
+    return reduce(_merge_value_types, samples, None)
 
 
 def is_numeric_type(typ):
@@ -13,10 +13,19 @@ import ConfigParser
 import itertools
 import shutil
 import random
+import array
+import datetime
+import threading
+import weakref
+import time
+import csv
+import StringIO
+from collections import OrderedDict
 from sys import stderr
 import logging
 
 from pyspark import StorageLevel
+from pyspark.sql import functions
 
 from xframes.spark_context import CommonSparkContext
 from xframes import object_utils
@@ -458,20 +467,581 @@ def distribute_seed(rdd, seed):
 
 # RDD helpers
 
+class _PersistedRdd(object):
+    """ The persistence manager's record of one persisted RDD. """
+    def __init__(self, rdd, storage_level):
+        self.rdd = rdd
+        self.storage_level = storage_level
+        self.owners = {}
+        self.last_used = time.time()
+
+
+class PersistenceManager(object):
+    """
+    Keeps track of the RDDs persisted by xframes.
+
+    Each persisted RDD records the XFrameImpl and XArrayImpl objects that refer to it.
+    When the last of these is garbage collected, the RDD is unpersisted.
+    RDDs without owners are persisted temporarily, and are unpersisted by the caller.
+
+    If a storage budget is set (object_utils.STORAGE_BUDGET), then after each
+    persist the least recently used RDDs are unpersisted until the storage
+    used is within the budget.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        # rdd id -> _PersistedRdd, least recently used first
+        self._entries = OrderedDict()
+        # rdd -> owner id -> weak reference to the owner, whether or not the rdd is persisted
+        self._owners = weakref.WeakKeyDictionary()
+
+    def _touch(self, rdd_id):
+        entry = self._entries.pop(rdd_id)
+        entry.last_used = time.time()
+        self._entries[rdd_id] = entry
+        return entry
+
+    def persist(self, rdd, storage_level, owner=None):
+        """
+        Persist the RDD, if it is not already persisted, and record the owner.
+        """
+        with self._lock:
+            rdd_id = rdd.get_id()
+            if rdd_id in self._entries:
+                entry = self._touch(rdd_id)
+            else:
+                if not rdd.is_cached():
+                    rdd.persist(storage_level)
+                entry = _PersistedRdd(rdd, storage_level)
+                self._entries[rdd_id] = entry
+            # the owners recorded before the rdd was persisted
+            for ref in self._owners.get(rdd, {}).values():
+                known_owner = ref()
+                if known_owner is not None:
+                    self._add_owner(entry, rdd_id, known_owner)
+            if owner is not None:
+                self._add_owner(entry, rdd_id, owner)
+            self._enforce_budget(rdd_id)
+
+    def unpersist(self, rdd):
+        """
+        Unpersist the RDD, regardless of its owners.
+        """
+        with self._lock:
+            entry = self._entries.pop(rdd.get_id(), None)
+            if entry is not None:
+                entry.rdd.unpersist()
+            elif rdd.is_cached():
+                rdd.unpersist()
+
+    def _add_owner(self, entry, rdd_id, owner):
+        key = id(owner)
+        if key not in entry.owners:
+            entry.owners[key] = weakref.ref(owner, lambda ref: self._owner_gone(rdd_id, key))
+
+    def add_owner(self, rdd, owner):
+        """
+        Record that the owner refers to the RDD.
+
+        If the RDD is persisted later, it is released when its owners are collected.
+        """
+        if rdd is None:
+            return
+        with self._lock:
+            if rdd not in self._owners:
+                self._owners[rdd] = {}
+            self._owners[rdd][id(owner)] = weakref.ref(owner)
+            # an RDD that has not been built yet is not persisted
+            if rdd.is_pending():
+                return
+            rdd_id = rdd.get_id()
+            if rdd_id in self._entries:
+                self._add_owner(self._touch(rdd_id), rdd_id, owner)
+
+    def remove_owner(self, rdd, owner):
+        """
+        Record that the owner no longer refers to the RDD.
+        """
+        if rdd is None:
+            return
+        with self._lock:
+            self._owners.get(rdd, {}).pop(id(owner), None)
+            if rdd.is_pending():
+                return
+            self._owner_gone(rdd.get_id(), id(owner))
+
+    def _owner_gone(self, rdd_id, key):
+        with self._lock:
+            entry = self._entries.get(rdd_id)
+            if entry is None or key not in entry.owners:
+                return
+            del entry.owners[key]
+            if len(entry.owners) == 0:
+                del self._entries[rdd_id]
+                self._release(entry)
+
+    @staticmethod
+    def _release(entry):
+        # this may run while objects are garbage collected, even during shutdown
+        try:
+            entry.rdd.unpersist()
+        except Exception as e:
+            logging.debug('Unpersist failed: {}'.format(e))
+
+    @staticmethod
+    def _storage_sizes():
+        # rdd id -> bytes stored in memory and on disk, as reported by spark
+        try:
+            sc = CommonSparkContext.spark_context()
+            # noinspection PyProtectedMember
+            infos = sc._jsc.sc().getRDDStorageInfo()
+            return {info.id(): info.memSize() + info.diskSize() for info in infos}
+        except Exception:
+            return {}
+
+    def _enforce_budget(self, keep_id):
+        budget = object_utils.STORAGE_BUDGET
+        if budget is None:
+            return
+        sizes = self._storage_sizes()
+        used = sum([sizes.get(rdd_id, 0) for rdd_id in self._entries])
+        for rdd_id in list(self._entries):
+            if used <= budget:
+                break
+            if rdd_id == keep_id:
+                continue
+            # releasing an rdd can collect owners, whose callbacks remove other entries
+            entry = self._entries.pop(rdd_id, None)
+            if entry is None:
+                continue
+            self._release(entry)
+            used -= sizes.get(rdd_id, 0)
+
+    def cached(self):
+        """
+        Returns a list describing the persisted RDDs, least recently used first.
+        """
+        with self._lock:
+            sizes = self._storage_sizes()
+            return [{'id': rdd_id,
+                     'storage_level': str(entry.storage_level),
+                     'owners': len(entry.owners),
+                     'size': sizes.get(rdd_id, 0),
+                     'last_used': entry.last_used}
+                    for rdd_id, entry in self._entries.iteritems()]
+
+persistence_manager = PersistenceManager()
+
 
 # noinspection PyUnresolvedReferences
-def cache(rdd):
-    rdd.persist(StorageLevel.MEMORY_ONLY)
+def cache(rdd, owner=None):
+    persistence_manager.persist(rdd, StorageLevel.MEMORY_ONLY, owner)
 
 
 def uncache(rdd):
-    rdd.unpersist()
+    persistence_manager.unpersist(rdd)
 
 
 # noinspection PyUnresolvedReferences
-def persist(rdd):
-    rdd.persist(StorageLevel.MEMORY_AND_DISK)
+def persist(rdd, owner=None):
+    persistence_manager.persist(rdd, StorageLevel.MEMORY_AND_DISK, owner)
 
 
 def unpersist(rdd):
-    rdd.unpersist()
+    persistence_manager.unpersist(rdd)
+
+
+# Text output helpers
+
+def csv_line_encoder(**params):
+    """
+    Returns a function that encodes a row as a line of csv, without the line terminator.
+
+    The encoder reuses its buffer, so create it in the partition function that uses it.
+    """
+    params['lineterminator'] = ''
+    sio = StringIO.StringIO()
+    writer = csv.writer(sio, **params)
+
+    def encode(row):
+        sio.seek(0)
+        sio.truncate()
+        try:
+            writer.writerow(row)
+        except IOError:
+            return ''
+        return sio.getvalue()
+    return encode
+
+
+def _part_number(name):
+    return int(re.match(r'part-(\d+)', name).group(1))
+
+
+def save_text_lines(rdd, path, single_file=True):
+    """
+    Save an RDD of lines of text.
+
+    The partitions are written in parallel.  If single_file is True, the part files
+    are then concatenated, in partition order, into the file at path.  Otherwise path
+    is a directory of part files.
+    """
+    fileio.delete(path)
+    if not single_file:
+        rdd.saveAsTextFile(path)
+        return
+    temp_file_name = fileio.temp_file_name(path)
+    try:
+        rdd.saveAsTextFile(temp_file_name)
+        parts = [name for name in fileio.list_dir(temp_file_name) if name.startswith('part-')]
+        with fileio.open_file(path, 'w') as f:
+            for part in sorted(parts, key=_part_number):
+                with fileio.open_file(os.path.join(temp_file_name, part)) as rd:
+                    shutil.copyfileobj(rd, f)
+    finally:
+        fileio.delete(temp_file_name)
+
+
+# Partition index helpers
+
+# Positional access (indexing, slicing, head, tail, and iteration) uses an index of
+#  the starting row of each partition.  With the index, only the partitions that
+#  hold the requested rows need to be computed.
+
+def partition_offsets(counts):
+    """
+    Returns the starting row of each partition, given the number of rows in each partition.
+
+    The last entry is the total number of rows.
+    """
+    offsets = [0]
+    for count in counts:
+        offsets.append(offsets[-1] + count)
+    return offsets
+
+
+def range_partitions(offsets, start, stop):
+    """
+    Returns the partitions that hold any of the rows between start and stop.
+    """
+    return [i for i in range(len(offsets) - 1)
+            if offsets[i] < stop and offsets[i + 1] > start and offsets[i] < offsets[i + 1]]
+
+
+def range_slicer(offsets, start, step, stop):
+    """
+    Returns a function for mapPartitionsWithIndex that selects the rows between start
+    and stop, counting by step.
+
+    Partitions outside the range are not iterated.
+    """
+    step = abs(step)
+
+    def slicer(index, iterator):
+        base = offsets[index]
+        first = max(start, base)
+        end = min(stop, offsets[index + 1])
+        if first >= end:
+            return []
+        # advance to the first row that falls on the step
+        first = start + ((first - start + step - 1) // step) * step
+        if first >= end:
+            return []
+        return itertools.islice(iterator, first - base, end - base, step)
+    return slicer
+
+
+def slice_rdd(rdd, offsets, start, step, stop):
+    """
+    Returns an RDD of the rows between start and stop, counting by step.
+    """
+    return rdd.select_rows(range_slicer(offsets, start, step, stop))
+
+
+def collect_range(rdd, offsets, start, step, stop):
+    """
+    Returns a list of the rows between start and stop, counting by step.
+
+    Only the partitions that hold these rows are computed.
+    """
+    partitions = range_partitions(offsets, start, stop)
+    if len(partitions) == 0:
+        return []
+    sliced = rdd.select_rows(range_slicer(offsets, start, step, stop))
+    return sliced.run_partitions(list, partitions)
+
+
+def limit_rdd(rdd, limit):
+    """
+    Returns an RDD of the first limit rows.
+
+    Like take, partitions are read a few at a time, starting with the first, and
+    reading stops as soon as there are enough rows.  Only the last partition read is
+    truncated.  The rows are parallelized again with the same number of partitions
+    they were read from.
+    """
+    sc = CommonSparkContext.spark_context()
+    num_partitions = rdd.getNumPartitions()
+    parts = []
+    remaining = limit
+    index = 0
+    batch = 1
+    while remaining > 0 and index < num_partitions:
+        partitions = range(index, min(index + batch, num_partitions))
+
+        def take_remaining(iterator, n=remaining):
+            # each partition is truncated to what could still be needed
+            yield list(itertools.islice(iterator, n))
+        for rows in rdd.run_partitions(take_remaining, partitions):
+            rows = rows[:remaining]
+            remaining -= len(rows)
+            if len(rows) > 0:
+                parts.append(rows)
+        index += len(partitions)
+        # scan more partitions at a time when the first ones held too few rows
+        batch *= 4
+    rows = [row for part in parts for row in part]
+    return sc.parallelize(rows, max(len(parts), 1))
+
+
+def _fetch_partition(rdd, index):
+    """
+    Starts collecting one partition on a background thread.
+
+    Returns a function that waits for the rows and returns them.
+    """
+    result = {}
+
+    def fetch():
+        try:
+            result['rows'] = rdd.run_partitions(list, [index])
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=fetch)
+    thread.daemon = True
+    thread.start()
+
+    def wait():
+        thread.join()
+        if 'error' in result:
+            raise result['error']
+        return result['rows']
+    return wait
+
+
+def iterate_partitions(rdd, prefetch=False):
+    """
+    Yields the rows of the RDD, collecting one partition at a time.
+
+    If prefetch is True, the next partition is collected in the background while
+    the rows of the current partition are consumed.  At most two partitions are held
+    on the driver.
+    """
+    num_partitions = rdd.getNumPartitions()
+    if not prefetch:
+        for index in range(num_partitions):
+            for row in rdd.run_partitions(list, [index]):
+                yield row
+        return
+    pending = _fetch_partition(rdd, 0) if num_partitions > 0 else None
+    for index in range(num_partitions):
+        rows = pending()
+        pending = _fetch_partition(rdd, index + 1) if index + 1 < num_partitions else None
+        for row in rows:
+            yield row
+        del rows
+
+
+# Key helpers
+#
+# Join, groupby, and unique need hashable keys built from column values.
+# Tuples of scalar values are used directly as keys.  Only unhashable values
+#  (lists, dicts, and arrays) are converted to a canonical hashable form, and these
+#  are converted back when the key values are needed again.
+# NaN is not equal to itself, so each NaN would be a separate key.  NaNs are
+#  converted to a single stand-in, so that they all fall in one group.
+
+class _FrozenList(tuple):
+    """ Hashable stand-in for a list value in a key. """
+    def __eq__(self, other):
+        return type(other) is type(self) and tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((type(self).__name__, tuple(self)))
+
+    def thaw(self):
+        return [decode_key_value(val) for val in self]
+
+
+class _FrozenDict(_FrozenList):
+    """ Hashable stand-in for a dict value in a key: holds the sorted items. """
+    def thaw(self):
+        return {decode_key_value(k): decode_key_value(v) for k, v in self}
+
+
+class _FrozenArray(_FrozenList):
+    """ Hashable stand-in for an array.array value in a key: holds the typecode and the values. """
+    def thaw(self):
+        return array.array(self[0], [decode_key_value(val) for val in self[1]])
+
+
+class _NanKey(object):
+    """ Stand-in for a float NaN value in a key: all NaNs are equal. """
+    def __eq__(self, other):
+        return isinstance(other, _NanKey)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash('_NanKey')
+
+    # noinspection PyMethodMayBeStatic
+    def thaw(self):
+        return float('nan')
+
+
+_NAN_KEY = _NanKey()
+
+# float is not included: float values may be NaN
+_HASHABLE_KEY_TYPES = (basestring, bool, int, long, datetime.datetime, datetime.date)
+
+
+def encode_key_value(val):
+    """ Convert a value into a hashable form that can be part of a key. """
+    if isinstance(val, float):
+        # only NaN is not equal to itself
+        return _NAN_KEY if val != val else val
+    if isinstance(val, list):
+        return _FrozenList([encode_key_value(v) for v in val])
+    if isinstance(val, dict):
+        return _FrozenDict(sorted([(encode_key_value(k), encode_key_value(v)) for k, v in val.iteritems()]))
+    if isinstance(val, array.array):
+        return _FrozenArray((val.typecode, tuple([encode_key_value(v) for v in val])))
+    if isinstance(val, tuple):
+        return tuple([encode_key_value(v) for v in val])
+    return val
+
+
+def decode_key_value(val):
+    """ Convert a key value produced by encode_key_value back into its original form. """
+    if isinstance(val, (_FrozenList, _NanKey)):
+        return val.thaw()
+    if isinstance(val, tuple):
+        return tuple([decode_key_value(v) for v in val])
+    return val
+
+
+def encode_key(values):
+    """ Make a hashable key from a sequence of values, any of which may be unhashable. """
+    return tuple([encode_key_value(val) for val in values])
+
+
+def decode_key(key):
+    """ Recover the list of values from a key made by encode_key. """
+    return [decode_key_value(val) for val in key]
+
+
+def needs_key_encoding(column_types):
+    """
+    Returns True if any of the column types can hold values that cannot be used directly in a key:
+    values that are not hashable, or NaN.
+    """
+    for typ in column_types:
+        if typ is None or not issubclass(typ, _HASHABLE_KEY_TYPES):
+            return True
+    return False
+
+
+def key_encoder(column_types):
+    """
+    Returns a function that makes a key from a list of values of the given column types.
+
+    If all the types are hashable, this is just tuple.
+    """
+    return encode_key if needs_key_encoding(column_types) else tuple
+
+
+def key_decoder(column_types):
+    """
+    Returns a function that recovers the list of values from a key made by key_encoder.
+    """
+    return decode_key if needs_key_encoding(column_types) else list
+
+
+# Pushdown helpers
+
+# A frame read from parquet keeps the spark DataFrame it was read from, until it is
+#  modified.  Column selections and simple filters on it are done by the DataFrame,
+#  so only the selected columns are read, and the filters can skip data in the scan.
+# Filters are pushed down only for column types that compare the same way in spark
+#  and in python.  Python treats None as less than any value, while spark comparisons
+#  with null never hold, so missing values are added back where python would keep them.
+
+def _pushable_value(value, column_type):
+    if column_type is bool:
+        return isinstance(value, bool)
+    if column_type in (int, long):
+        return isinstance(value, (int, long)) and not isinstance(value, bool)
+    if column_type in (str, unicode):
+        return isinstance(value, basestring)
+    return False
+
+
+def scan_column(column_name):
+    """
+    Returns the DataFrame column expression for a column name.
+    """
+    # quoted, so that dots in the name are not read as field references
+    return functions.col('`{}`'.format(column_name.replace('`', '``')))
+
+
+def pushdown_comparison(column_name, column_type, op, value):
+    """
+    Returns a DataFrame filter expression that keeps the rows where the column
+    compares to the value as it would in python.
+
+    Returns None if the comparison cannot be pushed down.
+    """
+    if not _pushable_value(value, column_type):
+        return None
+    column = scan_column(column_name)
+    if op == '<':
+        expr = column < value
+    elif op == '<=':
+        expr = column <= value
+    elif op == '>':
+        expr = column > value
+    elif op == '>=':
+        expr = column >= value
+    elif op == '==':
+        expr = column == value
+    elif op == '!=':
+        expr = column != value
+    else:
+        return None
+    if op in ('<', '<=', '!='):
+        expr = expr | column.isNull()
+    return expr
+
+
+def pushdown_membership(column_name, column_type, values, exclude):
+    """
+    Returns a DataFrame filter expression that keeps the rows where the column value
+    is in values, or not in values if exclude is True.
+
+    Returns None if the filter cannot be pushed down.
+    """
+    present = [value for value in values if value is not None]
+    if len(present) == 0 or not all(_pushable_value(value, column_type) for value in present):
+        return None
+    column = scan_column(column_name)
+    expr = column.isin(present)
+    has_none = len(present) < len(values)
+    if exclude:
+        return ~expr & column.isNotNull() if has_none else ~expr | column.isNull()
+    return expr | column.isNull() if has_none else expr
@@ -18,6 +18,7 @@ from xframes.deps import HAS_NUMPY
 from xframes.xarray_impl import XArrayImpl
 from xframes.utils import make_internal_url
 from xframes.object_utils import check_input_uri, check_output_uri
+from xframes.job_tracker import JobTracker
 from xframes.type_utils import infer_type_of_list, is_numeric_val, classify_auto
 import xframes
 
@@ -50,6 +51,10 @@ def _create_sequential_xarray(size, start=0, reverse=False):
 
 
 # noinspection PyUnresolvedReferences,PyRedeclaration
+@JobTracker.track_actions('save', '__repr__', '__str__', '__nonzero__', '__len__', 'size',
+                          'head', 'tail', 'all', 'any', 'max', 'min', 'sum', 'mean', 'std', 'var',
+                          'num_missing', 'nnz', 'countna', 'topk_index', 'sketch_summary',
+                          '_materialize', 'sort')
 class XArray(object):
     """
     An immutable, homogeneously typed array object backed by Spark RDD.
@@ -288,7 +293,7 @@ class XArray(object):
         return self._impl.get_content_identifier()
 
     # noinspection PyShadowingBuiltins
-    def save(self, filename, format=None):
+    def save(self, filename, format=None, single_file=True):
         """
         Saves the XArray to file.
 
@@ -311,6 +316,10 @@ class XArray(object):
             name ends with 'csv', or 'txt', then save as 'csv' format,
             otherwise save as 'binary' format.
 
+        single_file : bool, optional
+            For 'csv' format only.  The partitions are written in parallel.  If True
+            (the default), they are then combined into a single file.  If False, the
+            XArray is saved as a directory of part files.
         """
         if format is None:
             if filename.endswith('.txt'):
@@ -328,7 +337,7 @@ class XArray(object):
         elif format == 'text':
             self._impl.save_as_text(url)
         elif format == 'csv':
-            self._impl.save_as_csv(url)
+            self._impl.save_as_csv(url, single_file=single_file)
 
     def to_rdd(self, number_of_partitions=4):
         """
@@ -426,17 +435,8 @@ class XArray(object):
         Provides an iterator to the contents of the array.
         """
         def generator():
-            elems_at_a_time = 262144
-            self._impl.begin_iterator()
-            ret = self._impl.iterator_get_next(elems_at_a_time)
-            while True:
-                for j in ret:
-                    yield j
-
-                if len(ret) == elems_at_a_time:
-                    ret = self._impl.iterator_get_next(elems_at_a_time)
-                else:
-                    break
+            for elem in self._impl.iter_rows():
+                yield elem
 
         return generator()
 
@@ -644,7 +644,7 @@ class XArray(object):
                 other += len(self)
             if other >= len(self):
                 raise IndexError('XArray index out of range.')
-            return list(XArray(impl=self._impl.copy_range(other, 1, other + 1)))[0]
+            return self._impl.take_range(other, 1, other + 1)[0]
         elif isinstance(other, slice):
             start = other.start
             stop = other.stop
@@ -1930,7 +1930,7 @@ class XArray(object):
             raise TypeError("'Topk_index': topk must be an integer ({})".format(topk))
         return XArray(impl=self._impl.topk_index(topk, reverse))
 
-    def sketch_summary(self, sub_sketch_keys=None):
+    def sketch_summary(self, sub_sketch_keys=None, eager=False):
         """
         Summary statistics that can be calculated with one pass over the XArray.
 
@@ -1947,6 +1947,10 @@ class XArray(object):
             The sub sketches may be queried using: :py:func:`~xframes.Sketch.element_sub_sketch()`
             Defaults to None in which case no subsketches will be constructed.
 
+        eager: bool, optional
+            If True, compute all the statistics in a single pass over the XArray.
+            Otherwise each one is computed when it is first requested.
+
         Returns
         -------
         :class:`.Sketch`
@@ -1974,7 +1978,7 @@ class XArray(object):
                 raise TypeError("Only int value(s) can be passed to 'sub_sketch_keys' " +
                                 'for XArray of array type')
 
-        return Sketch(self, sub_sketch_keys=sub_sketch_keys)
+        return Sketch(self, sub_sketch_keys=sub_sketch_keys, eager=eager)
 
     def append(self, other):
         """
@@ -6,11 +6,10 @@ import array
 import os
 import pickle
 import ast
-import csv
 import copy
-import StringIO
 import random
 import datetime
+import operator
 from dateutil import parser as date_parser
 import logging
 
@@ -19,13 +18,23 @@ import xframes
 from xframes.traced_object import TracedObject
 from xframes.spark_context import CommonSparkContext
 import xframes.fileio as fileio
-from xframes.utils import cache, uncache
+from xframes.utils import cache, uncache, persist, unpersist, persistence_manager
 from xframes.utils import distribute_seed
+from xframes.utils import partition_offsets, slice_rdd, collect_range
+from xframes.utils import iterate_partitions
+from xframes.utils import pushdown_comparison
+from xframes.utils import csv_line_encoder, save_text_lines
 from xframes.type_utils import infer_type_of_list
 from xframes.type_utils import infer_type, infer_types, is_numeric_type
 from xframes.type_utils import is_missing
 from xframes.object_utils import wrap_rdd
+from xframes import object_utils
 from xframes.xrdd import XRdd
+from xframes.columnar import FORMAT_VERSION, encode_chunks, decode_chunks
+from xframes.deps import HAS_NUMPY
+
+if HAS_NUMPY:
+    import numpy
 
 
 class ReverseCmp(object):
@@ -55,11 +64,212 @@ class ReverseCmp(object):
         return self.obj != other.obj
 
 
+class StatCounter(object):
+    """ Summary statistics, computed in a single pass.
+
+    Counters are built for each partition and then merged.
+    Missing values are counted, but are not included in the numeric statistics.
+    The numeric statistics (min, max, sum, mean, and m2) are only kept for numeric values.
+    """
+    def __init__(self, numeric):
+        self.numeric = numeric
+        self.count = 0
+        self.num_missing = 0
+        self.nnz = 0
+        self.all = True
+        self.any = False
+        # numeric statistics
+        self.n = 0
+        self.sum = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, val):
+        self.count += 1
+        if is_missing(val):
+            self.num_missing += 1
+            self.all = False
+            return self
+        if val != 0:
+            self.nnz += 1
+        if val:
+            self.any = True
+        else:
+            self.all = False
+        if self.numeric:
+            self.n += 1
+            self.sum += val
+            delta = val - self.mean
+            self.mean += delta / float(self.n)
+            self.m2 += delta * (val - self.mean)
+            if self.min is None or val < self.min:
+                self.min = val
+            if self.max is None or val > self.max:
+                self.max = val
+        return self
+
+    def add_all(self, iterator):
+        for val in iterator:
+            self.add(val)
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.num_missing += other.num_missing
+        self.nnz += other.nnz
+        self.all = self.all and other.all
+        self.any = self.any or other.any
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.sum, self.mean, self.m2 = other.n, other.sum, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.n * other.n / float(n)
+        self.mean += delta * other.n / float(n)
+        self.n = n
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def variance(self, ddof):
+        return self.m2 / (self.n - ddof)
+
+
 class ApplyError(object):
     def __init__(self, msg):
         self.msg = msg
 
 
+# Vectorized operators
+
+# With numpy, arithmetic and comparisons on int and float arrays operate on a numpy array
+#  per partition.  Missing values are masked: arithmetic on them gives None, and comparisons
+#  give the same result as in python.  Partitions holding other values, and int results that
+#  might not fit in 64 bits, are computed one element at a time.
+
+_BINARY_OPS = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.div,
+               '**': operator.pow,
+               '<': operator.lt, '>': operator.gt, '<=': operator.le, '>=': operator.ge,
+               '==': operator.eq, '!=': operator.ne}
+_COMPARISON_OPS = ('<', '>', '<=', '>=', '==', '!=')
+_UNARY_OPS = {'-': operator.neg, 'abs': abs}
+
+
+def _numeric_array(values, typ):
+    """
+    Returns the values as a numpy array, and a mask of the missing values.
+
+    Returns None, None if the values are not all of the numeric type or missing.
+    """
+    kinds = 'i' if typ is int else 'if'
+    arr = numpy.array(values)
+    if arr.dtype.kind in kinds:
+        return arr, numpy.zeros(len(values), dtype=bool)
+    if arr.dtype.kind != 'O':
+        return None, None
+    missing = numpy.array([value is None for value in values], dtype=bool)
+    present = arr[~missing].tolist()
+    present = numpy.array(present) if len(present) > 0 else numpy.array([], dtype=typ)
+    if present.dtype.kind not in kinds:
+        return None, None
+    filled = numpy.zeros(len(values), dtype=present.dtype)
+    filled[~missing] = present
+    return filled, missing
+
+
+def _numpy_op(op, left, right):
+    if right is None:
+        return _UNARY_OPS[op](left)
+    if op == '/':
+        if left.dtype.kind == 'i' and right.dtype.kind == 'i':
+            return numpy.floor_divide(left, right)
+        return numpy.true_divide(left, right)
+    return _BINARY_OPS[op](left, right)
+
+
+def _numpy_partition(op, left, right, missing, python_elem):
+    """
+    Apply op to numpy operands.  Right is None for unary operators.
+
+    Returns the results as a list, or None if they must be computed in python.
+    Python_elem(i) computes the result for element i in python.
+    """
+    int_operands = left.dtype.kind == 'i' and (right is None or right.dtype.kind == 'i')
+    if op == '/':
+        # division by zero gives None
+        zero = right == 0
+        missing = missing | zero
+        right = numpy.where(zero, 1, right)
+    elif op == '**' and int_operands and (right < 0).any():
+        # python gives float results for negative int powers
+        return None
+    if int_operands and op not in _COMPARISON_OPS and op != '/':
+        approx = _numpy_op(op, left.astype(float), None if right is None else right.astype(float))
+        if approx.size > 0 and numpy.abs(approx).max() >= 2.0 ** 62:
+            return None
+    res = _numpy_op(op, left, right)
+    if not missing.any():
+        return res.tolist()
+    res = res.astype(object)
+    if op in _COMPARISON_OPS:
+        for i in numpy.flatnonzero(missing):
+            res[i] = python_elem(i)
+    else:
+        res[missing] = None
+    return res.tolist()
+
+
+def _vector_op_partition(op, python_fn, left_type, right_type):
+    """
+    Returns a partition function that applies op to the pairs of elements in a partition.
+    """
+    def apply_op(iterator):
+        pairs = list(iterator)
+        if len(pairs) > 0:
+            left_values, right_values = zip(*pairs)
+            left, left_missing = _numeric_array(left_values, left_type)
+            right, right_missing = _numeric_array(right_values, right_type)
+            if left is not None and right is not None:
+                res = _numpy_partition(op, left, right, left_missing | right_missing,
+                                       lambda i: python_fn(pairs[i]))
+                if res is not None:
+                    return res
+        return [python_fn(pair) for pair in pairs]
+    return apply_op
+
+
+def _scalar_op_partition(op, python_fn, typ, other=None, reverse=False):
+    """
+    Returns a partition function that applies op to the elements in a partition and a scalar.
+
+    Reverse puts the scalar on the left.  Unary operators have no scalar.
+    """
+    def apply_op(iterator):
+        values = list(iterator)
+        arr, missing = _numeric_array(values, typ)
+        if arr is not None:
+            if other is None:
+                left, right = arr, None
+            else:
+                scalar = numpy.asarray(other)
+                left, right = (scalar, arr) if reverse else (arr, scalar)
+            res = _numpy_partition(op, left, right, missing, lambda i: python_fn(values[i]))
+            if res is not None:
+                return res
+        return [python_fn(value) for value in values]
+    return apply_op
+
+
+def _vectorizable(*types):
+    return HAS_NUMPY and all(typ in (int, float) for typ in types)
+
+
 # noinspection PyIncorrectDocstring
 class XArrayImpl(TracedObject):
     # What is missing:
@@ -79,13 +289,32 @@ class XArrayImpl(TracedObject):
             rdd = XRdd(sc.parallelize([]))
         super(XArrayImpl, self).__init__()
         self._rdd = wrap_rdd(rdd)
+        persistence_manager.add_owner(self._rdd, self)
         self.elem_type = elem_type
         self.lineage = lineage or Lineage.init_array_lineage(Lineage.EMPTY)
         self.materialized = False
         self.iter_pos = 0
+        self._partition_offsets = None
+        self._stats = None
+        # A column of a frame read from a spark DataFrame is the DataFrame and the column name.
+        # A comparison of the column with a scalar is the DataFrame and the filter expression.
+        self._scan_column = None
+        self._scan_filter = None
 
     def _replace_rdd(self, rdd):
+        persistence_manager.remove_owner(self._rdd, self)
         self._rdd = wrap_rdd(rdd)
+        persistence_manager.add_owner(self._rdd, self)
+        self._partition_offsets = None
+        self._stats = None
+        self._scan_column = None
+        self._scan_filter = None
+
+    def scan_filter(self):
+        """
+        Returns the DataFrame and filter expression equivalent to this array, or None.
+        """
+        return self._scan_filter
 
     def dump_debug_info(self):
         return self._rdd.toDebugString()
@@ -107,9 +336,45 @@ class XArrayImpl(TracedObject):
         return xframes.xframe_impl.XFrameImpl(rdd, col_names, col_types, lineage)
 
     def _count(self):
-        count = self._rdd.count()
-        self.materialized = True
-        return count
+        return self._partition_index()[-1]
+
+    def _partition_index(self):
+        """
+        Returns the starting row of each partition, followed by the total row count.
+
+        This is computed once, when the RDD is first materialized.
+        """
+        if self._partition_offsets is None:
+            self._partition_offsets = partition_offsets(self._rdd.partition_counts())
+            self.materialized = True
+        return self._partition_offsets
+
+    def _summary_stats(self):
+        """
+        Returns the summary statistics of the RDD.
+
+        These are computed in a single pass the first time they are needed, and
+        the per-partition counts are kept as the partition index.
+        """
+        if self._stats is None:
+            numeric = is_numeric_type(self.elem_type)
+            counters = self._rdd.mapPartitions(lambda iterator: [StatCounter(numeric).add_all(iterator)]).collect()
+            stats = StatCounter(numeric)
+            for counter in counters:
+                stats.merge(counter)
+            if self._partition_offsets is None:
+                self._partition_offsets = partition_offsets([counter.count for counter in counters])
+            self._stats = stats
+            self.materialized = True
+        return self._stats
+
+    def _rv_range(self, start, step, stop, lineage=None):
+        """
+        Returns a new XArrayImpl with the elements between start and stop, counting by step.
+        """
+        offsets = self._partition_index()
+        res = slice_rdd(self._rdd, offsets, start, step, min(stop, offsets[-1]))
+        return self._rv(res, lineage=lineage)
 
     def rdd(self):
         return self._rdd
@@ -216,21 +481,30 @@ class XArrayImpl(TracedObject):
             res = XRdd(sc.pickleFile(path))
             metadata_path = os.path.join(path, '_metadata')
             with fileio.open_file(metadata_path) as f:
-                dtype = pickle.load(f)
+                metadata = pickle.load(f)
+            # directories saved before the format was versioned hold the pickled values
+            if isinstance(metadata, dict):
+                if metadata['version'] > FORMAT_VERSION:
+                    raise ValueError('XArray was saved in a newer format: version {}.'.format(metadata['version']))
+                dtype = metadata['dtype']
+                decode = decode_chunks([0])
+                res = res.flatMap(lambda record: decode(record).column_values(0))
+            else:
+                dtype = metadata
             lineage_path = os.path.join(path, '_lineage')
             if fileio.exists(lineage_path):
                 lineage = Lineage.load(lineage_path)
         else:
             res = XRdd(sc.textFile(path, use_unicode=False))
-            dtype = infer_type(res)
+            dtype = infer_type(res, object_utils.TYPE_INFERENCE_SAMPLE)
 
-        if dtype != str:
-            if dtype in (list, dict):
-                res = res.map(lambda x: ast.literal_eval(x))
-            elif dtype is datetime.datetime:
-                res = res.map(lambda x: date_parser.parse(x))
-            else:
-                res = res.map(lambda x: dtype(x))
+            if dtype != str:
+                if dtype in (list, dict):
+                    res = res.map(lambda x: ast.literal_eval(x))
+                elif dtype is datetime.datetime:
+                    res = res.map(lambda x: date_parser.parse(x))
+                else:
+                    res = res.map(lambda x: dtype(x))
         return cls(res, dtype, lineage)
 
     # noinspection PyUnusedLocal
@@ -269,17 +543,29 @@ class XArrayImpl(TracedObject):
     # Save
     def save(self, path):
         """
-        Saves the RDD to file in pickled form.
+        Saves the RDD to file in the native format: each partition is saved as a
+        compressed chunk of values.
         """
         self._entry(path=path)
         # this only works for local files
         fileio.delete(path)
+        records = self._rdd.map(lambda value: (value,)).mapPartitionsWithIndex(encode_chunks([self.elem_type]))
+        persist(records)
         try:
-            self._rdd.saveAsPickleFile(path)          # action ?
+            records.saveAsPickleFile(path)          # action ?
+            summary = sorted(records.map(lambda record: record[:3]).collect())
         except:
             # TODO distinguish between filesystem errors and pickle errors
             raise TypeError('The XArray save failed.')
-        metadata = self.elem_type
+        finally:
+            unpersist(records)
+        partition_rows = [num_rows for _, num_rows, _ in summary]
+        metadata = {'format': 'xarray',
+                    'version': FORMAT_VERSION,
+                    'dtype': self.elem_type,
+                    'num_rows': sum(partition_rows),
+                    'partition_rows': partition_rows,
+                    'stats': [stats[0] for _, _, stats in summary]}
         metadata_path = os.path.join(path, '_metadata')
         with fileio.open_file(metadata_path, 'w') as f:
             # TODO detect filesystem errors
@@ -308,36 +594,20 @@ class XArrayImpl(TracedObject):
         lineage_path = os.path.join(path, '_lineage')
         self.lineage.save(lineage_path)
 
-    def save_as_csv(self, path, **params):
-        """
-        Saves the RDD to file as text.
+    def save_as_csv(self, path, single_file=True, **params):
         """
-        self._entry(path=path)
+        Saves the RDD to file as csv, one element per line.
 
-        # noinspection PyShadowingNames
-        def to_csv(row, **params):
-            sio = StringIO.StringIO()
-            writer = csv.writer(sio, **params)
-            try:
-                writer.writerow([row], **params)
-                ret = sio.getvalue()
-                return ret
-            except IOError:
-                return ''
+        The partitions are written in parallel.  If single_file is True, they are
+        concatenated into one file, otherwise path is a directory of part files.
+        """
+        self._entry(path=path, single_file=single_file)
 
-        fileio.delete(path)
-        with fileio.open_file(path, 'w') as f:
-            self.begin_iterator()
-            elems_at_a_time = 10000
-            ret = self.iterator_get_next(elems_at_a_time)
-            while True:
-                for row in ret:
-                    line = to_csv(row, **params)
-                    f.write(line)
-                if len(ret) == elems_at_a_time:
-                    ret = self.iterator_get_next(elems_at_a_time)
-                else:
-                    break
+        def to_csv(iterator):
+            encode = csv_line_encoder(**params)
+            for row in iterator:
+                yield encode([row])
+        save_text_lines(self._rdd.mapPartitions(to_csv), path, single_file)
 
     def to_rdd(self, number_of_partitions=None):
         """
@@ -381,10 +651,7 @@ class XArrayImpl(TracedObject):
     # Get Data
     def head(self, n):
         self._entry(n=n)
-        pairs = self._rdd.zipWithIndex()
-        filtered_pairs = pairs.filter(lambda x: x[1] < n)
-        res = filtered_pairs.keys()
-        return self._rv(res)
+        return self._rv_range(0, 1, n)
 
     def head_as_list(self, n):
         self._entry(n=n)
@@ -394,13 +661,8 @@ class XArrayImpl(TracedObject):
 
     def tail(self, n):
         self._entry(n=n)
-        pairs = self._rdd.zipWithIndex()
-        cache(pairs)
-        start = pairs.count() - n
-        filtered_pairs = pairs.filter(lambda x: x[1] >= start)
-        uncache(pairs)
-        res = filtered_pairs.keys()
-        return self._rv(res)
+        count = self._count()
+        return self._rv_range(max(count - n, 0), 1, count)
 
     def topk_index(self, topk, reverse):
         """
@@ -453,16 +715,18 @@ class XArrayImpl(TracedObject):
         self._entry()
         self.iter_pos = 0
 
+    def iter_rows(self):
+        """ Returns an iterator over the elements, collecting one partition at a time. """
+        self._entry()
+        return iterate_partitions(self._rdd, object_utils.ITERATOR_PREFETCH)
+
     def iterator_get_next(self, elems_at_a_time):
         """ Gets a group of elements for the iterator. """
 
         self._entry(elems_at_a_time=elems_at_a_time)
-        buf_rdd = self._rdd.zipWithIndex()
         low = self.iter_pos
         high = self.iter_pos + elems_at_a_time
-        filtered_rdd = buf_rdd.filter(lambda row: row[1] >= low < high)
-        trimmed_rdd = filtered_rdd.map(lambda row: row[0])
-        iter_buf = trimmed_rdd.collect()
+        iter_buf = collect_range(self._rdd, self._partition_index(), low, 1, high)
         self.iter_pos += elems_at_a_time
         return iter_buf
 
@@ -475,41 +739,52 @@ class XArrayImpl(TracedObject):
         res_type = self.elem_type
         pairs = self._rdd.zip(other.rdd())
         if op == '+':
-            res = pairs.map(lambda x: x[0] + x[1])
+            fn = lambda x: x[0] + x[1]
         elif op == '-':
-            res = pairs.map(lambda x: x[0] - x[1])
+            fn = lambda x: x[0] - x[1]
         elif op == '*':
-            res = pairs.map(lambda x: x[0] * x[1])
+            fn = lambda x: x[0] * x[1]
         elif op == '/':
-            res = pairs.map(lambda x: x[0] / x[1] if x[1] != 0 else None)
+            fn = lambda x: x[0] / x[1] if x[1] != 0 else None
         elif op == '<':
-            res = pairs.map(lambda x: x[0] < x[1])
+            fn = lambda x: x[0] < x[1]
             res_type = int
         elif op == '>':
-            res = pairs.map(lambda x: x[0] > x[1])
+            fn = lambda x: x[0] > x[1]
             res_type = int
         elif op == '<=':
-            res = pairs.map(lambda x: x[0] <= x[1])
+            fn = lambda x: x[0] <= x[1]
             res_type = int
         elif op == '>=':
-            res = pairs.map(lambda x: x[0] >= x[1])
+            fn = lambda x: x[0] >= x[1]
             res_type = int
         elif op == '==':
-            res = pairs.map(lambda x: x[0] == x[1])
+            fn = lambda x: x[0] == x[1]
             res_type = int
         elif op == '!=':
-            res = pairs.map(lambda x: x[0] != x[1])
+            fn = lambda x: x[0] != x[1]
             res_type = int
         elif op == '&':
-            res = pairs.map(lambda x: x[0] and x[1])
+            fn = lambda x: x[0] and x[1]
             res_type = int
         elif op == '|':
-            res = pairs.map(lambda x: x[0] or x[1])
+            fn = lambda x: x[0] or x[1]
             res_type = int
         else:
             raise NotImplementedError(op)
+        if op in _BINARY_OPS and _vectorizable(self.elem_type, other.elem_type):
+            res = pairs.mapPartitions(_vector_op_partition(op, fn, self.elem_type, other.elem_type))
+        else:
+            res = pairs.map(fn)
         lineage = self.lineage.merge(other.lineage)
-        return self._rv(res, res_type, lineage)
+        res = self._rv(res, res_type, lineage)
+        left_filter = self._scan_filter
+        right_filter = other.scan_filter()
+        if op in ('&', '|') and left_filter is not None and right_filter is not None and \
+                left_filter[0] is right_filter[0]:
+            expr = left_filter[1] & right_filter[1] if op == '&' else left_filter[1] | right_filter[1]
+            res._scan_filter = (left_filter[0], expr)
+        return res
 
     def left_scalar_operator(self, other, op):
         """
@@ -518,35 +793,46 @@ class XArrayImpl(TracedObject):
         self._entry(op=op)
         res_type = self.elem_type
         if op == '+':
-            res = self._rdd.map(lambda x: x + other)
+            fn = lambda x: x + other
         elif op == '-':
-            res = self._rdd.map(lambda x: x - other)
+            fn = lambda x: x - other
         elif op == '*':
-            res = self._rdd.map(lambda x: x * other)
+            fn = lambda x: x * other
         elif op == '/':
-            res = self._rdd.map(lambda x: x / other)
+            fn = lambda x: x / other if other != 0 else None
         elif op == '**':
-            res = self._rdd.map(lambda x: x ** other)
+            fn = lambda x: x ** other
         elif op == '<':
-            res = self._rdd.map(lambda x: x < other)
+            fn = lambda x: x < other
             res_type = int
         elif op == '>':
-            res = self._rdd.map(lambda x: x > other)
+            fn = lambda x: x > other
+            res_type = int
         elif op == '<=':
-            res = self._rdd.map(lambda x: x <= other)
+            fn = lambda x: x <= other
             res_type = int
         elif op == '>=':
-            res = self._rdd.map(lambda x: x >= other)
+            fn = lambda x: x >= other
             res_type = int
         elif op == '==':
-            res = self._rdd.map(lambda x: x == other)
+            fn = lambda x: x == other
             res_type = int
         elif op == '!=':
-            res = self._rdd.map(lambda x: x != other)
+            fn = lambda x: x != other
             res_type = int
         else:
             raise NotImplementedError(op)
-        return self._rv(res, res_type)
+        if type(other) in (int, float) and _vectorizable(self.elem_type):
+            res = self._rdd.mapPartitions(_scalar_op_partition(op, fn, self.elem_type, other))
+        else:
+            res = self._rdd.map(fn)
+        res = self._rv(res, res_type)
+        if self._scan_column is not None:
+            dataframe, column_name = self._scan_column
+            expr = pushdown_comparison(column_name, self.elem_type, op, other)
+            if expr is not None:
+                res._scan_filter = (dataframe, expr)
+        return res
 
     def right_scalar_operator(self, other, op):
         """
@@ -554,15 +840,19 @@ class XArrayImpl(TracedObject):
         """
         self._entry(op=op)
         if op == '+':
-            res = self._rdd.map(lambda x: other + x)
+            fn = lambda x: other + x
         elif op == '-':
-            res = self._rdd.map(lambda x: other - x)
+            fn = lambda x: other - x
         elif op == '*':
-            res = self._rdd.map(lambda x: other * x)
+            fn = lambda x: other * x
         elif op == '/':
-            res = self._rdd.map(lambda x: other / x if x != 0 else None)
+            fn = lambda x: other / x if x != 0 else None
         else:
             raise NotImplementedError(op)
+        if type(other) in (int, float) and _vectorizable(self.elem_type):
+            res = self._rdd.mapPartitions(_scalar_op_partition(op, fn, self.elem_type, other, reverse=True))
+        else:
+            res = self._rdd.map(fn)
         return self._rv(res)
 
     def unary_operator(self, op):
@@ -571,13 +861,17 @@ class XArrayImpl(TracedObject):
         """
         self._entry(op=op)
         if op == '+':
-            res = self._rdd
+            return self._rv(self._rdd)
         elif op == '-':
-            res = self._rdd.map(lambda x: -x)
+            fn = lambda x: -x
         elif op == 'abs':
-            res = self._rdd.map(lambda x: abs(x))
+            fn = lambda x: abs(x)
         else:
             raise NotImplementedError(op)
+        if _vectorizable(self.elem_type):
+            res = self._rdd.mapPartitions(_scalar_op_partition(op, fn, self.elem_type))
+        else:
+            res = self._rdd.map(fn)
         return self._rv(res)
 
     # Sample
@@ -608,16 +902,17 @@ class XArrayImpl(TracedObject):
         Returns an RDD consisting of the values between start and stop, counting by step.
         """
         self._entry(start=start, step=step, stop=stop)
-
-        # noinspection PyShadowingNames
-        def select_row(x, start, step, stop):
-            if x < start or x >= stop:
-                return False
-            return (x - start) % step == 0
-        pairs = self._rdd.zipWithIndex()
-        res = pairs.filter(lambda x: select_row(x[1], start, step, stop)).map(lambda x: x[0])
         lineage = Lineage.init_array_lineage(Lineage.RANGE)
-        return self._rv(res, lineage=lineage)
+        return self._rv_range(start, step, stop, lineage=lineage)
+
+    def take_range(self, start, step, stop):
+        """
+        Returns a list of the values between start and stop, counting by step.
+
+        Only the partitions that contain these values are computed.
+        """
+        self._entry(start=start, step=step, stop=stop)
+        return collect_range(self._rdd, self._partition_index(), start, step, stop)
 
     def vector_slice(self, start, end):
         """
@@ -947,23 +1242,16 @@ class XArrayImpl(TracedObject):
                             row[i] = na_value
             return row
 
-        # noinspection PyShadowingNames
-        def narrow(row, n_cols):
-            if len(row) > n_cols:
-                row = row[0:n_cols]
-            return row
-
         def cast_elem(x, dtype):
             return None if x is None else dtype(x)
 
         # noinspection PyShadowingNames
         def cast_row(row, column_types):
-            return [cast_elem(x, dtype) for x, dtype in zip(row, column_types)]
+            return tuple([cast_elem(x, dtype) for x, dtype in zip(row, column_types)])
+        # select_elems returns exactly n_cols elements, so the row needs no narrowing
         res = self._rdd.map(lambda row: extend(row, n_cols, na_value))
         res = res.map(lambda row: select_elems(row, limit))
-        res = res.map(lambda row: narrow(row, n_cols))
         res = res.map(lambda row: cast_row(row, column_types))
-        res = res.map(tuple)
         lineage = self.lineage.unpack_array(column_names)
         return self._rv_frame(res, column_names, column_types, lineage)
 
@@ -1004,24 +1292,7 @@ class XArrayImpl(TracedObject):
         Returns True on an empty RDD.
         """
         self._entry()
-        count = self._count()     # action
-        if count == 0:
-            return True
-
-        def do_all(val1, val2):
-            if isinstance(val1, float) and math.isnan(val1):
-                val1 = False
-            if isinstance(val2, float) and math.isnan(val2):
-                val2 = False
-            if val1 is None:
-                val1 = False
-            if val2 is None:
-                val2 = False
-            return bool(val1 and val2)
-
-        def combine(acc1, acc2): 
-            return acc1 and acc2
-        return self._rdd.aggregate(True, do_all, combine)       # action
+        return self._summary_stats().all     # action
 
     def any(self):
         """
@@ -1032,25 +1303,7 @@ class XArrayImpl(TracedObject):
         Returns False on an empty RDD.
         """
         self._entry()
-        count = self._count()     # action
-        if count == 0:
-            return False
-
-        def do_any(val1, val2):
-            if isinstance(val1, float) and math.isnan(val1):
-                val1 = False
-            if isinstance(val2, float) and math.isnan(val2):
-                val2 = False
-            if val1 is None:
-                val1 = False
-            if val2 is None:
-                val2 = False
-            return bool(val1 or val2)
-
-        def combine(acc1, acc2): 
-            return acc1 or acc2
-        res = self._rdd.aggregate(False, do_any, combine)    # action
-        return bool(res)
+        return self._summary_stats().any     # action
 
     def max(self):
         """
@@ -1060,12 +1313,12 @@ class XArrayImpl(TracedObject):
         RDD with non-numeric type.
         """
         self._entry()
-        count = self._count()     # action
-        if count == 0:     # action
+        stats = self._summary_stats()     # action
+        if stats.count == 0:
             return None
         if not is_numeric_type(self.elem_type):
             raise TypeError('max: non numeric type')
-        return self._rdd.max()          # action
+        return stats.max
 
     def min(self):
         """
@@ -1075,12 +1328,12 @@ class XArrayImpl(TracedObject):
         RDD with non-numeric type.
         """
         self._entry()
-        count = self._count()     # action
-        if count == 0:     # action
+        stats = self._summary_stats()     # action
+        if stats.count == 0:
             return None
         if not is_numeric_type(self.elem_type):
-            raise TypeError('sum: non numeric type')
-        return self._rdd.min()      # action
+            raise TypeError('min: non numeric type')
+        return stats.min
 
     def sum(self):
         """
@@ -1093,13 +1346,16 @@ class XArrayImpl(TracedObject):
         overflow without warning.
         """
         self._entry()
+        if is_numeric_type(self.elem_type):
+            stats = self._summary_stats()     # action
+            if stats.count == 0:
+                return None
+            return stats.sum
+
         count = self._count()     # action
-        if count == 0:     # action
+        if count == 0:
             return None
-
-        if is_numeric_type(self.elem_type):
-            total = self._rdd.sum()    # action
-        elif self.elem_type is array.array:
+        if self.elem_type is array.array:
             def array_sum(x, y):
                 if x.typecode != y.typecode:
                     logging.warn('Sum: arrays are not compatible')
@@ -1128,12 +1384,14 @@ class XArrayImpl(TracedObject):
         RDD with non-numeric type.
         """
         self._entry()
-        count = self._count()     # action
-        if count == 0:     # action
+        stats = self._summary_stats()     # action
+        if stats.count == 0:
             return None
         if not is_numeric_type(self.elem_type):
             raise TypeError('mean: non numeric type')
-        return self._rdd.mean()       # action
+        if stats.n == 0:
+            return None
+        return stats.mean
 
     def std(self, ddof):
         """
@@ -1143,18 +1401,14 @@ class XArrayImpl(TracedObject):
         RDD with non-numeric type or if `ddof` >= length of RDD.
         """
         self._entry(ddof=ddof)
-        count = self._count()     # action
-        if count == 0:      # action
+        stats = self._summary_stats()     # action
+        if stats.count == 0:
             return None
         if not is_numeric_type(self.elem_type):
-            raise TypeError('mean: non numeric type')
-        if ddof < 0 or ddof > 1 or ddof >= count:
+            raise TypeError('std: non numeric type')
+        if ddof < 0 or ddof > 1 or ddof >= stats.n:
             raise ValueError('std: invalid ddof {}'.format(ddof))
-        if ddof == 0:
-            res = self._rdd.stdev()
-        else:
-            res = self._rdd.sampleStdev()       # action
-        return res
+        return math.sqrt(stats.variance(ddof))
 
     def var(self, ddof):
         """
@@ -1164,45 +1418,28 @@ class XArrayImpl(TracedObject):
         RDD with non-numeric type or if `ddof` >= length of XArray.
         """
         self._entry(ddof=ddof)
-        count = self._count()     # action
-        if count == 0:      # action
+        stats = self._summary_stats()     # action
+        if stats.count == 0:
             return None
         if not is_numeric_type(self.elem_type):
-            raise TypeError('mean: non numeric type')
-        if ddof < 0 or ddof > 1 or ddof >= count:
-            raise ValueError('std: invalid ddof {}'.format(ddof))
-        if ddof == 0:
-            res = self._rdd.variance()     # action
-        else:
-            res = self._rdd.sampleVariance()     # action
-        return res
+            raise TypeError('var: non numeric type')
+        if ddof < 0 or ddof > 1 or ddof >= stats.n:
+            raise ValueError('var: invalid ddof {}'.format(ddof))
+        return stats.variance(ddof)
 
     def num_missing(self):
         """
         Number of missing elements in the RDD.
         """
         self._entry()
-        self.materialized = True
-        res = self._rdd.aggregate(0,             # action
-                                  lambda acc, v: acc + 1 if is_missing(v) else acc,
-                                  lambda acc1, acc2: acc1 + acc2)
-        return res
+        return self._summary_stats().num_missing     # action
 
     def nnz(self):
         """
         Number of non-zero elements in the RDD.
         """
         self._entry()
-        self.materialized = True
-
-        def ne_zero(x):
-            if is_missing(x):
-                return False
-            return x != 0
-        res = self._rdd.aggregate(0,            # action
-                                  lambda acc, v: acc + 1 if ne_zero(v) else acc,
-                                  lambda acc1, acc2: acc1 + acc2)
-        return res
+        return self._summary_stats().nnz     # action
 
     def item_length(self):
         """
@@ -1327,7 +1564,7 @@ class XArrayImpl(TracedObject):
             raise TypeError('XArray dtype must be dict: {}'.format(self.dtype))
 
         res = self._rdd.map(lambda item: item.keys())
-        column_types = infer_types(res)
+        column_types = infer_types(res, object_utils.TYPE_INFERENCE_SAMPLE)
         column_names = ['X.{}'.format(i) for i in range(len(column_types))]
         return self._rv_frame(res, column_names, column_types)
 
@@ -1341,7 +1578,7 @@ class XArrayImpl(TracedObject):
             raise TypeError('XArray dtype must be dict: {}'.format(self.dtype))
 
         res = self._rdd.map(lambda item: item.values())
-        column_types = infer_types(res)
+        column_types = infer_types(res, object_utils.TYPE_INFERENCE_SAMPLE)
         column_names = ['X.{}'.format(i) for i in range(len(column_types))]
         return self._rv_frame(res, column_names, column_types)
 
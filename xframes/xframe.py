@@ -25,10 +25,12 @@ from xframes.deps import pandas, HAS_PANDAS
 from xframes.prettytable import PrettyTable
 from xframes.xframe_impl import XFrameImpl
 from xframes.xarray_impl import infer_type_of_list
-from xframes.utils import make_internal_url
+from xframes.utils import make_internal_url, persistence_manager
 from xframes.type_utils import classify_type, classify_auto, is_sortable_type, is_xframe_type
+from xframes.type_utils import resolve_types, infer_column_types
 from xframes.object_utils import check_input_uri, check_output_uri
 from xframes import object_utils
+from xframes.job_tracker import JobTracker
 from xframes.xarray import XArray
 import xframes
 
@@ -44,6 +46,11 @@ __all__ = ['XFrame']
 
 
 # noinspection PyUnresolvedReferences,PyShadowingNames
+@JobTracker.track_actions('load', 'read_csv_with_errors', 'read_csv', 'read_parquet',
+                          'print_rows', '__str__', '_repr_html_', '__nonzero__', '__len__',
+                          'num_rows', 'head', 'tail', 'to_pandas_dataframe', 'foreach',
+                          'detect_type', 'detect_type_and_cast', 'topk', 'save', 'save_as_parquet',
+                          '_materialize', 'join', 'sort')
 class XFrame(object):
     """
     A tabular, column-mutable dataframe object that can scale to big data. 
@@ -127,7 +134,6 @@ class XFrame(object):
         -----
         The following functionality is currently not implemented.
             - pack_columns data types except list, array, and dict
-            - groupby quantile
 
         See Also
         --------
@@ -412,6 +418,125 @@ class XFrame(object):
         """
         object_utils.HTML_MAX_ROW_WIDTH = width
 
+    @classmethod
+    def set_broadcast_join_max_rows(cls, max_rows):
+        """
+        Set the size limit for automatic broadcast joins.
+
+        When joining, if one side is known to have no more than this many rows,
+        it is broadcast to the workers instead of shuffling both sides.
+
+        Parameters
+        ----------
+        max_rows : int
+            The maximum number of rows in a side that is broadcast automatically.
+            Use 0 to disable automatic broadcast joins.
+        """
+        object_utils.BROADCAST_JOIN_MAX_ROWS = max_rows
+
+    @classmethod
+    def set_iterator_prefetch(cls, prefetch):
+        """
+        Set whether iteration prefetches partitions.
+
+        XFrames and XArrays are iterated one partition at a time.  With prefetch,
+        the next partition is collected in the background while the current one is
+        being consumed.
+
+        Parameters
+        ----------
+        prefetch : bool
+            If True, prefetch the next partition while iterating.
+        """
+        object_utils.ITERATOR_PREFETCH = prefetch
+
+    @classmethod
+    def set_storage_budget(cls, max_bytes):
+        """
+        Set the storage budget for persisted data.
+
+        XFrames and XArrays persist intermediate results, and release them when they are
+        no longer referenced.  If a budget is set, then whenever more data is persisted
+        and the storage used exceeds the budget, the least recently used data is
+        unpersisted.  Unpersisted data is recomputed if it is needed again.
+
+        Parameters
+        ----------
+        max_bytes : int
+            The number of bytes of memory and disk storage that persisted data may use.
+            Use None for no limit.
+        """
+        object_utils.STORAGE_BUDGET = max_bytes
+
+    @classmethod
+    def set_columnar_storage(cls, columnar):
+        """
+        Set whether persisted XFrames store their data by column.
+
+        With columnar storage, when an XFrame is persisted or materialized each partition
+        is stored as one block, with an array for each column of int, float, or datetime
+        values.  This takes much less memory than storing each row, and is faster to
+        cache.  Selecting columns and filtering by column values work on the blocks
+        directly.  Other operations convert the blocks back to rows.
+
+        Parameters
+        ----------
+        columnar : bool
+            If True, store persisted XFrames by column.
+        """
+        object_utils.COLUMNAR_STORAGE = columnar
+
+    @classmethod
+    def set_type_inference_sample(cls, sample_size):
+        """
+        Set how many rows are examined to infer column types.
+
+        By default, read_csv and read_text infer types from the first 100 rows, which
+        all come from the first partition.  With a sample size, that many rows are
+        sampled from all the partitions in a single job, and the types found in each
+        partition are merged.  An int column with a float value anywhere in the sample
+        is read as float, and a column with values of several kinds is read as str.
+
+        Parameters
+        ----------
+        sample_size : int
+            The number of rows to sample.  Use None to infer from the first 100 rows.
+        """
+        object_utils.TYPE_INFERENCE_SAMPLE = sample_size
+
+    @classmethod
+    def persisted_rdds(cls):
+        """
+        Describe the data that is currently persisted.
+
+        Returns
+        -------
+        out : list [dict]
+            One entry for each persisted RDD, least recently used first.  Each entry
+            contains the RDD 'id', its 'storage_level', the number of 'owners'
+            (XFrames and XArrays that refer to it), its 'size' in bytes, and
+            'last_used', the time it was last persisted or referenced.
+        """
+        return persistence_manager.cached()
+
+    @classmethod
+    def set_operation_tracking(cls, track):
+        """
+        Set whether spark jobs are attributed to XFrame and XArray operations.
+
+        When tracking is on, each XFrame and XArray action, such as len, save, or sum,
+        runs its spark jobs in a job group whose description names the operation and the
+        line that called it.  These show up in the spark UI, and the operations that ran
+        jobs are summarized by :py:meth:`xframes.job_tracker.JobTracker.report`.
+        Tracking is off by default.
+
+        Parameters
+        ----------
+        track : bool
+            If True, track operations.
+        """
+        JobTracker.set_tracking(track)
+
     @classmethod
     def set_footer_strs(cls, footer_strs):
         """
@@ -464,15 +589,7 @@ class XFrame(object):
 
         def infer_type(col, na_values):
             col = [val for val in col if val not in na_values]
-            types = [classify_type(val) for val in col if val is not None]
-            unique_types = set(types)
-            if len(unique_types) == 1:
-                dtype = types[0]
-            elif unique_types == {int, float}:
-                dtype = float
-            else:
-                dtype = str
-            return dtype
+            return resolve_types({classify_type(val) for val in col if val is not None})
 
         n_cols = len(head[0])
         cols = [[row[i] for row in head] for i in range(n_cols)]
@@ -486,7 +603,7 @@ class XFrame(object):
         return column_type_hints
 
     @classmethod
-    def load(cls, filename):
+    def load(cls, filename, columns=None):
         """
         Load an XFrame. The filename extension is used to determine the format
         automatically. This function is particularly useful for XFrames previously
@@ -499,6 +616,10 @@ class XFrame(object):
         filename : string
             Location of the file to load. Can be a local path or a remote URL.
 
+        columns : list [str], optional
+            The columns to load.  Defaults to all of them.  For the binary format, only
+            the data of these columns is decompressed.
+
         Returns
         -------
         :class:`.XFrame`
@@ -518,6 +639,8 @@ class XFrame(object):
         >>> sf_loaded = xframes.XFrame.load('my_xframe')
         """
         sf = cls(data=filename)
+        if columns is not None:
+            sf = sf.select_columns(columns)
         return sf
 
     @classmethod
@@ -580,7 +703,23 @@ class XFrame(object):
         # Attempt to automatically detect the column types. Either produce a
         # list of types; otherwise default to all str types.
         column_type_inference_was_used = False
-        if column_type_hints is None:
+        if column_type_hints is None and object_utils.TYPE_INFERENCE_SAMPLE is not None:
+            try:
+                # Sample rows from the whole file, parsed as str.
+                sample_config = dict(parsing_config, store_errors=False, persist=False)
+                sample_config.pop('row_limit', None)
+                _, lines = XFrameImpl.load_from_csv(internal_url, sample_config, {'__all_columns__': str})
+                column_type_hints = infer_column_types(lines.rdd(), object_utils.TYPE_INFERENCE_SAMPLE, na_values)
+                if verbose:
+                    typelist = '[' + ','.join(t.__name__ for t in column_type_hints) + ']'
+                    print >> stderr, 'Inferred types from a sample of the file as column_type_hints=' + typelist
+                column_type_inference_was_used = True
+            except Exception as e:
+                if verbose:
+                    logging.info('Error {} {}'.format(type(e).__name__, e))
+                    logging.warn('Could not detect types. Using str for each column.')
+                column_type_hints = str
+        elif column_type_hints is None:
             try:
                 # Get the first 100 rows (using all the desired arguments).
                 # first row may be excluded (based on heder setting)
@@ -2479,7 +2618,7 @@ class XFrame(object):
         return xf.sort(column_name, ascending=reverse)
 
     # noinspection PyShadowingBuiltins
-    def save(self, filename, format=None):
+    def save(self, filename, format=None, single_file=True):
         """
         Save the XFrame to a file system for later use.
 
@@ -2492,13 +2631,20 @@ class XFrame(object):
 
         format : {'binary', 'csv', 'tsv', 'parquet', json}, optional
             Format in which to save the XFrame. Binary saved XFrames can be
-            loaded much faster and without any format conversion losses. If not
+            loaded much faster and without any format conversion losses.  They store
+            each partition as compressed column chunks, with the row counts and the
+            min, max, and null count of each chunk in the metadata.  If not
             given, will try to infer the format from filename given. If file
             name ends with 'csv' or '.csv.gz', then save as 'csv' format.
             If the file ends with 'json', then save as json file.
             If the file ends with 'parquet', then save as parquet file.
             Otherwise save as 'binary' format.
 
+        single_file : bool, optional
+            For 'csv' and 'tsv' formats only.  The partitions are written in parallel.
+            If True (the default), they are then combined into a single file.  If False,
+            the XFrame is saved as a directory of part files, with the heading in the first part.
+
         See Also
         --------
         xframes.XFrame.load
@@ -2552,11 +2698,11 @@ class XFrame(object):
         elif format == 'csv':
             if not filename.endswith(('.csv', '.csv.gz')):
                 raise ValueError('File name must end with .csv or .csv.gz.')
-            self._impl.save_as_csv(url)
+            self._impl.save_as_csv(url, single_file=single_file)
         elif format == 'tsv':
             if not filename.endswith(('.tsv', '.tsv.gz')):
                 raise ValueError('File name must end with .tsv or .tsv.gz.')
-            self._impl.save_as_csv(url, delimiter='\t')
+            self._impl.save_as_csv(url, single_file=single_file, delimiter='\t')
         elif format == 'json':
             if not filename.endswith('.json'):
                 raise ValueError('File name must end with .json.')
@@ -3107,10 +3253,10 @@ class XFrame(object):
                 key += len(self)
             if key >= len(self):
                 raise IndexError('XFrame index out of range (too high).')
-            res = list(XFrame(impl=self._impl.copy_range(key, 1, key + 1)))
+            res = self._impl.take_range(key, 1, key + 1)
             if len(res) == 0:
                 raise IndexError('XFrame index out of range (too low).')
-            return res[0]
+            return dict(zip(self.column_names(), res[0]))
         if isinstance(key, slice):
             start = key.start
             stop = key.stop
@@ -3214,7 +3360,8 @@ class XFrame(object):
         Persist or unpersist the underlying data storage object.
 
         Persisting makes a copy of the object on the disk, so that it does not have to be recomputed in times of
-        low memory.  Unpersisting frees up this space.
+        low memory.  Unpersisting frees up this space, once no other XFrame or XArray
+        refers to the same data.
 
         Parameters
         ----------
@@ -3242,25 +3389,12 @@ class XFrame(object):
         """
 
         def generator():
-            # The more we get at a time, the more buffer space it takes.
-            # But getting a lot of items takes a lot of time, if we only need a few.
-            # Getting more is expensive, because we have to number everything and then
-            #  filter out the ones we don't want.  This is a compromise.
-            # TODO: start with getting fwer, and if that is not enough, get
-            # TODO: a bigger chunk.
-            elems_at_a_time = 200000
-            self._impl.begin_iterator()
-            ret = self._impl.iterator_get_next(elems_at_a_time)
+            # Rows are streamed one partition at a time, so a full iteration
+            #  makes one pass over the data.
             column_names = self.column_names()
-            while True:
-                for j in ret:
-                    # Iterator returns dictionaries
-                    yield dict(zip(column_names, j))
-
-                if len(ret) == elems_at_a_time:
-                    ret = self._impl.iterator_get_next(elems_at_a_time)
-                else:
-                    break
+            for row in self._impl.iter_rows():
+                # Iterator returns dictionaries
+                yield dict(zip(column_names, row))
 
         return generator()
 
@@ -3290,11 +3424,10 @@ class XFrame(object):
                 key += len(self)
             if key >= len(self):
                 raise IndexError('XFrame index out of range (too high).')
-            res = list(XFrame(impl=self._impl.copy_range(key, 1, key + 1)))
+            res = self._impl.take_range(key, 1, key + 1)
             if len(res) == 0:
                 raise IndexError('XFrame index out of range (too low).')
-            return res[0]
-#            return list(XFrame(impl=self._impl.copy_range(key, 1, key + 1)))[0]
+            return dict(zip(self.column_names(), res[0]))
         elif isinstance(key, slice):
             start = key.start
             stop = key.stop
@@ -3678,21 +3811,21 @@ class XFrame(object):
         >>> user_rating_stats = xf.groupby(['user_id', 'time'], agg.COUNT(),
         ...                                {'rating_quantiles': agg.QUANTILE('rating',[0.25, 0.75])})
         >>> user_rating_stats
-        +------+---------+-------+------------------------+
-        | time | user_id | Count |    rating_quantiles    |
-        +------+---------+-------+------------------------+
-        | 2006 |  61285  |   1   | array('d', [4.0, 4.0]) |
-        | 2000 |  36078  |   1   | array('d', [4.0, 4.0]) |
-        | 2003 |  47158  |   1   | array('d', [3.0, 3.0]) |
-        | 2007 |  34446  |   1   | array('d', [3.0, 3.0]) |
-        | 2010 |  47990  |   1   | array('d', [3.0, 3.0]) |
-        | 2003 |  42120  |   1   | array('d', [5.0, 5.0]) |
-        | 2007 |  44940  |   1   | array('d', [4.0, 4.0]) |
-        | 2008 |  58240  |   1   | array('d', [4.0, 4.0]) |
-        | 2002 |   102   |   1   | array('d', [1.0, 1.0]) |
-        | 2009 |  52708  |   1   | array('d', [3.0, 3.0]) |
-        | ...  |   ...   |  ...  |          ...           |
-        +------+---------+-------+------------------------+
+        +------+---------+-------+------------------+
+        | time | user_id | Count | rating_quantiles |
+        +------+---------+-------+------------------+
+        | 2006 |  61285  |   1   |    [4.0, 4.0]    |
+        | 2000 |  36078  |   1   |    [4.0, 4.0]    |
+        | 2003 |  47158  |   1   |    [3.0, 3.0]    |
+        | 2007 |  34446  |   1   |    [3.0, 3.0]    |
+        | 2010 |  47990  |   1   |    [3.0, 3.0]    |
+        | 2003 |  42120  |   1   |    [5.0, 5.0]    |
+        | 2007 |  44940  |   1   |    [4.0, 4.0]    |
+        | 2008 |  58240  |   1   |    [4.0, 4.0]    |
+        | 2002 |   102   |   1   |    [1.0, 1.0]    |
+        | 2009 |  52708  |   1   |    [3.0, 3.0]    |
+        | ...  |   ...   |  ...  |       ...        |
+        +------+---------+-------+------------------+
         [10000 rows x 4 columns]
 
         To put all items a user rated into one list value by their star rating:
@@ -3742,7 +3875,7 @@ class XFrame(object):
         """
         return self._groupby(key_columns, operations, *args)
 
-    def join(self, right, on=None, how='inner'):
+    def join(self, right, on=None, how='inner', strategy='auto'):
         """
         Merge two XFrames. Merges the current (left) XFrame with the given
         (right) XFrame using a SQL-style equi-join operation by columns.
@@ -3794,6 +3927,20 @@ class XFrame(object):
               There is no common column matching: the resulting number of rows is the product
               of the row counts of the left and right XFrames.
 
+        strategy : {'auto', 'shuffle', 'broadcast'}, optional
+            How the join is carried out.  'auto' is default.
+
+            * auto: Broadcast one side if its row count is known and is small
+              enough (see :py:func:`~xframes.XFrame.set_broadcast_join_max_rows`),
+              otherwise shuffle.
+
+            * shuffle: Partition both sides by the join keys and join matching partitions.
+
+            * broadcast: Collect the smaller side, send it to every worker, and join in a single
+              pass over the larger side without a shuffle.  The broadcast side must fit in memory.
+              An inner join may broadcast either side, a left join broadcasts the right side,
+              and a right join broadcasts the left side.  Not available for full joins.
+
         Returns
         -------
         :class:`.XFrame`
@@ -3850,6 +3997,7 @@ class XFrame(object):
         [5 rows x 3 columns]
         """
         available_join_types = ['inner', 'left', 'right', 'full', 'cartesian']
+        available_strategies = ['auto', 'shuffle', 'broadcast']
 
         if not isinstance(right, XFrame):
             raise TypeError('Can only join two XFrames.')
@@ -3857,6 +4005,11 @@ class XFrame(object):
         if how not in available_join_types:
             raise ValueError('Invalid join type.')
 
+        if strategy not in available_strategies:
+            raise ValueError('Invalid join strategy.')
+        if strategy == 'broadcast' and how not in ['inner', 'left', 'right']:
+            raise ValueError("Broadcast join strategy is only available for 'inner', 'left', and 'right' joins.")
+
         join_keys = dict()
         if on is None:
             left_names = self.column_names()
@@ -3876,7 +4029,7 @@ class XFrame(object):
         else:
             raise TypeError("Must pass a 'str', 'list', or 'dict' of join keys.")
 
-        return XFrame(impl=self._impl.join(right._impl, how, join_keys))
+        return XFrame(impl=self._impl.join(right._impl, how, join_keys, strategy))
 
     def split_datetime(self, expand_column, column_name_prefix=None, limit=None):
         """
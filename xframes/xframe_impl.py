@@ -2,14 +2,11 @@
 This module provides an implementation of XFrame using pySpark RDDs.
 """
 import os
-import json
 import random
 import array
 import pickle
 import csv
-import StringIO
 import ast
-import shutil
 import re
 import copy
 from datetime import datetime
@@ -28,25 +25,153 @@ import xframes.fileio as fileio
 from xframes.traced_object import TracedObject
 from xframes.spark_context import CommonSparkContext
 from xframes.type_utils import infer_type_of_rdd
-from xframes.utils import cache, uncache, persist, unpersist
+from xframes.utils import cache, uncache, persist, unpersist, persistence_manager
 from xframes.type_utils import is_missing, is_missing_or_empty
 from xframes.type_utils import to_ptype, to_schema_type, hint_to_schema_type, pytype_from_dtype, safe_cast_val
 from xframes.utils import distribute_seed
 from xframes.utils import build_row
+from xframes.utils import key_encoder, key_decoder
+from xframes.utils import partition_offsets, slice_rdd, collect_range, limit_rdd
+from xframes.utils import iterate_partitions
+from xframes.utils import scan_column, pushdown_membership
+from xframes.utils import csv_line_encoder, save_text_lines
 from xframes.object_utils import wrap_rdd, check_input_uri
+from xframes import object_utils
 from xframes.lineage import Lineage
 import xframes
 from xframes.xarray_impl import XArrayImpl
 from xframes.xrdd import XRdd
 from xframes.cmp_rows import CmpRows
+from xframes.columnar import to_blocks, block_rows
+from xframes.columnar import FORMAT_VERSION, encode_chunks, decode_chunks
 
 if HAS_NUMPY:
     import numpy
 
 
-# Used to save the original line being parsed.
-# If there are any errors, then the line is picked up from here.
-saved_line = None
+# CSV parsing helpers
+
+# Rows are parsed with the csv module, then cast a batch at a time.  Each column of a
+#  batch is cast by a function chosen once from the column type, so int and float
+#  columns without missing or malformed values are converted with a single map.
+
+_UTF8_BOM = '\xef\xbb\xbf'
+
+_CSV_BATCH_SIZE = 1000
+
+# values for empty fields
+_EMPTY_VALUES = {int: lambda: 0,
+                 float: lambda: 0.0,
+                 datetime: lambda: datetime(1, 1, 1),
+                 str: lambda: '',
+                 dict: lambda: {},
+                 list: lambda: []}
+
+# formats tried with strptime before falling back on the dateutil parser
+_DATETIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d',
+                     '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S.%f']
+
+
+def _unquote(field):
+    if field is None or len(field) == 0:
+        return field
+    if field[0] == '"' and field[-1] == '"':
+        return field[1: -1]
+    if field[0] == "'" and field[-1] == "'":
+        return field[1: -1]
+    return field
+
+
+def _strip_newline(field):
+    return field.replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _clean_field(field):
+    # get rid of newline in fields
+    # get rid of quotes around fields
+    return _unquote(_strip_newline(field))
+
+
+def _clean_column(values):
+    # Clean the fields of a column, skipping the work when no field needs it.
+    joined = ''.join(values)
+    if '\n' in joined or '\r' in joined:
+        values = [_strip_newline(val) for val in values]
+    if '"' in joined or "'" in joined:
+        values = [_unquote(val) for val in values]
+    return values
+
+
+def _datetime_parser():
+    # The dateutil parser accepts any format, but is slow.  The format of the values
+    #  is learned from the first few, and tried first with strptime.
+    state = {'format': None, 'tries': 10}
+
+    def parse(val):
+        fmt = state['format']
+        if fmt is not None:
+            try:
+                return datetime.strptime(val, fmt)
+            except ValueError:
+                pass
+        if state['tries'] > 0:
+            state['tries'] -= 1
+            for fmt in _DATETIME_FORMATS:
+                try:
+                    res = datetime.strptime(val, fmt)
+                except ValueError:
+                    continue
+                state['format'] = fmt
+                return res
+        return date_parser.parse(val)
+    return parse
+
+
+def _value_caster(typ):
+    """
+    Returns a function that casts a csv field to the given type.
+
+    Empty fields become the empty value of the type, and fields that cannot be cast become None.
+    """
+    if typ in (dict, list):
+        parse = ast.literal_eval
+    elif typ is datetime:
+        parse = _datetime_parser()
+    else:
+        parse = typ
+    empty = _EMPTY_VALUES.get(typ)
+
+    def cast(val):
+        if val is None:
+            return None
+        if len(val) == 0 and empty is not None:
+            return empty()
+        try:
+            return parse(val)
+        except (ValueError, TypeError):
+            return None
+    return cast
+
+
+def _column_caster(typ, na_values):
+    """
+    Returns a function that casts the fields of a column, replacing the na values with None.
+    """
+    cast = _value_caster(typ)
+    na_values = set(na_values)
+
+    def cast_column(values):
+        if not na_values.isdisjoint(values):
+            values = [None if val in na_values else val for val in values]
+        if typ is str:
+            return values
+        if typ in (int, float):
+            try:
+                return map(typ, values)
+            except (ValueError, TypeError):
+                pass
+        return [cast(val) for val in values]
+    return cast_column
 
 
 # noinspection PyUnresolvedReferences,PyIncorrectDocstring
@@ -82,6 +207,7 @@ class XFrameImpl(TracedObject):
         # this is needed for empty to work
         # rdd = rdd or CommonSparkContext.spark_context().emptyRDD()
         self._rdd = wrap_rdd(rdd)
+        persistence_manager.add_owner(self._rdd, self)
 
         column_names = column_names or []
         column_types = column_types or []
@@ -90,11 +216,26 @@ class XFrameImpl(TracedObject):
         self.lineage = lineage or Lineage.init_frame_lineage(Lineage.EMPTY, self.col_names)
         self.iter_pos = None
         self._num_rows = None
+        # a row count known without running a job, used to plan joins
+        self._num_rows_hint = None
+        self._partition_offsets = None
+        # the spark DataFrame the rows were read from, while they are unchanged
+        self._scan = None
+        # the rows stored as a ColumnBlock per partition, if the storage is columnar
+        self._blocks = None
+        # the saved records the rows were loaded from, and the index of each column in them
+        self._saved = None
 
         self.materialized = False
 
     def _replace_rdd(self, rdd):
+        persistence_manager.remove_owner(self._rdd, self)
         self._rdd = wrap_rdd(rdd)
+        persistence_manager.add_owner(self._rdd, self)
+        self._partition_offsets = None
+        self._scan = None
+        self._blocks = None
+        self._saved = None
 
     def dump_debug_info(self):
         return self._rdd.toDebugString()
@@ -135,14 +276,76 @@ class XFrameImpl(TracedObject):
             self.lineage = lineage
 
         self._num_rows = None
+        self._num_rows_hint = None
         self.materialized = False
         return self
 
     def _count(self):
-        persist(self._rdd)
-        count = self._rdd.count()
-        self.materialized = True
-        return count
+        return self._partition_index()[-1]
+
+    def _partition_index(self):
+        """
+        Returns the starting row of each partition, followed by the total row count.
+
+        This is computed once, when the RDD is first materialized.
+        """
+        if self._partition_offsets is None:
+            if object_utils.COLUMNAR_STORAGE and self._blocks is None:
+                self._use_blocks()
+            persist(self._storage_rdd(), self)
+            if self._blocks is not None:
+                counts = self._blocks.map(lambda block: block.num_rows).collect()
+            else:
+                counts = self._rdd.partition_counts()
+            self._partition_offsets = partition_offsets(counts)
+            self._num_rows = self._partition_offsets[-1]
+            self.materialized = True
+        return self._partition_offsets
+
+    @classmethod
+    def _from_blocks(cls, blocks, column_names, column_types, lineage):
+        """
+        Returns a new XFrameImpl whose rows are stored in blocks of columns.
+        """
+        res = cls(blocks.flatMap(block_rows), column_names, column_types, lineage)
+        res._blocks = blocks
+        return res
+
+    @classmethod
+    def _from_saved(cls, records, column_indexes, column_names, column_types, lineage, num_rows):
+        """
+        Returns a new XFrameImpl with the given columns of records in the native save format.
+
+        Only the chunks of these columns are decompressed.
+        """
+        res = cls._from_blocks(records.map(decode_chunks(column_indexes)), column_names, column_types, lineage)
+        res._saved = (records, column_indexes)
+        res._num_rows = num_rows
+        return res
+
+    def _use_blocks(self):
+        """
+        Store the rows in blocks of columns, one block per partition.
+        """
+        # the blocks have the same partition structure as the rows
+        blocks = self._rdd.mapPartitions(to_blocks(self.column_types))
+        self._replace_rdd(blocks.flatMap(block_rows))
+        self._blocks = blocks
+
+    def _storage_rdd(self):
+        # the RDD that is persisted
+        return self._rdd if self._blocks is None else self._blocks
+
+    def _rv_range(self, start, step, stop):
+        """
+        Returns a new XFrameImpl with the rows between start and stop, counting by step.
+        """
+        offsets = self._partition_index()
+        stop = min(stop, offsets[-1])
+        res = self._rv(slice_rdd(self._rdd, offsets, start, step, stop))
+        if start >= 0 and step != 0:
+            res._num_rows_hint = len(xrange(start, max(start, stop), abs(step)))
+        return res
 
     def _coalesce(self, rdd, num_partitions=None):
         if num_partitions is None:
@@ -176,7 +379,10 @@ class XFrameImpl(TracedObject):
         sc = CommonSparkContext.spark_context()
         rdd = sc.parallelize(data)
         lineage = Lineage.init_frame_lineage(Lineage.PROGRAM, column_names)
-        return XFrameImpl(rdd, column_names, column_types, lineage)
+        impl = XFrameImpl(rdd, column_names, column_types, lineage)
+        # the data is local, so the row count is known without running a job
+        impl._num_rows_hint = len(data)
+        return impl
 
     @classmethod
     def load_from_pandas_dataframe(cls, data):
@@ -210,20 +416,32 @@ class XFrameImpl(TracedObject):
     def load_from_xframe_index(cls, path):
         """
         Load from a saved xframe.
+
+        Directories in the native format hold one record of column chunks per partition.
+        Those saved before the format was versioned hold pickled rows.
         """
         cls._entry(path=path)
         sc = CommonSparkContext.spark_context()
-        res = sc.pickleFile(path)
+        res = XRdd(sc.pickleFile(path))
         # read metadata from the same directory
         metadata_path = os.path.join(path, '_metadata')
         check_input_uri(metadata_path)
         with fileio.open_file(metadata_path) as f:
-            names, types = pickle.load(f)
+            metadata = pickle.load(f)
+        if isinstance(metadata, dict):
+            if metadata['version'] > FORMAT_VERSION:
+                raise ValueError('XFrame was saved in a newer format: version {}.'.format(metadata['version']))
+            names = metadata['column_names']
+            types = metadata['column_types']
+        else:
+            names, types = metadata
         lineage_path = os.path.join(path, '_lineage')
         if fileio.exists(lineage_path):
             lineage = Lineage.load(lineage_path)
         else:
             lineage = Lineage.init_frame_lineage(path, names)
+        if isinstance(metadata, dict):
+            return cls._from_saved(res, range(len(names)), names, types, lineage, metadata['num_rows'])
         return cls(res, names, types, lineage)
 
     @classmethod
@@ -302,7 +520,8 @@ class XFrameImpl(TracedObject):
             na_values = [na_values]
 
         sc = CommonSparkContext().spark_context()
-        raw = XRdd(sc.textFile(path))
+        # the csv module works on utf-8 encoded lines
+        raw = XRdd(sc.textFile(path, use_unicode=False))
         # parsing_config
         # 'row_limit': 100,
         # 'use_header': True,
@@ -317,11 +536,7 @@ class XFrameImpl(TracedObject):
         # 'na_values': ['NA'],
         # 'continue_on_failure': True,
         # 'store_errors': False,
-
-        def apply_comment(line):
-            return line.partition(comment_char)[0].rstrip()
-        if comment_char:
-            raw = raw.map(apply_comment)
+        # 'persist': True,
 
         def to_format_params(config):
             params = {}
@@ -340,111 +555,39 @@ class XFrameImpl(TracedObject):
 
         params = to_format_params(parsing_config)
         if row_limit:
-            if row_limit > 100:
-                pairs = raw.zipWithIndex()
-                cache(pairs)
-                filtered_pairs = pairs.filter(lambda x: x[1] < row_limit)
-                uncache(pairs)
-                raw = filtered_pairs.keys()
-            else:
-                lines = raw.take(row_limit)
-                raw = XRdd(sc.parallelize(lines))
-
-        # read and parse a csv file in a partition
-        def read_csv_stream(f, params, num_columns):
-            def record_input(_f):
-                global saved_line
-                for line in _f:
-                    saved_line = line
-                    yield line
-
-            def strip_utf8_bom(_f):
-                for line in _f:
-                    if len(line) > 3 and ord(line[0]) == 239 and ord(line[1]) == 187 and ord(line[2]) == 191:
-                        yield line[3:]
-                    else:
-                        yield line
-
-            def handle_unicode(_f):
-                # The Python 2 CSV parser can only handle ASCII and UTF-8.
-                for line in _f:
-                    if isinstance(line, str):
-                        yield line
-                    else:
-                        yield line.encode('utf-8')
-
-            def unquote(field):
-                if field is None or len(field) == 0:
-                    return field
-                if field[0] == '"' and field[-1] == '"':
-                    return field[1: -1]
-                if field[0] == "'" and field[-1] == "'":
-                    return field[1: -1]
-                return field
-
-            def strip_newline(field):
-                return field.replace('\n', '\\n').replace('\r', '\\r')
-
-            f = strip_utf8_bom(handle_unicode(record_input(f)))
-
-            params = copy.copy(params)
-
-            if 'commentchar' in params:
-                commentchar = params['commentchar']
-                del params['commentchar']
-
-                def strip_comments(_f):
-                    # Wraps the file iterator, providing comment stripping
-                    for line in _f:
-                        yield line.partition(comment_char)[0].rstrip()
-                f = strip_comments(f)
-
-            reader = csv.reader(f, **params)
-
-            try:
-                for row in reader:
-                    # get rid of newline in fields
-                    # get rid of quotes around fields
-                    row = [unquote(strip_newline(col)) for col in row]
-                    if num_columns is not None and len(row) != num_columns:
-                        yield 'width', saved_line
-                    else:
-                        yield 'data', row
-            except csv.Error:
-                yield 'csv', saved_line
-            except SystemError:
-                yield 'csv', saved_line
+            # read only the partitions that hold the first lines
+            raw = XRdd(limit_rdd(raw, row_limit))
+
+        def prepare_lines(lines, last):
+            # Yields the lines to parse, and records each one in last, for error reports.
+            # Partitions begin at the start of a line, and only the first line of a file
+            #  can start with a byte order mark.
+            first_line = True
+            for line in lines:
+                last[0] = line
+                if first_line:
+                    first_line = False
+                    if line.startswith(_UTF8_BOM):
+                        line = line[len(_UTF8_BOM):]
+                if comment_char:
+                    line = line.partition(comment_char)[0].rstrip()
+                yield line
 
         errs = {}
 
         # use first row, if available, to make column names
         first_raw = raw.first()
-        res = read_csv_stream([first_raw], params, num_columns=None).next()
-        if res[0] != 'data':
-            errs['header'] = XArrayImpl(rdd=sc.parallelize([res[1]]), elem_type=str)
+        try:
+            first = [_clean_field(col) for col in csv.reader(prepare_lines([first_raw], [None]), **params).next()]
+        except (csv.Error, SystemError):
+            errs['header'] = XArrayImpl(rdd=sc.parallelize([first_raw]), elem_type=str)
             return errs, XFrameImpl()
-        first = res[1]
         if use_header:
             names = [item.strip() for item in first]
         else:
             names = ['X.{}'.format(i) for i in range(len(first))]
         column_count = len(names)
 
-        parsed = raw.mapPartitions(lambda partition:
-                                   read_csv_stream(partition, params, column_count))
-
-        persist(parsed)
-        res = parsed.filter(lambda tup: tup[0] == 'data').values()
-        if store_errors:
-            errs['width'] = XArrayImpl(rdd=parsed.filter(lambda tup: tup[0] == 'width').values(), elem_type=str)
-            errs['csv'] = XArrayImpl(rdd=parsed.filter(lambda tup: tup[0] == 'csv').values(), elem_type=str)
-        unpersist(parsed)
-
-        # filter out all rows that match header
-        # this could potentialy filter data rows, but we will ignore that for now
-        if use_header:
-            res = res.filter(lambda row: row != first)
-
         # Transform hints: __X{}__ ==> name.
         # If it is not of this form, leave it alone.
         def extract_index(s):
@@ -474,68 +617,67 @@ class XFrameImpl(TracedObject):
             for col in names:
                 if col in type_hints:
                     types[names.index(col)] = type_hints[col]
-        column_types = types
-
-        # apply na values to value
-        def apply_na(row):
-            return [None if val in na_values else val for val in row]
-        if len(na_values) > 0:
-            res = res.map(apply_na)
 
         # drop columns with empty header
-        remove_cols = [index for index, name in enumerate(names) if len(name) == 0]
-
-        def remove_columns(row):
-            return [val for index, val in enumerate(row) if index not in remove_cols]
-        if len(remove_cols) > 0:
-            res = res.map(remove_columns)
-            names = remove_columns(names)
-
-        # cast to desired type
-        # noinspection PyUnusedLocal
-        def cast_val(val, typ, name):
-            if val is None:
-                return None
-            if len(val) == 0:
-                if typ is int:
-                    return 0
-                if typ is float:
-                    return 0.0
-                if typ is datetime:
-                    return datetime(1, 1, 1)
-                if typ is str:
-                    return ''
-                if typ is dict:
-                    return {}
-                if typ is list:
-                    return []
+        keep_cols = [index for index, name in enumerate(names) if len(name) > 0]
+        names = [names[index] for index in keep_cols]
+        column_types = [types[index] for index in keep_cols]
+        casters = [_column_caster(typ, na_values) for typ in column_types]
+
+        def cast_batch(batch):
+            # This is where the result is cast as a tuple
+            if len(batch) == 0 or len(casters) == 0:
+                return [()] * len(batch)
+            columns = zip(*batch)
+            return zip(*[cast(_clean_column(columns[index])) for index, cast in zip(keep_cols, casters)])
+
+        def parse_partition(lines):
+            last = [None]
+            reader = csv.reader(prepare_lines(lines, last), **params)
+            # Each file starts with a header, and the files start at the beginning of a partition.
+            check_header = use_header
+            batch = []
             try:
-                if typ in (dict, list):
-                    return ast.literal_eval(val)
-                elif typ is datetime:
-                    return date_parser.parse(val)
-                return typ(val)
-            except ValueError:
-                # raise ValueError('Cast failed: ({}) {}  col: {}'.format(typ, val, name))
-                return None
-            except TypeError:
-                # raise TypeError('Cast failed: ({}) {}  col: {}'.format(typ, val, name))
-                return None
-
-        # This is where the result is cast as a tuple
-        def cast_row(row, types, names):
-            return tuple([cast_val(val, typ, name) for val, typ, name in zip(row, types, names)])
-
-        # TODO -- if cast fails, then store None
-        if len(types) != 0:
-            res = res.map(lambda row: cast_row(row, types, names))
-            if row_limit is None:
-                persist(res)
+                for row in reader:
+                    if len(row) != column_count:
+                        if store_errors:
+                            yield 'width', last[0]
+                        continue
+                    if check_header:
+                        check_header = False
+                        if [_clean_field(col) for col in row] == first:
+                            continue
+                    batch.append(row)
+                    if len(batch) == _CSV_BATCH_SIZE:
+                        for res in cast_batch(batch):
+                            yield 'data', res
+                        batch = []
+            except (csv.Error, SystemError):
+                if store_errors:
+                    yield 'csv', last[0]
+            for res in cast_batch(batch):
+                yield 'data', res
+
+        parsed = raw.mapPartitions(parse_partition)
+        if store_errors:
+            persist(parsed)
+            errs['width'] = XArrayImpl(rdd=parsed.filter(lambda tup: tup[0] == 'width').values(), elem_type=str)
+            errs['csv'] = XArrayImpl(rdd=parsed.filter(lambda tup: tup[0] == 'csv').values(), elem_type=str)
+            res = parsed.filter(lambda tup: tup[0] == 'data').values()
+        else:
+            res = parsed.values()
+        if row_limit is None and get_config('persist') is not False:
+            persist(res)
 
         lineage = Lineage.init_frame_lineage(path, names)
+        res = XFrameImpl(res, names, column_types, lineage)
+        if store_errors:
+            # the parsed lines are released when the results are no longer used
+            for owner in [res] + errs.values():
+                persistence_manager.add_owner(parsed, owner)
 
         # returns a dict of errors and XFrameImpl
-        return errs, XFrameImpl(res, names, column_types, lineage)
+        return errs, res
 
     # noinspection PyUnusedLocal
     @classmethod
@@ -581,9 +723,19 @@ class XFrameImpl(TracedObject):
         names = [str(col.name) for col in schema.fields]
         column_types = [to_ptype(col.dataType) for col in schema.fields]
         lineage = Lineage.init_frame_lineage(path, names)
+        return cls._from_scan(s_rdd, names, column_types, lineage)
 
-        rdd = s_rdd.rdd.map(lambda row: tuple(row))
-        return XFrameImpl(rdd, names, column_types, lineage)
+    @classmethod
+    def _from_scan(cls, dataframe, column_names, column_types, lineage):
+        """
+        Returns a new XFrameImpl that reads its rows from a spark DataFrame.
+
+        Column selections and filters on the result are pushed into the DataFrame.
+        """
+        rdd = dataframe.rdd.map(lambda row: tuple(row))
+        res = cls(rdd, column_names, column_types, lineage)
+        res._scan = dataframe
+        return res
 
     # Save
     def save(self, path):
@@ -599,12 +751,26 @@ class XFrameImpl(TracedObject):
         """
         self._entry(path=path)
         fileio.delete(path)
-        # save rdd
-        self._rdd.saveAsPickleFile(path)
+        # save each partition as a record of compressed column chunks
+        records = self._rdd.mapPartitionsWithIndex(encode_chunks(self.column_types))
+        # the records are small, and persisting them avoids computing the rows again for the stats
+        persist(records)
+        try:
+            records.saveAsPickleFile(path)
+            summary = sorted(records.map(lambda record: record[:3]).collect())
+        finally:
+            unpersist(records)
         # save metadata in the same directory
 
         metadata_path = os.path.join(path, '_metadata')
-        metadata = [self.col_names, self.column_types]
+        partition_rows = [num_rows for _, num_rows, _ in summary]
+        metadata = {'format': 'xframe',
+                    'version': FORMAT_VERSION,
+                    'column_names': self.col_names,
+                    'column_types': self.column_types,
+                    'num_rows': sum(partition_rows),
+                    'partition_rows': partition_rows,
+                    'stats': [stats for _, _, stats in summary]}
         with fileio.open_file(metadata_path, 'w') as f:
             # TODO detect filesystem errors
             pickle.dump(metadata, f)
@@ -613,44 +779,26 @@ class XFrameImpl(TracedObject):
         self.lineage.save(lineage_path)
 
     # noinspection PyArgumentList
-    def save_as_csv(self, path, **params):
+    def save_as_csv(self, path, single_file=True, **params):
         """
         Save to a text file in csv format.
+
+        The partitions are written in parallel.  If single_file is True, they are
+        concatenated into one file, otherwise path is a directory of part files.
+        The heading is the first line of the first part.
         """
         # Transform into RDD of csv-encoded lines, then write
-        self._entry(path=path, **params)
+        self._entry(path=path, single_file=single_file, **params)
+        heading = self.column_names()
 
-        def to_csv(row, **params):
-            sio = StringIO.StringIO()
-            writer = csv.writer(sio, **params)
-            try:
-                writer.writerow(row)
-                return sio.getvalue()
-            except IOError:
-                return ''
-
-        # create heading with line terminator
-        heading = to_csv(self.column_names(), **params)
-        # create rows without the line terminator
-        params['lineterminator'] = ''
-        csv_data = self._rdd.map(lambda row: to_csv(row, **params))
-
-        # Make a CSV file from an RDD
-
-        # this will ensure that we get everything in one file
-        data = csv_data.repartition(1)
-
-        # save the data in the part file
-        temp_file_name = fileio.temp_file_name(path)
-        data.saveAsTextFile(temp_file_name)
-        in_path = os.path.join(temp_file_name, 'part-00000')
-        fileio.delete(path)
-        # copy the part file to the output file
-        with fileio.open_file(path, 'w') as f:
-            f.write(heading)
-            with fileio.open_file(in_path) as rd:
-                shutil.copyfileobj(rd, f)
-        fileio.delete(temp_file_name)
+        def to_csv(index, iterator):
+            encode = csv_line_encoder(**params)
+            if index == 0:
+                yield encode(heading)
+            for row in iterator:
+                yield encode(row)
+        csv_data = self._rdd.mapPartitionsWithIndex(to_csv)
+        save_text_lines(csv_data, path, single_file)
 
     def save_as_parquet(self, url, column_names=None, column_type_hints=None, number_of_partitions=None):
         """
@@ -825,22 +973,13 @@ class XFrameImpl(TracedObject):
         Return the first n rows of the RDD as an XFrame.
         """
         # Returns an XFrame, otherwise we would use take(n)
-        # TODO: this is really inefficient: it numbers the whole thing, and
-        #  then filters most of it out.
-        # Maybe it would be better to use take(n) then parallelize ?
         self._entry(n=n)
         if n <= 100:
             data = self._rdd.take(n)
             sc = CommonSparkContext.spark_context()
             res = sc.parallelize(data)
             return self._rv(res)
-        pairs = self._rdd.zipWithIndex()
-        cache(pairs)
-        filtered_pairs = pairs.filter(lambda x: x[1] < n)
-        uncache(pairs)
-        res = filtered_pairs.keys()
-        self.materialized = True
-        return self._rv(res)
+        return self._rv_range(0, 1, n)
 
     def head_as_list(self, n):
         # Used in xframe when doing dry runs to determine type
@@ -853,13 +992,8 @@ class XFrameImpl(TracedObject):
         Return the last n rows of the RDD as an XFrame.
         """
         self._entry(n=n)
-        pairs = self._rdd.zipWithIndex()
-        cache(pairs)
-        start = pairs.count() - n
-        filtered_pairs = pairs.filter(lambda x: x[1] >= start)
-        uncache(pairs)
-        res = filtered_pairs.map(lambda x: x[0])
-        return self._rv(res)
+        count = self._count()
+        return self._rv_range(max(count - n, 0), 1, count)
 
     # Sampling
     def sample(self, fraction, max_partitions, seed):
@@ -895,9 +1029,12 @@ class XFrameImpl(TracedObject):
 
     def persist(self, persist_flag):
         if persist_flag:
-            self._rdd.persist(StorageLevel.MEMORY_AND_DISK)
+            if object_utils.COLUMNAR_STORAGE and self._blocks is None:
+                self._use_blocks()
+            persist(self._storage_rdd(), self)
         else:
-            self._rdd.unpersist()
+            # other objects may still own the same persisted RDD
+            persistence_manager.remove_owner(self._storage_rdd(), self)
 
     # Materialization
     def materialize(self):
@@ -935,10 +1072,17 @@ class XFrameImpl(TracedObject):
             raise ValueError("Column name does not exist: '{}'.".format(column_name))
 
         col = self.col_names.index(column_name)
-        res = self._rdd.map(lambda row: row[col])
+        if self._blocks is not None:
+            res = self._blocks.flatMap(lambda block: block.column_values(col))
+        else:
+            res = self._rdd.project(col)
         column_type = self.column_types[col]
         lineage = self.lineage.to_array_lineage(column_name)
-        return xframes.xarray_impl.XArrayImpl(res, column_type, lineage)
+        res = xframes.xarray_impl.XArrayImpl(res, column_type, lineage)
+        if self._scan is not None:
+            # comparisons on the column can become filters on the scan
+            res._scan_column = (self._scan, column_name)
+        return res
 
     def select_columns(self, keylist):
         """
@@ -949,12 +1093,19 @@ class XFrameImpl(TracedObject):
 
         cols = [self.col_names.index(key) for key in keylist]
         names = [self.col_names[col] for col in cols]
-
-        def get_columns(row):
-            return tuple([row[col] for col in cols])
         types = [self.column_types[col] for col in cols]
-        res = self._rdd.map(get_columns)
         lineage = self.lineage.select_columns(names)
+        if self._saved is not None:
+            # decompress only the selected columns
+            records, indexes = self._saved
+            return self._from_saved(records, [indexes[col] for col in cols], names, types, lineage, self._num_rows)
+        if self._scan is not None:
+            # read only the selected columns
+            dataframe = self._scan.select([scan_column(name) for name in names])
+            return self._from_scan(dataframe, names, types, lineage)
+        if self._blocks is not None:
+            return self._from_blocks(self._blocks.map(lambda block: block.select(cols)), names, types, lineage)
+        res = self._rdd.project(cols)
         return self._rv(res, names, types, lineage)
 
     def copy(self):
@@ -1145,12 +1296,8 @@ class XFrameImpl(TracedObject):
         col = self.col_names.index(name)
         self.col_names.pop(col)
         self.column_types.pop(col)
-
-        def pop_col(row):
-            lst = list(row)
-            lst.pop(col)
-            return tuple(lst)
-        res = self._rdd.map(lambda row: pop_col(row))
+        keep = [i for i in range(len(self.col_names) + 1) if i != col]
+        res = self._rdd.project(keep)
         lineage = self.lineage.remove_columns([name])
         return self._replace(res, lineage=lineage)
 
@@ -1169,13 +1316,8 @@ class XFrameImpl(TracedObject):
         for col in cols:
             remaining_col_names.pop(col)
             remaining_col_types.pop(col)
-
-        def pop_cols(row):
-            lst = list(row)
-            for col in cols:
-                lst.pop(col)
-            return tuple(lst)
-        res = self._rdd.map(pop_cols)
+        keep = [i for i in range(len(self.col_names)) if i not in cols]
+        res = self._rdd.project(keep)
         lineage = self.lineage.remove_columns(column_names)
         return self._rv(res, remaining_col_names, remaining_col_types, lineage)
 
@@ -1196,18 +1338,9 @@ class XFrameImpl(TracedObject):
             new_list[col2] = lst[col1]
             return new_list
 
-        def swap_cols(row):
-            # is it OK to modify
-            # the row ?
-            try:
-                lst = list(row)
-                lst[col1], lst[col2] = lst[col2], lst[col1]
-                return tuple(lst)
-            except IndexError:
-                logging.warn('Swap index error {} {} {} {}'.format(col1, col2, row, len(row)))
         names = swap_list(self.col_names)
         types = swap_list(self.column_types)
-        res = self._rdd.map(swap_cols)
+        res = self._rdd.project(swap_list(range(len(self.col_names))))
         return self._rv(res, names, types)
 
     def reorder_columns(self, column_names):
@@ -1221,13 +1354,9 @@ class XFrameImpl(TracedObject):
         def reorder_list(lst):
             return [lst[i] for i in column_indexes]
 
-        def reorder_cols(row):
-            return tuple([row[i] for i in column_indexes])
-
-
         names = reorder_list(self.col_names)
         types = reorder_list(self.column_types)
-        res = self._rdd.map(reorder_cols)
+        res = self._rdd.project(column_indexes)
         return self._rv(res, names, types)
 
     def replace_column_names(self, new_names):
@@ -1239,29 +1368,29 @@ class XFrameImpl(TracedObject):
         lineage = self.lineage.replace_column_names(name_map)
         return self._rv(self._rdd, new_names, lineage=lineage)
 
-        # Iteration
-
-    # Begin_iterator is called by a generator function, local to __iter__.
-        # It calls iterator_get_next to fetch a group of items, then returns them one by one
-        # using yield.  It keeps calling iterator_get_next as long as there are elements 
-        # remaining.  It seems like only one iterator at a time can be operating because
-        # the position is stored here.  Would it be better to let the caller handle the iter_pos?
-        #
-        # This uses zipWithIndex, which needs to process the whole data set.  
-        # Is it better to use take or collect ?  OR are they effectively the same since zipWithIndex 
-        # has just run?
+    # Iteration
+
+    # __iter__ uses iter_rows, which streams the rows one partition at a time.
+    # Begin_iterator and iterator_get_next fetch a group of rows starting at a position
+    # stored here, so only one of these iterators at a time can be operating.
+    # They use the partition index, so only the partitions holding the
+    # requested rows are computed.
     def begin_iterator(self):
         self._entry()
         self.iter_pos = 0
 
+    def iter_rows(self):
+        """
+        Returns an iterator over the rows, collecting one partition at a time.
+        """
+        self._entry()
+        return iterate_partitions(self._rdd, object_utils.ITERATOR_PREFETCH)
+
     def iterator_get_next(self, elems_at_a_time):
         self._entry(elems_at_a_time=elems_at_a_time)
         low = self.iter_pos
         high = self.iter_pos + elems_at_a_time
-        buf_rdd = self._rdd.zipWithIndex()
-        filtered_rdd = buf_rdd.filter(lambda row: low <= row[1] < high)
-        trimmed_rdd = filtered_rdd.keys()
-        iter_buf = trimmed_rdd.collect()
+        iter_buf = collect_range(self._rdd, self._partition_index(), low, 1, high)
         self.iter_pos += elems_at_a_time
         return iter_buf
 
@@ -1390,6 +1519,10 @@ class XFrameImpl(TracedObject):
         where the corresponding row in the selector is non-zero.
         """
         self._entry()
+        scan_filter = other.scan_filter()
+        if self._scan is not None and scan_filter is not None and scan_filter[0] is self._scan:
+            return self._from_scan(self._scan.filter(scan_filter[1]),
+                                   self.col_names, self.column_types, self.lineage)
         # zip restriction: data must match in length and partition structure
 
         pairs = self._rdd.zip(other.rdd())
@@ -1497,14 +1630,16 @@ class XFrameImpl(TracedObject):
         Returns an RDD consisting of the values between start and stop, counting by step.
         """
         self._entry(start=start, step=step, stop=stop)
+        return self._rv_range(start, step, stop)
 
-        def select_row(x, start, step, stop):
-            if x < start or x >= stop:
-                return False
-            return (x - start) % step == 0
-        pairs = self._rdd.zipWithIndex()
-        res = pairs.filter(lambda x: select_row(x[1], start, step, stop)).map(lambda x: x[0])
-        return self._rv(res)
+    def take_range(self, start, step, stop):
+        """
+        Returns a list of the rows between start and stop, counting by step.
+
+        Only the partitions that contain these rows are computed.
+        """
+        self._entry(start=start, step=step, stop=stop)
+        return collect_range(self._rdd, self._partition_index(), start, step, stop)
 
     def drop_missing_values(self, columns, all_behavior, split):
         """
@@ -1760,6 +1895,14 @@ class XFrameImpl(TracedObject):
         For now, values is always a set.
         """
         index = self.col_names.index(column_name)
+        if self._scan is not None:
+            expr = pushdown_membership(column_name, self.column_types[index], values, exclude)
+            if expr is not None:
+                return self._from_scan(self._scan.filter(expr), self.col_names, self.column_types, self.lineage)
+        if self._blocks is not None:
+            def keep(val):
+                return val not in values if exclude else val in values
+            return self._filter_blocks(index, keep)
 
         def filter_fun(row):
             val = row[index]
@@ -1773,6 +1916,11 @@ class XFrameImpl(TracedObject):
         Perform filtering on a single column by a function
         """
         index = self.col_names.index(column_name)
+        if self._blocks is not None:
+            def keep(val):
+                res = fn(val)
+                return not res if exclude else res
+            return self._filter_blocks(index, keep)
 
         def filter_fun(row):
             res = fn(row[index])
@@ -1781,6 +1929,16 @@ class XFrameImpl(TracedObject):
         res = self._rdd.filter(filter_fun)
         return self._rv(res)
 
+    def _filter_blocks(self, index, keep):
+        """
+        Filter the blocks by applying keep to the values in one column.
+        """
+        def filter_partition(_, iterator):
+            for block in iterator:
+                yield block.compress([bool(keep(val)) for val in block.column_values(index)])
+        blocks = self._blocks.select_rows(filter_partition)
+        return self._from_blocks(blocks, self.col_names, self.column_types, self.lineage)
+
     def filter_by_function_row(self, fn, exclude):
         """
         Perform filtering on all columns by a function
@@ -1840,22 +1998,46 @@ class XFrameImpl(TracedObject):
         new_column_types.extend(agg_types)
 
         # make RDD into K,V pairs where key incorporates the key column values
+        key_types = [self.column_types[col] for col in key_cols]
+        encode_key = key_encoder(key_types)
+        decode_key = key_decoder(key_types)
+
         def make_key(row, key_cols):
-            key = [row[col] for col in key_cols]
-            return json.dumps(key)
+            return encode_key([row[col] for col in key_cols])
         keyed_rdd = self._rdd.map(lambda row: (make_key(row, key_cols), row))
 
-        grouped = keyed_rdd.groupByKey()
-        grouped = grouped.map(lambda pair: (json.loads(pair[0]), pair[1]))
-        # (key, [row ...]) ...
-        # run the aggregator on y: count --> len(y); sum --> sum(y), etc
-
-        def build_aggregates(rows, aggregators, group_cols):
-            # apply each of the aggregator functions and collect their results into a list
-            return [aggregator(rows, cols)
-                    for aggregator, cols in zip(aggregators, group_cols)]
-        aggregators = [prop.agg_function for prop in group_properties]
-        aggregates = grouped.map(lambda (x, y): (x, build_aggregates(y, aggregators, group_cols)))
+        if all([prop.is_algebraic() for prop in group_properties]):
+            # Every aggregator can be computed from partial results, so combine within
+            #  each partition and shuffle only the partial states.
+            zero_value = [prop.zero() for prop in group_properties]
+            seq_fns = [prop.seq for prop in group_properties]
+            merge_fns = [prop.merge for prop in group_properties]
+            finalize_fns = [prop.finalize for prop in group_properties]
+
+            def seq_op(states, row):
+                return [seq(state, row, cols)
+                        for seq, state, cols in zip(seq_fns, states, group_cols)]
+
+            def comb_op(states1, states2):
+                return [merge(state1, state2)
+                        for merge, state1, state2 in zip(merge_fns, states1, states2)]
+
+            def finalize_states(states):
+                return [finalize(state) for finalize, state in zip(finalize_fns, states)]
+            combined = keyed_rdd.aggregateByKey(zero_value, seq_op, comb_op)
+            aggregates = combined.map(lambda (x, y): (decode_key(x), finalize_states(y)))
+        else:
+            grouped = keyed_rdd.groupByKey()
+            grouped = grouped.map(lambda pair: (decode_key(pair[0]), pair[1]))
+            # (key, [row ...]) ...
+            # run the aggregator on y: count --> len(y); sum --> sum(y), etc
+
+            def build_aggregates(rows, aggregators, group_cols):
+                # apply each of the aggregator functions and collect their results into a list
+                return [aggregator(rows, cols)
+                        for aggregator, cols in zip(aggregators, group_cols)]
+            aggregators = [prop.agg_function for prop in group_properties]
+            aggregates = grouped.map(lambda (x, y): (x, build_aggregates(y, aggregators, group_cols)))
 
         def concatenate(old_vals, new_vals):
             return old_vals + new_vals
@@ -1868,15 +2050,49 @@ class XFrameImpl(TracedObject):
         lineage = self.lineage.groupby(key_columns_array, group_output_columns, group_columns)
         return self._rv(res, new_column_names, new_column_types, lineage)
 
-    def join(self, right, how, join_keys):
+    def _known_num_rows(self):
+        """
+        Returns the row count if it is known without running a job, otherwise None.
+        """
+        return self._num_rows if self._num_rows is not None else self._num_rows_hint
+
+    def _broadcast_side(self, right, how, strategy):
+        """
+        Decide which side of a join to broadcast: 'left', 'right', or None to shuffle.
+        """
+        if strategy == 'shuffle' or how not in ('inner', 'left', 'right'):
+            return None
+        left_rows = self._known_num_rows()
+        right_rows = right._known_num_rows()
+        if how == 'left':
+            candidates = [('right', right_rows)]
+        elif how == 'right':
+            candidates = [('left', left_rows)]
+        else:
+            candidates = [('right', right_rows), ('left', left_rows)]
+        if strategy == 'broadcast':
+            # take the smaller known side, otherwise the first candidate
+            known = [c for c in candidates if c[1] is not None]
+            if len(known) > 0:
+                return min(known, key=lambda c: c[1])[0]
+            return candidates[0][0]
+        # auto: broadcast only if the row count is known and small enough
+        max_rows = object_utils.BROADCAST_JOIN_MAX_ROWS
+        small = [c for c in candidates if c[1] is not None and c[1] <= max_rows]
+        if len(small) > 0:
+            return min(small, key=lambda c: c[1])[0]
+        return None
+
+    def join(self, right, how, join_keys, strategy='auto'):
         """
         Merge two XFrames. Merges the current (left) XFrame with the given
         (right) XFrame using a SQL-style equi-join operation by columns.
 
         join_keys is a dict of left-right column names
         how = [left, right, outer, inner]
+        strategy = [auto, shuffle, broadcast]
         """
-        self._entry(how=how, join_keys=join_keys)
+        self._entry(how=how, join_keys=join_keys, strategy=strategy)
         # new columns are made up of:
         # 1) left columns
         # 2) right columns exculding join_keys.values()
@@ -1903,6 +2119,8 @@ class XFrameImpl(TracedObject):
             right_count = len(right.col_names)
             return new_column_names, new_column_types, left_count, right_count, right_lineage
 
+        # the hash table sent to the workers by a broadcast join
+        broadcast_table = None
         if how == 'cartesian':
             new_column_names, new_column_types, left_count, right_count, right_lineage = \
                 process_column_names(right.col_names, right.column_types)
@@ -1947,10 +2165,13 @@ class XFrameImpl(TracedObject):
                 process_column_names(right_column_names, right_column_types)
 
             # build a key from the column values
-            # spark cannot handle tuples as keys, so make it a string using json
+            # both sides must encode keys the same way, so that they compare equal
+            key_types = [self.column_types[i] for i in left_key_indexes] + \
+                        [right.column_types[i] for i in right_key_indexes]
+            encode_key = key_encoder(key_types)
+
             def build_key(row, indexes):
-                key = [row[i] for i in indexes]
-                return json.dumps(key)
+                return encode_key([row[i] for i in indexes])
 
             if len(left_key_indexes) == 0 or len(right_key_indexes) == 0:
                 raise ValueError("Empty join columns -- left: '{}' right: '{}'."
@@ -1960,19 +2181,45 @@ class XFrameImpl(TracedObject):
             keyed_left = self._rdd.map(lambda row: (build_key(row, left_key_indexes), row))
             keyed_right = right.rdd().map(lambda row: (build_key(row, right_key_indexes), row))
 
-            if how == 'inner':
-                joined = keyed_left.join(keyed_right)
-            elif how == 'left':
-                joined = keyed_left.leftOuterJoin(keyed_right)
-            elif how == 'right':
-                joined = keyed_left.rightOuterJoin(keyed_right)
-            elif how == 'full':
-                joined = keyed_left.fullOuterJoin(keyed_right)
+            broadcast_side = self._broadcast_side(right, how, strategy)
+            if broadcast_side is not None:
+                # Build a hash table from the small side and send it to every worker.
+                # Then each row of the big side is joined in a single map pass.
+                keyed_small, keyed_big = (keyed_right, keyed_left) if broadcast_side == 'right' \
+                    else (keyed_left, keyed_right)
+                table = {}
+                for key, row in keyed_small.collect():
+                    table.setdefault(key, []).append(row)
+                sc = CommonSparkContext.spark_context()
+                broadcast_table = sc.broadcast(table)
+                # for left or right joins, the big side is the outer side
+                keep_unmatched = how != 'inner'
+                small_is_right = broadcast_side == 'right'
+
+                def probe(key, big_row):
+                    matches = broadcast_table.value.get(key)
+                    if matches is None:
+                        if keep_unmatched:
+                            return [(big_row, None) if small_is_right else (None, big_row)]
+                        return []
+                    if small_is_right:
+                        return [(big_row, small_row) for small_row in matches]
+                    return [(small_row, big_row) for small_row in matches]
+                pairs = keyed_big.flatMap(lambda pair: probe(pair[0], pair[1]))
             else:
-                raise ValueError("'How' argument is not 'inner', 'left', 'right', 'full' or 'cartesian'.")
+                if how == 'inner':
+                    joined = keyed_left.join(keyed_right)
+                elif how == 'left':
+                    joined = keyed_left.leftOuterJoin(keyed_right)
+                elif how == 'right':
+                    joined = keyed_left.rightOuterJoin(keyed_right)
+                elif how == 'full':
+                    joined = keyed_left.fullOuterJoin(keyed_right)
+                else:
+                    raise ValueError("'How' argument is not 'inner', 'left', 'right', 'full' or 'cartesian'.")
 
-            # throw away key in the joined table
-            pairs = joined.values()
+                # throw away key in the joined table
+                pairs = joined.values()
 
             def combine_results(left_row, right_row, left_count, right_count):
                 if left_row is None:
@@ -1998,6 +2245,10 @@ class XFrameImpl(TracedObject):
                                               left_key_indexes, right_key_indexes))
 
         persist(res)
+        if broadcast_table is not None:
+            # once the joined rows are cached, the workers no longer need the table
+            res.count()
+            broadcast_table.unpersist()
 
         lineage = self.lineage.merge(right_lineage)
         return self._rv(res, new_column_names, new_column_types, lineage)
@@ -2009,9 +2260,11 @@ class XFrameImpl(TracedObject):
         """
 
         self._entry()
-        as_json = self._rdd.map(lambda row: json.dumps(row))
-        unique_rows = as_json.distinct()
-        res = unique_rows.map(lambda s: json.loads(s))
+        encode_key = key_encoder(self.column_types)
+        decode_key = key_decoder(self.column_types)
+        keyed_rows = self._rdd.map(encode_key)
+        unique_rows = keyed_rows.distinct()
+        res = unique_rows.map(lambda key: tuple(decode_key(key)))
         return self._rv(res)
 
     def sort(self, sort_column_names, sort_column_orders):
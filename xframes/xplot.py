@@ -336,6 +336,8 @@ class XPlot(object):
         q_epsilon = 0.01
         q_lower = None
         q_upper = None
+        # The cutoffs and the histogram range all come from the quantile sketch, which is
+        #  built in one pass.  Its 0.0 and 1.0 quantiles are the exact min and max.
         if lower_cutoff > 0.0:
             q_lower = float(sk.quantile(lower_cutoff)) - q_epsilon
         if upper_cutoff < 1.0:
@@ -356,12 +358,12 @@ class XPlot(object):
             vals = vals.apply(enforce_lower_cutoff)
             hist_min = q_lower
         else:
-            hist_min = sk.min()
+            hist_min = sk.quantile(0.0)
         if q_upper is not None:
             vals = vals.apply(enforce_upper_cutoff)
             hist_max = q_upper
         else:
-            hist_max = sk.max()
+            hist_max = sk.quantile(1.0)
         bucket_counts, bucket_vals = self.create_histogram_buckets(vals, bins, hist_min, hist_max)
         column = [(x, y) for x, y in zip(bucket_counts, bucket_vals)]
         self.make_bar(column, xlabel=xlabel, ylabel=ylabel, title=title)
@@ -9,16 +9,68 @@ Wrapped functions allow entry and exit tracing and keeps perf counts.
 # If new RDD functions are called, they must be added here.
 
 
+import bisect
+import operator
+
 import pyspark
 from pyspark import RDD
 
 from xframes.traced_object import TracedObject
 
 
+def _projector(columns):
+    if isinstance(columns, int):
+        return operator.itemgetter(columns)
+    if len(columns) == 0:
+        return lambda row: ()
+    if len(columns) == 1:
+        col = columns[0]
+        return lambda row: (row[col],)
+    # itemgetter returns a tuple when it has more than one item
+    return operator.itemgetter(*columns)
+
+
+def fuse_row_ops(ops):
+    """
+    Returns a function that applies a list of row operations to each row of a partition.
+
+    Each operation is a tuple of kind ('map', 'filter', or 'project'), argument, and
+    preserves_partitioning flag.  The map and filter argument is a function of the row, and
+    the project argument is a column index or list of column indexes.
+    """
+    steps = []
+    for kind, arg, _ in ops:
+        if kind == 'project':
+            steps.append((False, _projector(arg)))
+        else:
+            steps.append((kind == 'filter', arg))
+    if not any(is_filter for is_filter, _ in steps):
+        fns = [fn for _, fn in steps]
+
+        def apply_maps(iterator):
+            for row in iterator:
+                for fn in fns:
+                    row = fn(row)
+                yield row
+        return apply_maps
+
+    def apply_steps(iterator):
+        for row in iterator:
+            for is_filter, fn in steps:
+                if is_filter:
+                    if not fn(row):
+                        break
+                else:
+                    row = fn(row)
+            else:
+                yield row
+    return apply_steps
+
+
 # noinspection PyPep8Naming,PyProtectedMember
 class XRdd(TracedObject):
 
-    def __init__(self, rdd=None, structure_id=None):
+    def __init__(self, rdd=None, structure_id=None, parent=None, op=None):
         """
         Create a new XRdd.
 
@@ -31,10 +83,16 @@ class XRdd(TracedObject):
         Normally, the structure_id of an RDD is its RDD id.  If another RDD is derived from
         it, and that one has the same structure, then the derived RDD get's its parent's
         structure id.  Zip operates only on RDDs that share a structure_id.
+
+        Row-wise operations (map, filter, and project) are not applied right away.  Instead
+        the XRdd records the operation (op) and the XRdd it applies to (parent).  The RDD
+        is built the first time it is needed, by an action or by any other transformation,
+        and a chain of row-wise operations becomes a single pass over each partition.
         """
-        self._rdd = rdd
-        self.id = rdd.id()
-        self.structure_id = structure_id if structure_id else self.id
+        self._compiled = rdd
+        self._parent = parent
+        self._op = op
+        self._structure_id = structure_id
 
     @staticmethod
     def is_rdd(rdd):
@@ -44,6 +102,40 @@ class XRdd(TracedObject):
     def is_dataframe(rdd):
         return isinstance(rdd, pyspark.sql.DataFrame)
 
+    @property
+    def _rdd(self):
+        if self._compiled is None:
+            self._compiled = self._compile()
+        return self._compiled
+
+    def _compile(self):
+        # Collect the pending operations back to an XRdd that already has an RDD.
+        # A cached RDD is used as it is, so that its data is not recomputed.
+        ops = []
+        node = self
+        while node._op is not None and not (node._compiled is not None and node._compiled.is_cached):
+            ops.append(node._op)
+            node = node._parent
+        ops.reverse()
+        preserves_partitioning = all(op[2] for op in ops)
+        return node._rdd.mapPartitions(fuse_row_ops(ops), preserves_partitioning)
+
+    @property
+    def id(self):
+        return self._rdd.id()
+
+    @property
+    def structure_id(self):
+        if self._structure_id is None:
+            if self._op is not None and self._op[0] != 'filter':
+                return self._parent.structure_id
+            self._structure_id = self.id
+        return self._structure_id
+
+    def _derive(self, op):
+        # a row-wise operation on the rdd, applied when the RDD is built
+        return XRdd(parent=self, op=op)
+
     # getters
     def RDD(self):
         return self._rdd
@@ -150,6 +242,14 @@ class XRdd(TracedObject):
         self._entry()
         self._rdd.unpersist()
 
+    def is_pending(self):
+        # True if the RDD has not been built yet
+        return self._compiled is None
+
+    def is_cached(self):
+        self._entry()
+        return self._rdd.is_cached
+
     def saveAsPickleFile(self, path):
         self._entry(path=path)
         self._rdd.saveAsPickleFile(path)
@@ -163,6 +263,18 @@ class XRdd(TracedObject):
         res = self._rdd.stats()
         return res
 
+    def partition_counts(self):
+        # the number of rows in each partition
+        self._entry()
+        res = self._rdd.mapPartitions(lambda iterator: [sum(1 for _ in iterator)]).collect()
+        return res
+
+    def run_partitions(self, fn, partitions):
+        # run fn on only the given partitions, and return the combined results
+        self._entry(partitions=partitions)
+        res = self._rdd.context.runJob(self._rdd, fn, partitions)
+        return res
+
     # transformations
     def repartition(self, number_of_partitions):
         self._entry()
@@ -179,8 +291,23 @@ class XRdd(TracedObject):
 
     def map(self, fn, preserves_partitioning=False):
         self._entry(preserves_partitioning=preserves_partitioning)
-        res = self._rdd.map(fn, preserves_partitioning)
-        return XRdd(res, structure_id=self.structure_id)
+        return self._derive(('map', fn, preserves_partitioning))
+
+    def project(self, columns):
+        """
+        Select columns from each row.
+
+        If columns is a list of column indexes, the rows are tuples of those columns.
+        If it is a single column index, the rows are the values of that column.
+        """
+        self._entry(columns=columns)
+        if self._op is not None and self._op[0] == 'project' and \
+                self._compiled is None and isinstance(self._op[1], list):
+            # a projection of a projection is a single projection
+            prev = self._op[1]
+            columns = prev[columns] if isinstance(columns, int) else [prev[col] for col in columns]
+            return XRdd(parent=self._parent, op=('project', columns, False))
+        return self._derive(('project', columns, False))
 
     def mapPartitions(self, fn, preserves_partitioning=False):
         self._entry(preserves_partitioning=preserves_partitioning)
@@ -192,6 +319,13 @@ class XRdd(TracedObject):
         res = self._rdd.mapPartitionsWithIndex(fn, preserves_partitioning)
         return XRdd(res, structure_id=self.structure_id)
 
+    def select_rows(self, fn):
+        # fn is applied to (partition index, iterator) and selects some of the rows,
+        # so the result does not share the structure of this RDD
+        self._entry()
+        res = self._rdd.mapPartitionsWithIndex(fn)
+        return XRdd(res)
+
     def mapValues(self, fn):
         self._entry()
         res = self._rdd.mapValues(fn)
@@ -209,10 +343,45 @@ class XRdd(TracedObject):
 
     def safe_zip(self, other):
         # do the zip operation safely
-        self._entry()
-        ix_left = self._rdd.zipWithIndex().map(lambda row: (row[1], row[0]))
-        ix_right = other._rdd.zipWithIndex().map(lambda row: (row[1], row[0]))
-        return ix_left.join(ix_right).sortByKey().values()
+        # The rows of other are moved into partitions that match the row ranges of the
+        # partitions of this RDD, then the two are zipped partition by partition.
+        # This takes one shuffle, and preserves row order.
+        self._entry()
+        # utils imports spark_context, which imports this module
+        from xframes.utils import partition_offsets, range_slicer
+        left_offsets = partition_offsets(self.partition_counts())
+        right_offsets = partition_offsets(other.partition_counts())
+        # like a join on row index, rows without a partner are dropped
+        num_rows = min(left_offsets[-1], right_offsets[-1])
+        target_offsets = [min(offset, num_rows) for offset in left_offsets]
+        num_partitions = len(target_offsets) - 1
+        if num_partitions == 0:
+            return self._rdd
+        left = self._rdd
+        if left_offsets[-1] > num_rows:
+            left = left.mapPartitionsWithIndex(range_slicer(left_offsets, 0, 1, num_rows))
+
+        def index_rows(index, iterator):
+            base = right_offsets[index]
+            for i, row in enumerate(iterator, base):
+                if i >= num_rows:
+                    break
+                yield i, row
+
+        def target_partition(i):
+            return bisect.bisect_right(target_offsets, i) - 1
+
+        def place_rows(index, iterator):
+            base = target_offsets[index]
+            rows = [None] * (target_offsets[index + 1] - base)
+            for i, row in iterator:
+                rows[i - base] = row
+            return rows
+
+        right = other._rdd.mapPartitionsWithIndex(index_rows) \
+            .partitionBy(num_partitions, target_partition) \
+            .mapPartitionsWithIndex(place_rows)
+        return left.zip(right)
 
     def zip(self, other):
         self._entry()
@@ -222,8 +391,7 @@ class XRdd(TracedObject):
         else:
             res = self.safe_zip(other)
             structure_id = None
-        # noinspection PyUnresolvedReferences
-        res.persist(pyspark.StorageLevel.MEMORY_AND_DISK)
+        # the result is persisted, if at all, by the XFrameImpl or XArrayImpl that uses it
         return XRdd(res, structure_id=structure_id)
 
     def zipWithIndex(self):
@@ -238,8 +406,7 @@ class XRdd(TracedObject):
 
     def filter(self, fn):
         self._entry()
-        res = self._rdd.filter(fn)
-        return XRdd(res)
+        return self._derive(('filter', fn, True))
 
     def distinct(self):
         self._entry()
@@ -280,6 +447,11 @@ class XRdd(TracedObject):
         res = self._rdd.groupByKey()
         return XRdd(res)
 
+    def aggregateByKey(self, zeroValue, seqFunc, combFunc):
+        self._entry()
+        res = self._rdd.aggregateByKey(zeroValue, seqFunc, combFunc)
+        return XRdd(res)
+
     def cartesian(self, right):
         self._entry()
         res = self._rdd.cartesian(right._rdd)